@@ -1,7 +1,8 @@
-import json
 import re
 from thefuzz import process
 
+from record_files import RecordWriter, read_records
+
 # --- CONFIGURATION ---
 INPUT_FILE = "raw_scraped_products_debug.json"
 OUTPUT_ENRICHED_FILE = "products_enriched.json"
@@ -68,55 +69,46 @@ def detectar_caja(descripcion):
     return "No"
 
 # --- MAIN LOGIC ---
+def enriquecer_producto(producto):
+    descripcion = producto.get("Descripción", "")
+    familia = producto.get("Familia", "").lower()
+
+    # --- Standard Enrichment (Company and Box) ---
+    if "celular" in familia:
+        producto["Compañía"] = detectar_compania(descripcion)
+    if "consola" in familia:
+        producto["Caja"] = detectar_caja(descripcion)
+
+    # --- Optimized Color Logic ---
+    color_actual = producto.get("Color", "").strip().lower()
+    if color_actual and color_actual in VARIACIONES_COLOR:
+        # Color from scraping is valid, do nothing to it
+        pass
+    else:
+        # No valid color from scraping, run detection logic
+        color_detectado = detectar_color(descripcion)
+        if color_detectado == "tornasol": color_detectado = "azul" # Business rule
+        producto["Color"] = color_detectado if color_detectado else ""
+    return producto
+
 def enriquecer_productos_desde_descripcion():
+    # Products are streamed from the input to both outputs, one at a time
     try:
-        with open(INPUT_FILE, "r", encoding="utf-8") as f:
-            productos = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        with RecordWriter(OUTPUT_ENRICHED_FILE) as enriquecidos, RecordWriter(OUTPUT_WITHOUT_COLOR_FILE) as sin_color:
+            for producto in read_records(INPUT_FILE):
+                enriquecer_producto(producto)
+                enriquecidos.write(producto)
+                # --- Register for AI step if color is still missing ---
+                if not producto.get("Color"):
+                    sin_color.write(producto)
+    except (FileNotFoundError, ValueError) as e:
         print(f"❌ Error al cargar '{INPUT_FILE}': {e}")
         return
 
-    productos_enriquecidos = []
-    productos_sin_color = []
-
-    for producto in productos:
-        descripcion = producto.get("Descripción", "")
-        familia = producto.get("Familia", "").lower()
-
-        # --- Standard Enrichment (Company and Box) ---
-        if "celular" in familia:
-            producto["Compañía"] = detectar_compania(descripcion)
-        if "consola" in familia:
-            producto["Caja"] = detectar_caja(descripcion)
-
-        # --- Optimized Color Logic ---
-        color_actual = producto.get("Color", "").strip().lower()
-        if color_actual and color_actual in VARIACIONES_COLOR:
-            # Color from scraping is valid, do nothing to it
-            pass
-        else:
-            # No valid color from scraping, run detection logic
-            color_detectado = detectar_color(descripcion)
-            if color_detectado == "tornasol": color_detectado = "azul" # Business rule
-            producto["Color"] = color_detectado if color_detectado else ""
-
-        productos_enriquecidos.append(producto)
-
-        # --- Register for AI step if color is still missing ---
-        if not producto.get("Color"):
-            productos_sin_color.append(producto)
-
-    # --- Save results ---
-    with open(OUTPUT_ENRICHED_FILE, "w", encoding="utf-8") as f:
-        json.dump(productos_enriquecidos, f, indent=2, ensure_ascii=False)
-    
-    with open(OUTPUT_WITHOUT_COLOR_FILE, "w", encoding="utf-8") as f:
-        json.dump(productos_sin_color, f, indent=2, ensure_ascii=False)
-
     print(f"\n✨ Enriquecimiento consolidado completado.")
-    print(f"🧾 Total productos procesados: {len(productos)}")
-    print(f"✅ Con color detectado o válido: {len(productos_enriquecidos) - len(productos_sin_color)}")
-    print(f"🧠 Sin color (para revisión con IA): {len(productos_sin_color)}")
+    print(f"🧾 Total productos procesados: {enriquecidos.count}")
+    print(f"✅ Con color detectado o válido: {enriquecidos.count - sin_color.count}")
+    print(f"🧠 Sin color (para revisión con IA): {sin_color.count}")
     print(f"📁 Archivo enriquecido guardado en: {OUTPUT_ENRICHED_FILE}")
     print(f"📁 Sin color guardado en: {OUTPUT_WITHOUT_COLOR_FILE}")
 
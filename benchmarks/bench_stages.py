@@ -0,0 +1,203 @@
+"""
+Offline benchmark of the local pipeline stages on synthetic catalogs (see
+benchmarks/synthetic_catalog.py): description enrichment, color merge, variant
+summary and the sync's key mapping (SheetIndex + prepare_local_variants + plan_sync).
+Records throughput and peak traced memory per stage and size, and compares them with
+the stored baselines to flag regressions.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_stages --sizes 10000 100000 1000000 [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import add_color_from_description as enrich
+import sync_stock_summary_to_sheets as sync
+from generate_stock_summary import create_variant_summary
+from merge_color_updates import merge_updates
+from profiling import profile_stage
+from record_files import FORMATS, load_records, write_records
+from benchmarks.bench_sync import SHEET_HEADERS
+from benchmarks.synthetic_catalog import generate_products, load_profile
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_TOLERANCE = 0.25
+# Memory below this is noise (interpreter caches, small lists) and never counts as a regression
+MEMORY_SLACK_MB = 2.0
+GPT_COLOR_RATIO = 0.5
+
+SYNC_COLUMNS = {
+    "model": "Modelo", "inventory": "Inventario Partner", "familia": "Familia", "vp": "Variante Primaria",
+    "vs": "Variante Secundaria", "vt": "Variante Terciaria", "principal_extra": "¿Principal o Extra?",
+    "cert": "¿Certificado?", "pub_exitosa": "¿Publicación exitosa?", "tiene_ventas": "Tiene ventas?",
+    "color_col": "Color",
+}
+
+def sheet_rows_for_summary(summary, indices, seed=0, missing_ratio=0.03, extra_ratio=0.03):
+    """Sheet rows for the variants of a summary, with some variants missing (to insert) and some stale (to zero)."""
+    rng = random.Random(seed)
+    rows = []
+    for variant in summary:
+        if rng.random() < missing_ratio:
+            continue
+        row = [''] * len(SHEET_HEADERS)
+        familia = variant["familia"].upper()
+        row[indices["model"]] = variant["model_original"]
+        row[indices["familia"]] = "CONSOLAS" if "CONSOLAS" in familia else "CELULARES"
+        row[indices["vp"]] = variant["storage"]
+        if "CONSOLAS" in familia:
+            row[indices["vs"]], row[indices["color_col"]] = variant["caja"], variant["color"]
+        else:
+            row[indices["vs"]], row[indices["vt"]] = variant["color"], variant["compania"]
+        row[indices["inventory"]] = str(rng.randint(0, 20))
+        row[indices["principal_extra"]] = "Principal"
+        rows.append(row)
+        if rng.random() < extra_ratio:
+            stale = list(row)
+            stale[indices["vs"]] = "sin stock"
+            rows.append(stale)
+    return rows
+
+def simulate_gpt_colors(products, seed=0):
+    """Gives a color to part of the products left without one, as the GPT stage would."""
+    rng = random.Random(seed)
+    for product in products:
+        if rng.random() < GPT_COLOR_RATIO:
+            product["Color"] = rng.choice(["Negro", "Azul", "Blanco", "Gris"])
+    return products
+
+def measure(name, size, func, track_memory=True):
+    """Runs func silently inside profile_stage. Returns (func's result, measurement dict)."""
+    with profile_stage(name, track_memory=track_memory) as profile:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+    wall = max(profile["wall_seconds"], 1e-6)
+    measurement = {"stage": name, "size": size, "items": size, "wall_seconds": profile["wall_seconds"],
+                   "cpu_seconds": profile["cpu_seconds"], "items_per_second": round(size / wall, 1)}
+    if track_memory:
+        measurement["peak_memory_mb"] = profile["peak_memory_mb"]
+    return result, measurement
+
+def run_size(size, seed=0, profile=None, track_memory=True, record_format=None):
+    """Benchmarks every stage on one synthetic catalog of `size` products, inside a temporary directory."""
+    indices = {key: SHEET_HEADERS.index(title) for key, title in SYNC_COLUMNS.items()}
+    results = []
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            write_records(enrich.INPUT_FILE, generate_products(size, seed, profile), record_format)
+
+            # Streams the raw file into the enriched and without-color files (I/O included)
+            _, measurement = measure("enrich", size, enrich.enriquecer_productos_desde_descripcion, track_memory)
+            results.append(measurement)
+
+            base = load_records(enrich.OUTPUT_ENRICHED_FILE)
+            updates = simulate_gpt_colors(load_records(enrich.OUTPUT_WITHOUT_COLOR_FILE), seed)
+            (merged, _), measurement = measure("merge", size, lambda: merge_updates(base, updates), track_memory)
+            results.append(measurement)
+            del base, updates
+
+            summary, measurement = measure("summary", size, lambda: create_variant_summary(merged), track_memory)
+            results.append(measurement)
+            del merged
+
+            rows = sheet_rows_for_summary(summary, indices, seed)
+
+            def map_keys():
+                local_variants = sync.prepare_local_variants(summary)
+                sheet_index = sync.SheetIndex(rows, indices)
+                return sync.plan_sync(sheet_index, SHEET_HEADERS, indices, local_variants)
+            _, measurement = measure("sync_mapping", size, map_keys, track_memory)
+            measurement["items"] = len(summary)
+            measurement["items_per_second"] = round(len(summary) / max(measurement["wall_seconds"], 1e-6), 1)
+            results.append(measurement)
+        finally:
+            os.chdir(previous_dir)
+    return results
+
+# === BASELINES ===
+def baseline_key(measurement):
+    return f"{measurement['stage']}@{measurement['size']}"
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baselines(results, path=BASELINE_FILE):
+    baselines = load_baselines(path)
+    for measurement in results:
+        baselines[baseline_key(measurement)] = {k: measurement[k] for k in ("items_per_second", "peak_memory_mb")
+                                                if k in measurement}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(baselines.items())), f, indent=2, ensure_ascii=False)
+
+def find_regressions(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    """Measurements slower or bigger than their baseline by more than tolerance (a fraction)."""
+    regressions = []
+    for measurement in results:
+        baseline = baselines.get(baseline_key(measurement))
+        if not baseline:
+            continue
+        if measurement["items_per_second"] < baseline["items_per_second"] * (1 - tolerance):
+            regressions.append(f"{baseline_key(measurement)}: {measurement['items_per_second']:.0f}/s "
+                               f"vs. {baseline['items_per_second']:.0f}/s de referencia")
+        memory, reference = measurement.get("peak_memory_mb"), baseline.get("peak_memory_mb")
+        if memory is not None and reference is not None and memory > reference * (1 + tolerance) + MEMORY_SLACK_MB:
+            regressions.append(f"{baseline_key(measurement)}: {memory:.1f} MB vs. {reference:.1f} MB de referencia")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline de las etapas locales sobre catálogos sintéticos")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Número de productos por corrida")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=FORMATS, help="Formato de los archivos de las etapas (por defecto, json)")
+    parser.add_argument("--no-memory", action="store_true", help="No medir memoria (tracemalloc hace todo más lento)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Archivo de referencias")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar estos resultados como referencia")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Fracción de empeoramiento tolerada antes de marcar una regresión")
+    parser.add_argument("--output", help="Guardar resultados en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    profile = load_profile()
+    results = []
+    print(f"{'etapa':>13} {'productos':>10} {'elementos':>10} {'tiempo (s)':>10} {'elem/s':>10} {'memoria (MB)':>12}")
+    for size in args.sizes:
+        for measurement in run_size(size, args.seed, profile, not args.no_memory, args.format):
+            results.append(measurement)
+            memory = measurement.get("peak_memory_mb")
+            print(f"{measurement['stage']:>13} {size:>10} {measurement['items']:>10} {measurement['wall_seconds']:>10.2f} "
+                  f"{measurement['items_per_second']:>10.0f} {('-' if memory is None else f'{memory:.1f}'):>12}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"📁 Resultados guardados en: {args.output}")
+    if args.save_baseline:
+        save_baselines(results, args.baseline)
+        print(f"📌 Referencias actualizadas en: {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, load_baselines(args.baseline), args.tolerance)
+    for regression in regressions:
+        print(f"🐢 Regresión: {regression}")
+    if not regressions:
+        print("✅ Sin regresiones respecto a las referencias.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Offline benchmark of sync_stock_summary_to_sheets.main() against the in-memory
+fake Google Sheets backend, on synthetic sheets of increasing size.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sync --rows 1000 10000 100000 [--latency 0.05] [--error-rate 0.02]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import sync_stock_summary_to_sheets as sync
+from sheets_client import SheetsClient
+from benchmarks.fake_sheets import FakeBackend, FakeClient
+
+# Header row laid out so the template cells used by the sync (L3, Q3, R3, S3, W3, X3, AA3) line up
+SHEET_HEADERS = [
+    "Modelo", "Descripción", "Precio", "Variante Primaria", "Variante Secundaria", "Variante Terciaria",
+    "Color", "Inventario Partner", "¿Certificado?", "¿Publicación exitosa?", "Tiene ventas?",
+    "¿Principal o Extra?", "Link", "Notas", "SKU Partner", "Categoría ML", "Pagamos Ads? (primaria)",
+    "Pagamos Ads? (secundaria)", "¿Caja?", "Precio ML", "Comisión", "Envío", "Clase", "Quien publica?",
+    "Fecha alta", "Observaciones", "Familia", "Extra",
+]
+TEMPLATE_COLUMNS = ["¿Principal o Extra?", "Pagamos Ads? (primaria)", "Pagamos Ads? (secundaria)",
+                    "¿Caja?", "Clase", "Quien publica?", "Familia"]
+STORAGES = ["64GB", "128GB", "256GB", "512GB"]
+COLORS = ["negro", "blanco", "azul", "rojo", "gris", "verde"]
+COMPANIES = ["Telcel", "AT&T", "Liberado", "Movistar"]
+
+def synthetic_sheet_and_summary(n_rows, seed=0, new_variant_ratio=0.02, changed_stock_ratio=0.1, missing_ratio=0.03):
+    """Builds sheet values (title row, header row, data rows) and a matching stock summary with some drift."""
+    rng = random.Random(seed)
+    column = {title: i for i, title in enumerate(SHEET_HEADERS)}
+    values = [["Inventario de publicaciones"] + [''] * (len(SHEET_HEADERS) - 1), list(SHEET_HEADERS)]
+    summary = []
+    model_number = 0
+    while len(values) - 2 < n_rows:
+        model_number += 1
+        is_console = rng.random() < 0.15
+        model = f"{'CFI' if is_console else 'SM'}-{model_number:06d}-MEM:{rng.choice(STORAGES)}"
+        storage = model.rsplit(":", 1)[1]
+        for _ in range(rng.randint(2, 6)):
+            color = rng.choice(COLORS)
+            stock = rng.randint(0, 20)
+            row = [''] * len(SHEET_HEADERS)
+            row[column["Modelo"]] = model
+            row[column["Variante Primaria"]] = storage
+            row[column["Inventario Partner"]] = str(stock)
+            row[column["¿Principal o Extra?"]] = "Principal"
+            row[column["¿Certificado?"]] = row[column["¿Publicación exitosa?"]] = row[column["Tiene ventas?"]] = "FALSE"
+            if is_console:
+                caja = rng.choice(["c-caja", "s-caja"])
+                row[column["Familia"]] = "CONSOLAS"
+                row[column["Variante Secundaria"]] = caja
+                row[column["Color"]] = color
+                variant = {"model_original": model, "storage": storage, "color": color, "compania": "",
+                           "familia": "CONSOLAS", "caja": caja}
+            else:
+                company = rng.choice(COMPANIES)
+                row[column["Familia"]] = "CELULARES"
+                row[column["Variante Secundaria"]] = color
+                row[column["Variante Terciaria"]] = company
+                variant = {"model_original": model, "storage": storage, "color": color, "compania": company,
+                           "familia": "CELULARES", "caja": "s-caja"}
+            values.append(row)
+            if rng.random() < missing_ratio:
+                continue  # exists only in the sheet -> will be zeroed
+            new_stock = rng.randint(0, 20) if rng.random() < changed_stock_ratio else stock
+            summary.append(dict(variant, stock=new_stock))
+        if rng.random() < new_variant_ratio * 4 and not is_console:
+            summary.append({"model_original": model, "storage": storage, "color": "morado",
+                            "compania": rng.choice(COMPANIES), "familia": "CELULARES", "caja": "s-caja",
+                            "stock": rng.randint(1, 5)})
+    # Duplicated variant keys collapse in the sync; keep the summary unique the way generate_stock_summary does
+    unique = {}
+    for variant in summary:
+        unique[(variant["model_original"], variant["storage"], variant["color"], variant["compania"], variant["caja"])] = variant
+    return values, list(unique.values())
+
+def build_fake_spreadsheet(backend, values):
+    client = FakeClient(backend)
+    spreadsheet = client.create(sync.SPREADSHEET_ID)
+    sheet = spreadsheet.add_worksheet_local(sync.SHEET_NAME, values)
+    spreadsheet.add_worksheet_local(sync.AUX_SHEET_NAME)
+    template_rule = {"condition": {"type": "ONE_OF_LIST", "values": [{"userEnteredValue": "Principal"}, {"userEnteredValue": "Extra"}]}}
+    for title in TEMPLATE_COLUMNS:
+        sheet.validations.set(SHEET_HEADERS.index(title), 2, 3, template_rule)
+    return client
+
+def run_once(n_rows, latency=0.0, error_rate=0.0, seed=0, verbose=False):
+    values, summary = synthetic_sheet_and_summary(n_rows, seed=seed)
+    backend = FakeBackend(latency=latency, error_rate=error_rate, seed=seed)
+    client = build_fake_spreadsheet(backend, values)
+    # Real quotas would only add sleeps here; keep pacing out of the measurement
+    sheets_client = SheetsClient(read_per_minute=10 ** 6, write_per_minute=10 ** 6, burst=10 ** 6, base_backoff=0.01)
+
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            with open(sync.VARIANT_SUMMARY_JSON_PATH, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False)
+            output = io.StringIO()
+            redirect = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(output)
+            start = time.perf_counter()
+            with redirect:
+                sync.main(client=client, sheets_client=sheets_client)
+            wall_time = time.perf_counter() - start
+        finally:
+            os.chdir(previous_dir)
+
+    result = {"rows": n_rows, "variants": len(summary), "wall_seconds": round(wall_time, 3)}
+    result.update(backend.stats())
+    result["retries"] = sum(sheets_client.retry_counts.values())
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline de la sincronización con Google Sheets")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de un 429 simulado por llamada")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Guardar resultados en este archivo JSON")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de la sincronización")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'filas':>8} {'variantes':>9} {'tiempo (s)':>10} {'llamadas':>8} {'enviado':>10} {'recibido':>10} {'reintentos':>10}")
+    for n_rows in args.rows:
+        result = run_once(n_rows, args.latency, args.error_rate, args.seed, args.verbose)
+        results.append(result)
+        print(f"{result['rows']:>8} {result['variants']:>9} {result['wall_seconds']:>10.2f} {result['total_calls']:>8} "
+              f"{result['bytes_sent']:>10} {result['bytes_received']:>10} {result['retries']:>10}")
+        print("         " + ", ".join(f"{op}={count}" for op, count in sorted(result["calls"].items())))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"📁 Resultados guardados en: {args.output}")
+
+if __name__ == "__main__":
+    main()
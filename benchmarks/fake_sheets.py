@@ -0,0 +1,350 @@
+"""
+In-memory stand-in for the part of gspread used by sync_stock_summary_to_sheets.py,
+with configurable per-call latency, injected 429 errors and lost responses (a 503
+raised after the call was applied). Every call is counted together with the JSON
+size of what would go over the wire.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+import gspread
+
+from sheet_snapshot import parse_a1_range
+
+class FakeResponse:
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        status = "RESOURCE_EXHAUSTED" if self.status_code == 429 else "UNAVAILABLE"
+        return {"error": {"code": self.status_code, "message": self.text, "status": status}}
+
+def _payload_size(value):
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+class FakeBackend:
+    """
+    Shared state of all fake objects: latency, error injection and call/byte counters.
+    lost_responses maps an operation to how many of its next calls fail with a 503
+    after being applied, as when only the response is lost on the way back.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_every=0, seed=0, lost_responses=None):
+        self.latency = latency
+        self.lost_responses = dict(lost_responses or {})
+        self.error_rate = error_rate
+        self.error_every = error_every
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+
+    def request(self, operation, payload, handler):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls[operation] += 1
+            total_calls = sum(self.calls.values())
+            inject = (self.error_every and total_calls % self.error_every == 0) or \
+                     (self.error_rate and self.random.random() < self.error_rate)
+            if inject:
+                self.errors[operation] += 1
+            self.bytes_sent += _payload_size(payload)
+        if inject:
+            raise gspread.exceptions.APIError(FakeResponse(429, "Quota exceeded (fake)"))
+        result = handler()
+        with self.lock:
+            lost = self.lost_responses.get(operation, 0) > 0
+            if lost:
+                self.lost_responses[operation] -= 1
+                self.errors[operation] += 1
+            else:
+                self.bytes_received += _payload_size(result)
+        if lost:
+            raise gspread.exceptions.APIError(FakeResponse(503, "The service is currently unavailable (fake)"))
+        return result
+
+    def stats(self):
+        return {
+            "calls": dict(self.calls),
+            "total_calls": sum(self.calls.values()),
+            "injected_errors": sum(self.errors.values()),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+class FakeClient:
+    def __init__(self, backend=None):
+        self.backend = backend or FakeBackend()
+
+    def create(self, spreadsheet_id):
+        spreadsheet = FakeSpreadsheet(self.backend, spreadsheet_id)
+        self.backend.spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet
+
+    def open_by_key(self, key):
+        def handler():
+            if key not in self.backend.spreadsheets:
+                raise gspread.exceptions.SpreadsheetNotFound(key)
+            return self.backend.spreadsheets[key]
+        return self.backend.request("open_by_key", {"key": key}, handler)
+
+class _Segments:
+    """Per-column list of (start_row, end_row, value) ranges (0-based, end exclusive); later segments win."""
+
+    def __init__(self):
+        self.by_column = {}
+
+    def set(self, col, start, end, value):
+        self.by_column.setdefault(col, []).append((start, end, value))
+
+    def get(self, row, col):
+        for start, end, value in reversed(self.by_column.get(col, [])):
+            if start <= row < end:
+                return value
+        return None
+
+    def insert_rows(self, at, count):
+        for col, segments in self.by_column.items():
+            shifted = []
+            for start, end, value in segments:
+                if end <= at:
+                    shifted.append((start, end, value))
+                elif start >= at:
+                    shifted.append((start + count, end + count, value))
+                else:
+                    shifted.append((start, at, value))
+                    shifted.append((at + count, end + count, value))
+            self.by_column[col] = shifted
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, values=None):
+        self.spreadsheet = spreadsheet
+        self.backend = spreadsheet.backend
+        self.id = sheet_id
+        self.title = title
+        self.values = [list(map(str, row)) for row in (values or [])]
+        self.validations = _Segments()
+        self.formats = _Segments()
+
+    # --- Local helpers (no API call) ---
+    def _width(self):
+        return max((len(row) for row in self.values), default=0)
+
+    def _set(self, row_idx, col_idx, value):
+        while len(self.values) <= row_idx:
+            self.values.append([])
+        row = self.values[row_idx]
+        if len(row) <= col_idx:
+            row.extend([''] * (col_idx + 1 - len(row)))
+        row[col_idx] = '' if value is None else str(value)
+
+    def _write_range(self, a1_range, rows):
+        first_row, first_col, _, _ = parse_a1_range(a1_range)
+        for row_offset, row_values in enumerate(rows):
+            for col_offset, value in enumerate(row_values):
+                self._set(first_row - 1 + row_offset, first_col + col_offset, value)
+
+    def _read_range(self, a1_range):
+        if "!" in a1_range:
+            a1_range = a1_range.rsplit("!", 1)[1]
+        start, _, end = a1_range.partition(":")
+        first_row, first_col, _, _ = parse_a1_range(start if any(c.isdigit() for c in start) else start + "1")
+        if end and any(c.isdigit() for c in end):
+            _, _, last_row, last_col = parse_a1_range(end)
+        else:
+            _, _, _, last_col = parse_a1_range((end or start).rstrip("0123456789") + "1")
+            last_row = len(self.values)
+        out = []
+        for row_idx in range(first_row - 1, min(last_row, len(self.values))):
+            row = self.values[row_idx]
+            out.append([row[c] if c < len(row) else '' for c in range(first_col, last_col + 1)])
+        for row in out:
+            while row and row[-1] == '':
+                row.pop()
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def _insert_rows(self, start_index, count):
+        self.values[start_index:start_index] = [[] for _ in range(count)]
+        self.validations.insert_rows(start_index, count)
+        self.formats.insert_rows(start_index, count)
+
+    # --- gspread surface ---
+    def get_all_values(self):
+        def handler():
+            width = self._width()
+            return [row + [''] * (width - len(row)) for row in self.values]
+        return self.backend.request("get_all_values", {"sheet": self.title}, handler)
+
+    def col_values(self, col):
+        def handler():
+            column = [row[col - 1] if col - 1 < len(row) else '' for row in self.values]
+            while column and column[-1] == '':
+                column.pop()
+            return column
+        return self.backend.request("col_values", {"col": col}, handler)
+
+    def row_values(self, row, **kwargs):
+        def handler():
+            values = list(self.values[row - 1]) if row <= len(self.values) else []
+            while values and values[-1] == '':
+                values.pop()
+            return values
+        return self.backend.request("row_values", {"row": row}, handler)
+
+    def get(self, range_name=None, **kwargs):
+        return self.backend.request("get", {"range": range_name}, lambda: self._read_range(range_name))
+
+    def batch_update(self, data, raw=True, value_input_option=None, **kwargs):
+        data = list(data)
+        def handler():
+            for update in data:
+                self._write_range(update['range'], update['values'])
+            return {"totalUpdatedCells": sum(len(row) for update in data for row in update['values'])}
+        return self.backend.request("batch_update", data, handler)
+
+    def batch_clear(self, ranges):
+        def handler():
+            for a1_range in ranges:
+                first_col = parse_a1_range(a1_range.split(":")[0] + "1")[1]
+                last_col = parse_a1_range(a1_range.split(":")[-1] + "1")[1]
+                for row in self.values:
+                    for col in range(first_col, min(last_col + 1, len(row))):
+                        row[col] = ''
+            return {}
+        return self.backend.request("batch_clear", {"ranges": ranges}, handler)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        def handler():
+            self._write_range(range_name or "A1", values)
+            return {}
+        return self.backend.request("update", {"range": range_name, "values": values}, handler)
+
+    def insert_row(self, values, index=1, value_input_option=None, inherit_from_before=False):
+        def handler():
+            self._insert_rows(index - 1, 1)
+            self._write_range(f"A{index}", [values])
+            return {}
+        return self.backend.request("insert_row", {"values": values, "index": index}, handler)
+
+class FakeSpreadsheet:
+    def __init__(self, backend, spreadsheet_id):
+        self.backend = backend
+        self.id = spreadsheet_id
+        self.sheets = {}
+
+    def add_worksheet_local(self, title, values=None):
+        """Creates a worksheet without counting an API call (test setup)."""
+        sheet = FakeWorksheet(self, len(self.sheets), title, values)
+        self.sheets[title] = sheet
+        return sheet
+
+    def _sheet_by_id(self, sheet_id):
+        for sheet in self.sheets.values():
+            if sheet.id == sheet_id:
+                return sheet
+        raise KeyError(sheet_id)
+
+    def _sheet_for_range(self, a1_range):
+        if "!" in a1_range:
+            return self.sheets[a1_range.rsplit("!", 1)[0].strip("'")]
+        return next(iter(self.sheets.values()))
+
+    def worksheet(self, title):
+        def handler():
+            if title not in self.sheets:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            return self.sheets[title]
+        return self.backend.request("worksheet", {"title": title}, handler)
+
+    def add_worksheet(self, title, rows=100, cols=26):
+        return self.backend.request("add_worksheet", {"title": title}, lambda: self.add_worksheet_local(title))
+
+    def batch_update(self, body):
+        def handler():
+            for request in body.get("requests", []):
+                self._apply_request(request)
+            return {"replies": [{} for _ in body.get("requests", [])]}
+        return self.backend.request("spreadsheet.batch_update", body, handler)
+
+    def _apply_request(self, request):
+        if "insertDimension" in request:
+            grid = request["insertDimension"]["range"]
+            self._sheet_by_id(grid["sheetId"])._insert_rows(grid["startIndex"], grid["endIndex"] - grid["startIndex"])
+        elif "setDataValidation" in request:
+            grid = request["setDataValidation"]["range"]
+            sheet = self._sheet_by_id(grid["sheetId"])
+            for col in range(grid["startColumnIndex"], grid["endColumnIndex"]):
+                sheet.validations.set(col, grid["startRowIndex"], grid["endRowIndex"], request["setDataValidation"].get("rule"))
+        elif "copyPaste" in request:
+            source, destination = request["copyPaste"]["source"], request["copyPaste"]["destination"]
+            source_sheet = self._sheet_by_id(source["sheetId"])
+            rule = source_sheet.validations.get(source["startRowIndex"], source["startColumnIndex"])
+            sheet = self._sheet_by_id(destination["sheetId"])
+            for col in range(destination["startColumnIndex"], destination["endColumnIndex"]):
+                sheet.validations.set(col, destination["startRowIndex"], destination["endRowIndex"], rule)
+        elif "repeatCell" in request:
+            grid = request["repeatCell"]["range"]
+            sheet = self._sheet_by_id(grid["sheetId"])
+            cell_format = request["repeatCell"]["cell"].get("userEnteredFormat")
+            for col in range(grid["startColumnIndex"], grid["endColumnIndex"]):
+                sheet.formats.set(col, grid["startRowIndex"], grid["endRowIndex"], cell_format)
+        else:
+            raise ValueError(f"Solicitud no soportada por la hoja simulada: {list(request)}")
+
+    def fetch_sheet_metadata(self, params=None):
+        params = params or {}
+        def handler():
+            data = []
+            for a1_range in params.get("ranges", []):
+                sheet = self._sheet_for_range(a1_range)
+                first_row, col, last_row, _ = parse_a1_range(a1_range)
+                row_data = []
+                for row_idx in range(first_row - 1, last_row):
+                    cell = {}
+                    validation = sheet.validations.get(row_idx, col)
+                    cell_format = sheet.formats.get(row_idx, col)
+                    if validation:
+                        cell["dataValidation"] = validation
+                    if cell_format:
+                        cell["userEnteredFormat"] = cell_format
+                    row_data.append({"values": [cell]})
+                data.append({"startRow": first_row - 1, "startColumn": col, "rowData": row_data})
+            return {"sheets": [{"data": data}]}
+        return self.backend.request("fetch_sheet_metadata", params, handler)
+
+    def values_batch_get(self, ranges, params=None):
+        def handler():
+            return {"spreadsheetId": self.id, "valueRanges": [
+                {"range": a1_range, "majorDimension": (params or {}).get("majorDimension", "ROWS"),
+                 "values": self._values_for(a1_range, (params or {}).get("majorDimension", "ROWS"))}
+                for a1_range in ranges
+            ]}
+        return self.backend.request("values_batch_get", {"ranges": ranges, "params": params}, handler)
+
+    def _values_for(self, a1_range, major_dimension):
+        values = self._sheet_for_range(a1_range)._read_range(a1_range)
+        if major_dimension != "COLUMNS":
+            return values
+        width = max((len(row) for row in values), default=0)
+        columns = [[row[c] if c < len(row) else '' for row in values] for c in range(width)]
+        for column in columns:
+            while column and column[-1] == '':
+                column.pop()
+        return columns
+
+    def values_batch_update(self, body):
+        def handler():
+            for value_range in body.get("data", []):
+                self._sheet_for_range(value_range["range"])._write_range(value_range["range"], value_range["values"])
+            return {}
+        return self.backend.request("values_batch_update", body, handler)
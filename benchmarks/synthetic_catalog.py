@@ -0,0 +1,175 @@
+"""
+Synthetic catalog generator: products shaped like raw_scraped_products_debug.json, with
+brands, Modelo codes (MEM:/DD: suffixes), carriers, stores and prices drawn from a real
+snapshot (products_without_color.json by default) and descriptions with masked IMEIs.
+
+Usage (from the repository root):
+    python -m benchmarks.synthetic_catalog --products 100000 --output raw_scraped_products_debug.json [--format ndjson]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from record_files import FORMATS, read_records, write_records
+from scraper_all_products import STORES
+
+PROFILE_SOURCE = os.path.join(ROOT_DIR, "products_without_color.json")
+
+# Share of products that get a model code never seen in the snapshot, so the number of
+# variants keeps growing with the catalog the way it does across the real stores; each
+# new code is shared by about NEW_MODEL_REPEATS products
+NEW_MODEL_RATIO = 0.1
+NEW_MODEL_REPEATS = 5
+PRICE_JITTER = 0.15
+COLOR_MENTION_RATIO = 0.55
+
+# Fallback when no snapshot is available: (categoría, marca, modelo, median price) from the observed data
+FALLBACK_MODELS = [
+    ("CELULARES", "OPPO", "CPH2599-MEM:256GB", 2300), ("CELULARES", "OPPO", "CPH2579-MEM:128GB", 2100),
+    ("CELULARES", "SAMSUNG", "SM-A556E-MEM:128GB", 2100), ("CELULARES", "SAMSUNG", "SM-A346M/N-MEM:128GB", 1900),
+    ("CELULARES", "HONOR", "TFY-LX3-MEM:128GB", 2100), ("CELULARES", "VIVO", "V2314-MEM:256GB", 2400),
+    ("CELULARES", "HUAWEI", "JLN-LX3-MEM:128GB", 1750), ("CELULARES", "REALME", "RMX3710-MEM:256GB", 2267),
+    ("CELULARES", "APPLE", "IPHONE 13 (A2631)-MEM:128GB", 10173), ("CELULARES", "ZTE", "Z2350-MEM:256GB", 1300),
+    ("CONSOLAS DE JUEGOS", "SONY", "CUH2215B-DD:1TB-ED:SIN_EDICION", 3500),
+    ("CONSOLAS DE JUEGOS", "MICROSOFT", "1681-DD:1TB-ED:SIN_EDICION", 3200),
+    ("CONSOLAS DE JUEGOS", "NINTENDO", "HAC001-DD:32GB-ED:SIN_EDICION", 3200),
+]
+CARRIERS = {"LIBERADO": 1294, "TELCEL": 942, "AT&T": 467, "UNEFON": 158, "MOVISTAR": 155}
+COLOR_WORDS = ["NEGRO", "BLANCO", "AZUL", "ROJO", "VERDE", "GRIS", "MORADO", "ROSA", "DORADO", "PLATA",
+               "BLACK", "WHITE", "BLUE", "SILVER", "GOLD", "PURPLE", "CAFE", "TURQUESA", "TORNASOL"]
+PHONE_DETAILS = ["CON CAJA", "SIN CAJA", "CON CARGADOR", "SIN CARGADOR", "CON CABLE", "DETALLES DE USO",
+                 "EN BUEN ESTADO", "CON FUNDA", "PANTALLA ESTRELLADA", "CON 8 DE RAM", "CON 128 DE ALM"]
+CONSOLE_DETAILS = ["C/CONTROL", "C/CABLES DE CORRIENTE", "C/HDMI", "SIN JUEGO", "DETALLES DE USO",
+                   "EN CAJA", "SIN CAJA", "CON 2 CONTROLES", "C/DESGASTE POR USO"]
+
+def parse_price(price_string):
+    try:
+        return float(price_string.replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+def format_price(pesos):
+    return f"$ {pesos:,.2f}"
+
+def fit_profile(products):
+    """
+    Observed distributions of a product snapshot: model frequencies (with their
+    category, brand and prices), carriers and stores.
+    """
+    models = {}
+    prices = defaultdict(list)
+    carriers = Counter()
+    stores = Counter()
+    for product in products:
+        key = (product.get("Categoría", ""), product.get("Marca", ""), product.get("Modelo", ""))
+        if not all(key):
+            continue
+        models[key] = models.get(key, 0) + 1
+        price = parse_price(product.get("Precio Promoción", ""))
+        if price:
+            prices[key].append(price)
+        carrier = re.search(r"-COM:([^-\s]+)", product.get("Descripción", ""))
+        if carrier:
+            carriers[carrier.group(1).upper()] += 1
+        stores[str(product.get("ID Sucursal", "")).strip()] += 1
+    return {
+        "models": [{"category": c, "brand": b, "model": m, "weight": w, "prices": prices[(c, b, m)] or [2000.0]}
+                   for (c, b, m), w in models.items()],
+        "carriers": dict(carriers) or dict(CARRIERS),
+        "stores": dict(stores),
+    }
+
+def fallback_profile():
+    return {
+        "models": [{"category": c, "brand": b, "model": m, "weight": 1, "prices": [price * 0.6, price, price * 1.8]}
+                   for c, b, m, price in FALLBACK_MODELS],
+        "carriers": dict(CARRIERS),
+        "stores": {},
+    }
+
+def load_profile(path=PROFILE_SOURCE):
+    if path and os.path.exists(path):
+        return fit_profile(read_records(path))
+    return fallback_profile()
+
+def _new_model_code(rng, template):
+    """A model code that looks like template (same brand prefix style and MEM:/DD: suffix) but is new."""
+    code, sep, suffix = template.partition("-MEM:") if "-MEM:" in template else template.partition("-DD:")
+    digits = "".join(rng.choice("0123456789") for _ in range(4))
+    letters = re.sub(r"[^A-Z]", "", code.upper())[:3] or "X"
+    return f"{letters}{digits}{rng.choice(['', 'B', 'G', 'M'])}{sep}{suffix}" if sep else f"{letters}{digits}"
+
+def _description(rng, entry, model, carrier):
+    brand = entry["brand"]
+    imei = "".join(rng.choice("0123456789") for _ in range(5))
+    if entry["category"] == "CELULARES":
+        details = rng.sample(PHONE_DETAILS, rng.randint(1, 4))
+        head = f"{brand} {model}-COM:{carrier}-IMEI:**********{imei}"
+    else:
+        details = rng.sample(CONSOLE_DETAILS, rng.randint(1, 4))
+        head = f"CONSOLA {brand} {model}"
+    if rng.random() < COLOR_MENTION_RATIO:
+        details.insert(rng.randint(0, len(details)), f"COLOR {rng.choice(COLOR_WORDS)}")
+    parts = [head] + details
+    if rng.random() < 0.3:
+        parts.reverse()  # Descriptions often start with the free text and end with the code
+    return " ".join(parts)
+
+def generate_products(count, seed=0, profile=None):
+    """Yields count synthetic raw products (same keys as the scraper output)."""
+    rng = random.Random(seed)
+    profile = profile or load_profile()
+    entries = profile["models"]
+    # Cumulative weights: rng.choices would otherwise re-add them on every call
+    model_weights = list(accumulate(entry["weight"] for entry in entries))
+    carriers, carrier_weights = zip(*profile["carriers"].items())
+    carrier_weights = list(accumulate(carrier_weights))
+    store_ids = list(STORES)
+    store_weights = list(accumulate(profile["stores"].get(store_id, 1) for store_id in store_ids))
+    total_weight = model_weights[-1]
+    new_models = {}
+
+    for i in range(count):
+        entry = rng.choices(entries, cum_weights=model_weights)[0]
+        model = entry["model"]
+        if rng.random() < NEW_MODEL_RATIO:
+            expected_new = count * entry["weight"] / total_weight * NEW_MODEL_RATIO
+            slot = (entry["model"], rng.randrange(max(1, int(expected_new / NEW_MODEL_REPEATS))))
+            model = new_models.get(slot) or new_models.setdefault(slot, _new_model_code(rng, entry["model"]))
+        carrier = rng.choices(carriers, cum_weights=carrier_weights)[0]
+        price = rng.choice(entry["prices"]) * (1 + rng.uniform(-PRICE_JITTER, PRICE_JITTER))
+        store_id = rng.choices(store_ids, cum_weights=store_weights)[0]
+        yield {
+            "SKU": f"{300000000 + i}.1",
+            "Marca": entry["brand"],
+            "Modelo": model,
+            "Descripción": _description(rng, entry, model, carrier),
+            "Precio Promoción": format_price(round(price)),
+            "Sucursal": STORES[store_id],
+            "ID Sucursal": store_id,
+            "Categoría": entry["category"],
+            "Familia": f"{entry['category']} (usado)",
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un catálogo sintético con las distribuciones observadas")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--output", default="raw_scraped_products_debug.json")
+    parser.add_argument("--format", choices=FORMATS, help="Formato del archivo (por defecto, el del pipeline)")
+    parser.add_argument("--profile", default=PROFILE_SOURCE, help="Snapshot real del que se toman las distribuciones")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    count = write_records(args.output, generate_products(args.products, args.seed, load_profile(args.profile)), args.format)
+    print(f"🧪 {count} productos sintéticos guardados en: {args.output}")
+
+if __name__ == "__main__":
+    main()
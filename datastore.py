@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from generate_stock_summary import VARIANT_FIELDS
+from record_files import read_records, write_records
+
+DATASTORE_PATH = "stock.db"
+SCHEMA_VERSION = 1
+WRITE_BATCH_SIZE = 1000
+
+# Product-shaped tables and the JSON file each one mirrors
+PRODUCT_TABLES = {
+    "products": "raw_scraped_products_debug.json",
+    "enrichment": "products_enriched.json",
+    "color_updates": "products_without_color.json",
+}
+VARIANT_SUMMARY_TABLE = "variant_summary"
+VARIANT_SUMMARY_FILE = "stock_summary.json"
+TABLE_FILES = dict(PRODUCT_TABLES, **{VARIANT_SUMMARY_TABLE: VARIANT_SUMMARY_FILE})
+
+def _row_hash(data):
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+def _dump(record):
+    # Key order is kept so exports match the original files
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+def product_key(product, position):
+    """SKU identifies a product; the rare row without SKU is keyed by its position."""
+    sku = str(product.get("SKU", "") or "").strip()
+    return sku if sku else f"pos:{position}"
+
+def variant_key(variant):
+    return _dump([variant.get(field, "") for field in VARIANT_FIELDS])
+
+class StockStore:
+    """
+    SQLite store for the product files of the pipeline (raw products, enrichment
+    results, color updates) and the variant summary. Every row keeps the JSON of the
+    original record plus indexed columns (SKU, model, store, color / variant key) and
+    a content hash, so re-importing a file only writes the rows that changed and the
+    stages can read or update just the rows they touch inside a transaction.
+    """
+
+    def __init__(self, path=DATASTORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.conn:
+            yield self.conn
+
+    def _create_schema(self):
+        with self.transaction() as conn:
+            for table in PRODUCT_TABLES:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        key TEXT PRIMARY KEY, position INTEGER NOT NULL, sku TEXT, model TEXT,
+                        store_id TEXT, category TEXT, color TEXT, row_hash TEXT NOT NULL, data TEXT NOT NULL
+                    )""")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_sku ON {table}(sku)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_model ON {table}(model)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_store ON {table}(store_id)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_position ON {table}(position)")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {VARIANT_SUMMARY_TABLE} (
+                    variant_key TEXT PRIMARY KEY, position INTEGER NOT NULL, model_original TEXT, storage TEXT,
+                    color TEXT, compania TEXT, familia TEXT, caja TEXT, stock INTEGER NOT NULL, row_hash TEXT NOT NULL
+                )""")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{VARIANT_SUMMARY_TABLE}_model ON {VARIANT_SUMMARY_TABLE}(model_original)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{VARIANT_SUMMARY_TABLE}_position ON {VARIANT_SUMMARY_TABLE}(position)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    # --- Product tables ---
+    def _check_table(self, table):
+        if table not in PRODUCT_TABLES:
+            raise ValueError(f"Tabla de productos desconocida: {table}")
+
+    def replace_products(self, table, products):
+        """
+        Makes the table hold exactly these products, in this order. products may be any
+        iterable (e.g. read_records), consumed once inside a single transaction: rows are
+        upserted in batches, only new, changed or moved rows are written, and rows not
+        seen are deleted at the end. If reading fails midway nothing changes.
+        Returns (written, deleted).
+        """
+        self._check_table(table)
+        seen = set()
+        with self.transaction() as conn:
+            changes_before = conn.total_changes
+            batch = []
+            for position, product in enumerate(products):
+                key = product_key(product, position)
+                if key in seen:
+                    key = f"{key}#{position}"
+                seen.add(key)
+                data = _dump(product)
+                batch.append((key, position, product.get("SKU"), product.get("Modelo"), str(product.get("ID Sucursal", "")).strip(),
+                              product.get("Categoría"), product.get("Color"), _row_hash(data), data))
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    self._upsert_products(conn, table, batch)
+                    batch = []
+            self._upsert_products(conn, table, batch)
+            written = conn.total_changes - changes_before
+
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_keys (key TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM seen_keys")
+            conn.executemany("INSERT INTO seen_keys VALUES (?)", ((key,) for key in seen))
+            deleted = conn.execute(f"DELETE FROM {table} WHERE key NOT IN (SELECT key FROM seen_keys)").rowcount
+            conn.execute("DELETE FROM seen_keys")
+        return written, deleted
+
+    def _upsert_products(self, conn, table, rows):
+        # The WHERE clause turns an unchanged row into a no-op, so total_changes counts real writes only
+        conn.executemany(f"""
+            INSERT INTO {table} (key, position, sku, model, store_id, category, color, row_hash, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET position=excluded.position, sku=excluded.sku, model=excluded.model,
+                store_id=excluded.store_id, category=excluded.category, color=excluded.color,
+                row_hash=excluded.row_hash, data=excluded.data
+            WHERE row_hash != excluded.row_hash OR position != excluded.position""", rows)
+
+    def products(self, table, sku=None, model=None, store_id=None):
+        """Products of a table in file order, optionally filtered by the indexed columns."""
+        self._check_table(table)
+        clauses, params = [], []
+        for column, value in (("sku", sku), ("model", model), ("store_id", store_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [json.loads(data) for (data,) in self.conn.execute(f"SELECT data FROM {table}{where} ORDER BY position", params)]
+
+    def count(self, table):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def merged_products(self):
+        """
+        Same result as merge_color_updates.merge_updates(enrichment, color_updates), one
+        product at a time: every enriched product, replaced by its color update when that
+        update has a color. Yields (product, replaced) pairs.
+        """
+        query = """
+            SELECT e.data, (SELECT c.data FROM color_updates c
+                            WHERE c.sku = e.sku AND TRIM(COALESCE(c.color, '')) != ''
+                            ORDER BY c.position DESC LIMIT 1)
+            FROM enrichment e ORDER BY e.position"""
+        for enriched, update in self.conn.execute(query):
+            yield json.loads(update if update is not None else enriched), update is not None
+
+    # --- Variant summary ---
+    def replace_variant_summary(self, summary):
+        existing = dict(self.conn.execute(f"SELECT variant_key, row_hash || ':' || position FROM {VARIANT_SUMMARY_TABLE}"))
+        rows, seen = [], set()
+        for position, variant in enumerate(summary):
+            key = variant_key(variant)
+            seen.add(key)
+            row_hash = _row_hash(_dump(variant))
+            if existing.get(key) == f"{row_hash}:{position}":
+                continue
+            rows.append((key, position, *(variant.get(field, "") for field in VARIANT_FIELDS), int(variant.get("stock", 0)), row_hash))
+        stale = [(key,) for key in existing if key not in seen]
+        with self.transaction() as conn:
+            conn.executemany(f"""
+                INSERT INTO {VARIANT_SUMMARY_TABLE} (variant_key, position, {', '.join(VARIANT_FIELDS)}, stock, row_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(variant_key) DO UPDATE SET position=excluded.position, stock=excluded.stock,
+                    row_hash=excluded.row_hash""", rows)
+            conn.executemany(f"DELETE FROM {VARIANT_SUMMARY_TABLE} WHERE variant_key = ?", stale)
+        return len(rows), len(stale)
+
+    def variant_summary(self, model=None):
+        where, params = ("WHERE model_original = ?", (model,)) if model is not None else ("", ())
+        rows = self.conn.execute(
+            f"SELECT {', '.join(VARIANT_FIELDS)}, stock FROM {VARIANT_SUMMARY_TABLE} {where} ORDER BY position", params)
+        return [dict(zip(VARIANT_FIELDS + ("stock",), row)) for row in rows]
+
+    # --- JSON import / export ---
+    def import_json(self, table, path=None):
+        path = path or TABLE_FILES[table]
+        records = read_records(path)
+        if table == VARIANT_SUMMARY_TABLE:
+            return self.replace_variant_summary(records)
+        return self.replace_products(table, records)
+
+    def export_json(self, table, path=None, format=None):
+        """Writes the table back as a stage file (same content as the file it mirrors; see record_files for formats)."""
+        path = path or TABLE_FILES[table]
+        records = self.variant_summary() if table == VARIANT_SUMMARY_TABLE else self.products(table)
+        return write_records(path, records, format)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa y exporta los archivos JSON del pipeline a la base SQLite")
+    parser.add_argument("action", choices=["import", "export", "stats"])
+    parser.add_argument("tables", nargs="*", help=f"Tablas: {', '.join(TABLE_FILES)} (por defecto, todas)")
+    parser.add_argument("--db", default=DATASTORE_PATH)
+    parser.add_argument("--path", help="Archivo JSON (solo con una tabla)")
+    args = parser.parse_args(argv)
+    tables = args.tables or list(TABLE_FILES)
+    unknown = [table for table in tables if table not in TABLE_FILES]
+    if unknown:
+        parser.error(f"Tablas desconocidas: {', '.join(unknown)}")
+    if args.path and len(tables) != 1:
+        parser.error("--path requiere exactamente una tabla.")
+
+    with StockStore(args.db) as store:
+        for table in tables:
+            if args.action == "import":
+                path = args.path or TABLE_FILES[table]
+                if not os.path.exists(path):
+                    print(f"⚠️ {table}: no existe '{path}', se omite.")
+                    continue
+                written, deleted = store.import_json(table, path)
+                print(f"📥 {table}: {written} filas escritas, {deleted} eliminadas ({store.count(table)} en total).")
+            elif args.action == "export":
+                count = store.export_json(table, args.path)
+                print(f"📤 {table}: {count} filas exportadas a '{args.path or TABLE_FILES[table]}'.")
+            else:
+                print(f"🗃️ {table}: {store.count(table)} filas.")
+
+if __name__ == "__main__":
+    main()
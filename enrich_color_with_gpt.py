@@ -1,15 +1,40 @@
 import os
+import argparse
 import json
+import logging
+import math
 import time
+from collections import Counter
 import requests
 from openai import OpenAI, RateLimitError
 from dotenv import load_dotenv
 
+from generate_stock_summary import parse_price_cents
+from record_files import RecordWriter, read_records
+
 load_dotenv()
 
 MODEL = "gpt-4o-mini"
 INPUT_FILE = "products_without_color.json"
 OUTPUT_FILE = "products_without_color.json"
+# Every scraped product (with or without color) gives the stock depth of each model
+STOCK_SOURCE_FILE = "raw_scraped_products_debug.json"
+# Written by the sheet sync: models marked 'Principal', the only ones it updates
+PRINCIPAL_MODELS_FILE = "principal_models.json"
+PRINCIPAL_WEIGHT = 10.0
+
+# Budget limits per run; empty or unset means no limit. The CLI flags override them.
+MAX_CALLS_ENV = "GPT_MAX_CALLS"
+MAX_COST_ENV = "GPT_MAX_COST_USD"
+MAX_MINUTES_ENV = "GPT_MAX_MINUTES"
+COST_PER_CALL_ENV = "GPT_COST_PER_CALL_USD"
+# Rough cost of one low-token image request to gpt-4o-mini
+DEFAULT_COST_PER_CALL_USD = 0.003
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive session for the image lookups
+HTTP_SESSION = requests.Session()
 
 # Inicializa cliente OpenAI
 try:
@@ -20,7 +45,7 @@ except Exception as e:
 
 def fetch_efectimundo_images(sku):
     try:
-        res = requests.post("https://efectimundo.com.mx/catalogo/consulta_catalogo.php", params={
+        res = HTTP_SESSION.post("https://efectimundo.com.mx/catalogo/consulta_catalogo.php", params={
             "metodo": "guardayMuestaImagenes", "prenda": sku
         }, timeout=10)
         data = res.json()
@@ -67,57 +92,211 @@ def detect_color_in_image(image_url):
         print(f"❌ Error al analizar imagen {image_url}: {e}")
         return None
 
-def enriquecer_colores_con_gpt():
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        productos = json.load(f)
+def analizar_producto(producto):
+    """
+    Looks up the product's image and asks the model for its color, updating the product
+    in place. Returns "actualizado", "sin_color", "sin_imagen", "rate_limit",
+    "sin_cliente" (no OpenAI client, so no request was sent), or None when there is
+    nothing to analyze.
+    """
+    color = producto.get("Color", "").strip().lower()
+    if color:
+        return None  # Ya tiene color válido
+
+    sku = producto.get("SKU", "").strip()
+    if not sku:
+        return None
+    if not client:
+        return "sin_cliente"
+
+    imagenes = fetch_efectimundo_images(sku)
+    if not imagenes:
+        return "sin_imagen"
+
+    image_url = imagenes[0]
+    logger.debug(f"🔍 Analizando SKU {sku} con imagen: {image_url}")
+
+    try:
+        color_detectado = detect_color_in_image(image_url)
+    except RateLimitError:
+        return "rate_limit"
+
+    time.sleep(1.1)  # Para evitar límites de tasa
+    if color_detectado:
+        producto["Color"] = color_detectado
+        logger.debug(f"🎨 Color detectado: {color_detectado}")
+        return "actualizado"
+    return "sin_color"
+
+# === BUDGET & PRIORITY ===
+def _env_float(name):
+    value = os.environ.get(name, "").strip()
+    return float(value) if value else None
 
-    actualizados = 0
-    sin_color = 0
-    sin_imagen = 0
-    analizados = 0
+class Presupuesto:
+    """Call, cost and time limits of one run. A None limit never runs out."""
 
-    for producto in productos:
-        color = producto.get("Color", "").strip().lower()
-        if color:
-            continue  # Ya tiene color válido
+    def __init__(self, max_calls=None, max_cost=None, max_minutes=None, cost_per_call=DEFAULT_COST_PER_CALL_USD):
+        self.max_calls = max_calls
+        self.max_cost = max_cost
+        self.max_seconds = max_minutes * 60 if max_minutes is not None else None
+        self.cost_per_call = cost_per_call
+        self.calls = 0
+        self.started_at = time.monotonic()
 
-        sku = producto.get("SKU", "").strip()
-        if not sku:
-            continue
+    @classmethod
+    def from_env(cls):
+        max_calls = _env_float(MAX_CALLS_ENV)
+        cost_per_call = _env_float(COST_PER_CALL_ENV)
+        return cls(int(max_calls) if max_calls is not None else None, _env_float(MAX_COST_ENV),
+                   _env_float(MAX_MINUTES_ENV), DEFAULT_COST_PER_CALL_USD if cost_per_call is None else cost_per_call)
 
-        imagenes = fetch_efectimundo_images(sku)
-        if not imagenes:
-            sin_imagen += 1
-            continue
+    @property
+    def cost(self):
+        return self.calls * self.cost_per_call
 
-        image_url = imagenes[0]
-        print(f"🔍 Analizando SKU {sku} con imagen: {image_url}")
+    def record_call(self):
+        self.calls += 1
 
-        try:
-            color_detectado = detect_color_in_image(image_url)
-            analizados += 1
+    def exhausted(self):
+        """Why one more call would go over the budget, or None if it still fits."""
+        if self.max_calls is not None and self.calls >= self.max_calls:
+            return f"límite de {self.max_calls} llamadas"
+        if self.max_cost is not None and self.cost + self.cost_per_call > self.max_cost:
+            return f"límite de costo de ${self.max_cost:.2f} USD"
+        if self.max_seconds is not None and time.monotonic() - self.started_at >= self.max_seconds:
+            return f"límite de {self.max_seconds / 60:g} minutos"
+        return None
 
-            if color_detectado:
-                producto["Color"] = color_detectado
-                actualizados += 1
-                print(f"🎨 Color detectado: {color_detectado}")
+def load_principal_models(path=PRINCIPAL_MODELS_FILE):
+    """Models marked 'Principal' in the sheet at the last sync, or None if no sync has saved them yet."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return set(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def stock_by_model(path=STOCK_SOURCE_FILE, fallback=()):
+    """Units per Modelo across every scraped product (or across fallback if the scrape file is missing)."""
+    products = read_records(path) if os.path.exists(path) else fallback
+    return Counter(producto.get("Modelo", "") for producto in products)
+
+def valor_producto(producto, stock, principales):
+    """
+    Business value of finding the product's color: its promotion price, scaled up
+    with the stock depth of its model and by PRINCIPAL_WEIGHT when the model is
+    'Principal' in the sheet (the sync only updates those models).
+    """
+    precio = (parse_price_cents(producto.get("Precio Promoción", "")) or 0) / 100
+    modelo = producto.get("Modelo", "")
+    valor = precio * (1 + math.log1p(stock.get(modelo, 0)))
+    if principales and modelo in principales:
+        valor *= PRINCIPAL_WEIGHT
+    return valor
+
+def priorizar_productos(productos, stock, principales):
+    """Positions of the products without color, most valuable first (file order breaks ties)."""
+    pendientes = [i for i, producto in enumerate(productos)
+                  if not producto.get("Color", "").strip() and producto.get("SKU", "").strip()]
+    valores = {i: valor_producto(productos[i], stock, principales) for i in pendientes}
+    return sorted(pendientes, key=lambda i: -valores[i]), valores
+
+def analizar_productos(productos, presupuesto, principales=None, stock=None):
+    """
+    Analyzes the products without color in place, most valuable first, until the list,
+    the budget or the API rate limit runs out (or on Ctrl+C). Returns the counters and
+    why it stopped early (None if every product was analyzed). Only requests that
+    reached the API count against the budget.
+    """
+    orden, valores = priorizar_productos(productos, stock if stock is not None else stock_by_model(fallback=productos),
+                                         principales)
+    print(f"📋 {len(orden)} productos por analizar, del más valioso al menos valioso.")
+    resultados = {"pendientes": len(orden), "analizados": 0, "actualizados": 0, "sin_color": 0, "sin_imagen": 0,
+                  "valor_cubierto": 0.0}
+    motivo = None
+    try:
+        for i in orden:
+            motivo = presupuesto.exhausted()
+            if motivo:
+                break
+            resultado = analizar_producto(productos[i])
+            if resultado == "rate_limit":
+                motivo = "rate limit de la API"
+                break
+            if resultado == "sin_cliente":
+                motivo = "cliente de OpenAI no disponible"
+                break
+            if resultado == "sin_imagen":
+                resultados["sin_imagen"] += 1
+                continue
+            presupuesto.record_call()
+            resultados["analizados"] += 1
+            if resultado == "actualizado":
+                resultados["actualizados"] += 1
+                resultados["valor_cubierto"] += valores[i]
             else:
-                sin_color += 1
+                resultados["sin_color"] += 1
+    except KeyboardInterrupt:
+        motivo = "interrumpido por el usuario"
+    resultados["pendientes"] -= resultados["analizados"] + resultados["sin_imagen"]
+    return resultados, motivo
 
-        except RateLimitError:
-            break
+def cargar_pendientes(path=INPUT_FILE):
+    """
+    Positions and data of the products without color in the file, plus the units of
+    every Modelo in it (the stock fallback when the scrape file is missing). The
+    products that already have a color are not kept in memory.
+    """
+    pendientes = {}
+    modelos = Counter()
+    for i, producto in enumerate(read_records(path)):
+        modelos[producto.get("Modelo", "")] += 1
+        if not producto.get("Color", "").strip() and producto.get("SKU", "").strip():
+            pendientes[i] = producto
+    return pendientes, modelos
 
-        time.sleep(1.1)  # Para evitar límites de tasa
+def enriquecer_colores_con_gpt(presupuesto=None):
+    """
+    Asks GPT for the color of the products without one, most valuable first (see
+    analizar_productos). Everything detected before stopping is saved, in the original
+    file order. Returns the counters plus "motivo", why it stopped early (None if no
+    product was left pending), so a partial run is not taken for a finished one.
+    """
+    presupuesto = presupuesto or Presupuesto.from_env()
+    pendientes, modelos = cargar_pendientes(INPUT_FILE)
+    stock = stock_by_model() if os.path.exists(STOCK_SOURCE_FILE) else modelos
+    principales = load_principal_models()
+    if principales is None:
+        print(f"⚠️ No se encontró '{PRINCIPAL_MODELS_FILE}'; se prioriza solo por precio y stock.")
+    resultados, motivo = analizar_productos(list(pendientes.values()), presupuesto, principales, stock)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(productos, f, indent=2, ensure_ascii=False)
+    # The output replaces the input file: a second streaming pass copies every product,
+    # taking the analyzed ones from memory
+    with RecordWriter(OUTPUT_FILE) as writer:
+        for i, producto in enumerate(read_records(INPUT_FILE)):
+            writer.write(pendientes.get(i, producto))
 
+    if motivo:
+        print(f"\n⏹️ Detenido ({motivo}); {resultados['pendientes']} productos quedan pendientes.")
     print("\n✅ Enriquecimiento completado con GPT-4o.")
-    print(f"🔎 Productos analizados: {analizados}")
-    print(f"🎯 Colores detectados: {actualizados}")
-    print(f"🖼️ Productos sin imagen encontrada: {sin_imagen}")
-    print(f"❌ Productos sin color detectable: {sin_color}")
+    print(f"🔎 Productos analizados: {resultados['analizados']} (≈ ${presupuesto.cost:.2f} USD)")
+    print(f"🎯 Colores detectados: {resultados['actualizados']} (valor cubierto: ${resultados['valor_cubierto']:,.2f})")
+    print(f"🖼️ Productos sin imagen encontrada: {resultados['sin_imagen']}")
+    print(f"❌ Productos sin color detectable: {resultados['sin_color']}")
     print(f"📁 Archivo guardado: {OUTPUT_FILE}")
+    return dict(resultados, motivo=motivo)
 
 if __name__ == "__main__":
-    enriquecer_colores_con_gpt()
+    parser = argparse.ArgumentParser(description="Detecta con GPT el color de los productos sin color, los más valiosos primero")
+    parser.add_argument("--max-calls", type=int, help=f"Máximo de llamadas a GPT (por defecto, {MAX_CALLS_ENV})")
+    parser.add_argument("--max-cost", type=float, help=f"Costo máximo estimado en USD (por defecto, {MAX_COST_ENV})")
+    parser.add_argument("--max-minutes", type=float, help=f"Tiempo máximo de la corrida (por defecto, {MAX_MINUTES_ENV})")
+    args = parser.parse_args()
+    presupuesto = Presupuesto.from_env()
+    if args.max_calls is not None:
+        presupuesto.max_calls = args.max_calls
+    if args.max_cost is not None:
+        presupuesto.max_cost = args.max_cost
+    if args.max_minutes is not None:
+        presupuesto.max_seconds = args.max_minutes * 60
+    enriquecer_colores_con_gpt(presupuesto)
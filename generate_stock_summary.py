@@ -1,9 +1,18 @@
 import json
 import re
-from collections import defaultdict
+import struct
+from array import array
+from decimal import Decimal, InvalidOperation
+
+from record_files import read_records, write_records
 
 INPUT_FILE = "products_with_color_merged.json"
 OUTPUT_FILE = "stock_summary.json"
+CUBE_FILE = "stock_cube.bin"
+
+CUBE_MAGIC = b"STKCUBE1"
+CUBE_DIMENSIONS = ("variant", "store", "category")
+VARIANT_FIELDS = ("model_original", "storage", "color", "compania", "familia", "caja")
 
 def extract_storage_capacity(model_string):
     match = re.search(r'(?:MEM|DD):(\d+(?:GB|TB))', model_string, re.IGNORECASE)
@@ -14,68 +23,351 @@ def extract_storage_capacity(model_string):
         return match.group(1).replace(" ", "")
     return ""
 
+def parse_price_cents(price_string):
+    """Parses a price like '$ 3,840.00' into integer cents. Returns None if it is not a valid price."""
+    cleaned = (price_string or "").replace("$", "").replace(",", "").strip()
+    if not cleaned:
+        return None
+    try:
+        value = Decimal(cleaned)
+    except InvalidOperation:
+        return None
+    # 'NaN' and 'Infinity' parse as Decimals but are not prices
+    if not value.is_finite():
+        return None
+    return int((value * 100).to_integral_value())
 
+def variant_key_for_product(product):
+    """Returns the variant tuple (see VARIANT_FIELDS) for a product, or None if it must be skipped."""
+    model_original = product.get("Modelo", "")
+    if not model_original:
+        return None
 
-def create_variant_summary(products):
-    variant_counts = defaultdict(int)
+    # Get color and check if it's valid. If not, skip the product.
+    color = product.get("Color", "").strip()
+    if not color or color.lower() == 'sin color':
+        return None
 
-    for product in products:
-        model_original = product.get("Modelo", "")
-        if not model_original:
-            continue
+    storage = extract_storage_capacity(model_original)
+    description = product.get("Descripción", "").lower()
+    familia = "CONSOLAS" if "consola" in description else "CELULARES"
 
-        # Get color and check if it's valid. If not, skip the product.
-        color = product.get("Color", "").strip()
-        if not color or color.lower() == 'sin color':
-            continue
+    compania = ""
+    if familia == "CELULARES":
+        compania = product.get("Compañía", "Desconocida").strip()
+        if compania == "Desconocida":
+            return None
+
+    caja = "c-caja" if product.get("Caja") == "Sí" else "s-caja"
+
+    return (model_original, storage, color, compania, familia, caja)
+
+def _median(sorted_prices):
+    n = len(sorted_prices)
+    if n == 0:
+        return None
+    mid = n // 2
+    if n % 2:
+        return sorted_prices[mid]
+    return (sorted_prices[mid - 1] + sorted_prices[mid]) // 2
+
+# === STOCK CUBE ===
+class StockCube:
+    """
+    Sparse variant x store x category cube backed by flat arrays.
 
-        storage = extract_storage_capacity(model_original)
-        description = product.get("Descripción", "").lower()
-        familia = "CONSOLAS" if "consola" in description else "CELULARES"
-        
-        compania = ""
-        if familia == "CELULARES":
-            compania = product.get("Compañía", "Desconocida").strip()
-            if compania == "Desconocida":
+    Every non-empty cell keeps its stock count and the sorted list of its
+    'Precio Promoción' values in integer cents, stored CSR-style: the prices of
+    cell i live in prices[price_offsets[i]:price_offsets[i + 1]]. That is enough
+    to answer min/median/max for any slice or roll-up without the raw products.
+    """
+
+    def __init__(self, labels, coords, stock, price_offsets, prices):
+        self.labels = labels                # dimension -> list of labels (index = coordinate)
+        self.coords = coords                # dimension -> array('I') of coordinates per cell
+        self.stock = stock                  # array('I') stock count per cell
+        self.price_offsets = price_offsets  # array('Q') with len(cells) + 1 entries
+        self.prices = prices                # array('q') prices in cents, sorted within each cell
+        self._label_index = {dim: {label: i for i, label in enumerate(values)} for dim, values in labels.items()}
+
+    def __len__(self):
+        return len(self.stock)
+
+    @classmethod
+    def from_products(cls, products):
+        labels = {dim: [] for dim in CUBE_DIMENSIONS}
+        interned = {dim: {} for dim in CUBE_DIMENSIONS}
+        cell_ids = {}
+        coords = {dim: array('I') for dim in CUBE_DIMENSIONS}
+        stock = array('I')
+        entry_cells = array('I')
+        entry_prices = array('q')
+
+        def intern(dim, label):
+            index = interned[dim].get(label)
+            if index is None:
+                index = interned[dim][label] = len(labels[dim])
+                labels[dim].append(label)
+            return index
+
+        # Single pass over the products: intern every coordinate and keep one (cell, price) entry per product.
+        for product in products:
+            variant = variant_key_for_product(product)
+            if variant is None:
                 continue
-        
-        caja = "c-caja" if product.get("Caja") == "Sí" else "s-caja"
-
-        variant_key = (model_original, storage, color, compania, familia, caja)
-        variant_counts[variant_key] += 1
-
-    summary_list = []
-    for variant_key, stock in variant_counts.items():
-        summary_list.append({
-            "model_original": variant_key[0],
-            "storage": variant_key[1],
-            "color": variant_key[2],
-            "compania": variant_key[3],
-            "familia": variant_key[4],
-            "caja": variant_key[5],
-            "stock": stock
-        })
-
-    return summary_list
+            cell_coords = (
+                intern("variant", variant),
+                intern("store", str(product.get("ID Sucursal", "")).strip()),
+                intern("category", product.get("Categoría", "").strip()),
+            )
+            cell = cell_ids.get(cell_coords)
+            if cell is None:
+                cell = cell_ids[cell_coords] = len(stock)
+                for dim, coord in zip(CUBE_DIMENSIONS, cell_coords):
+                    coords[dim].append(coord)
+                stock.append(0)
+            stock[cell] += 1
+
+            price = parse_price_cents(product.get("Precio Promoción", ""))
+            if price is not None:
+                entry_cells.append(cell)
+                entry_prices.append(price)
+
+        # Counting sort of the price entries by cell, then sort each cell's slice.
+        price_counts = array('Q', bytes(8 * len(stock)))
+        for cell in entry_cells:
+            price_counts[cell] += 1
+        price_offsets = array('Q', [0])
+        running = 0
+        for count in price_counts:
+            running += count
+            price_offsets.append(running)
+
+        prices = array('q', bytes(8 * len(entry_prices)))
+        cursor = array('Q', price_offsets[:-1])
+        for cell, price in zip(entry_cells, entry_prices):
+            prices[cursor[cell]] = price
+            cursor[cell] += 1
+        for cell in range(len(stock)):
+            start, end = price_offsets[cell], price_offsets[cell + 1]
+            if end - start > 1:
+                prices[start:end] = array('q', sorted(prices[start:end]))
+
+        return cls(labels, coords, stock, price_offsets, prices)
+
+    # --- Access ---
+    def cell_prices(self, cell):
+        return self.prices[self.price_offsets[cell]:self.price_offsets[cell + 1]]
+
+    def cell_label(self, cell, dim):
+        return self.labels[dim][self.coords[dim][cell]]
+
+    def cell_stats(self, cell):
+        cell_prices = self.cell_prices(cell)
+        return {
+            "stock": self.stock[cell],
+            "min_price": cell_prices[0] if cell_prices else None,
+            "median_price": _median(cell_prices),
+            "max_price": cell_prices[-1] if cell_prices else None,
+        }
+
+    def cells(self):
+        """Yields (variant, store, category, stats) for every non-empty cell."""
+        for cell in range(len(self)):
+            yield (*(self.cell_label(cell, dim) for dim in CUBE_DIMENSIONS), self.cell_stats(cell))
+
+    # --- Slicing & roll-ups ---
+    def _matching_coords(self, dim, selector):
+        if selector is None:
+            return None
+        if callable(selector):
+            return {i for i, label in enumerate(self.labels[dim]) if selector(label)}
+        if isinstance(selector, (str, tuple)):
+            selector = [selector]
+        index = self._label_index[dim]
+        return {index[label] for label in selector if label in index}
+
+    def slice(self, variant=None, store=None, category=None):
+        """
+        Returns a sub-cube with the cells matching every given selector. A selector
+        is a label, a list of labels or a predicate over the label.
+        """
+        wanted = {dim: self._matching_coords(dim, selector)
+                  for dim, selector in zip(CUBE_DIMENSIONS, (variant, store, category))}
+        coords = {dim: array('I') for dim in CUBE_DIMENSIONS}
+        stock = array('I')
+        price_offsets = array('Q', [0])
+        prices = array('q')
+        for cell in range(len(self)):
+            if any(wanted[dim] is not None and self.coords[dim][cell] not in wanted[dim] for dim in CUBE_DIMENSIONS):
+                continue
+            for dim in CUBE_DIMENSIONS:
+                coords[dim].append(self.coords[dim][cell])
+            stock.append(self.stock[cell])
+            prices.extend(self.cell_prices(cell))
+            price_offsets.append(len(prices))
+        return StockCube(self.labels, coords, stock, price_offsets, prices)
+
+    def rollup(self, *dims):
+        """
+        Aggregates the cube over every dimension not listed in dims. Returns a dict
+        keyed by the tuple of labels of the kept dimensions (in the given order),
+        ordered by first appearance, with stock and min/median/max price in cents.
+        """
+        for dim in dims:
+            if dim not in CUBE_DIMENSIONS:
+                raise ValueError(f"Dimensión desconocida: {dim}")
+        groups = {}
+        for cell in range(len(self)):
+            key = tuple(self.coords[dim][cell] for dim in dims)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, []]
+            group[0] += self.stock[cell]
+            group[1].append(cell)
+
+        result = {}
+        for key, (total_stock, cells) in groups.items():
+            if len(cells) == 1:
+                group_prices = self.cell_prices(cells[0])
+            else:
+                group_prices = sorted(price for cell in cells for price in self.cell_prices(cell))
+            labels = tuple(self.labels[dim][coord] for dim, coord in zip(dims, key))
+            result[labels] = {
+                "stock": total_stock,
+                "min_price": group_prices[0] if group_prices else None,
+                "median_price": _median(group_prices),
+                "max_price": group_prices[-1] if group_prices else None,
+            }
+        return result
+
+    def patched(self, replacement, in_scope):
+        """
+        Returns a cube with the cells of this cube outside the scope plus the cells of
+        replacement inside it, i.e. this cube after re-counting only the scoped part.
+        in_scope(variant, store, category) decides, by labels, which cells are replaced.
+        """
+        labels = {dim: [] for dim in CUBE_DIMENSIONS}
+        interned = {dim: {} for dim in CUBE_DIMENSIONS}
+        coords = {dim: array('I') for dim in CUBE_DIMENSIONS}
+        stock = array('I')
+        price_offsets = array('Q', [0])
+        prices = array('q')
+
+        for cube, keep_in_scope in ((self, False), (replacement, True)):
+            for cell in range(len(cube)):
+                cell_labels = [cube.cell_label(cell, dim) for dim in CUBE_DIMENSIONS]
+                if in_scope(*cell_labels) != keep_in_scope:
+                    continue
+                for dim, label in zip(CUBE_DIMENSIONS, cell_labels):
+                    index = interned[dim].get(label)
+                    if index is None:
+                        index = interned[dim][label] = len(labels[dim])
+                        labels[dim].append(label)
+                    coords[dim].append(index)
+                stock.append(cube.stock[cell])
+                prices.extend(cube.cell_prices(cell))
+                price_offsets.append(len(prices))
+        return StockCube(labels, coords, stock, price_offsets, prices)
+
+    def to_variant_summary(self):
+        """Builds the stock_summary.json list (one entry per variant) from the cube."""
+        summary_list = []
+        for (variant,), stats in self.rollup("variant").items():
+            entry = dict(zip(VARIANT_FIELDS, variant))
+            entry["stock"] = stats["stock"]
+            summary_list.append(entry)
+        return summary_list
+
+    # --- Persistence ---
+    def save(self, path):
+        arrays = [self.coords[dim] for dim in CUBE_DIMENSIONS] + [self.stock, self.price_offsets, self.prices]
+        header = json.dumps({
+            "labels": {dim: [list(label) if isinstance(label, tuple) else label for label in self.labels[dim]]
+                       for dim in CUBE_DIMENSIONS},
+            "arrays": [(a.typecode, len(a)) for a in arrays],
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(CUBE_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for a in arrays:
+                f.write(a.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.read(len(CUBE_MAGIC)) != CUBE_MAGIC:
+                raise ValueError(f"'{path}' no es un archivo de cubo de stock válido.")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+            arrays = []
+            for typecode, length in header["arrays"]:
+                a = array(typecode)
+                a.frombytes(f.read(a.itemsize * length))
+                arrays.append(a)
+        labels = {dim: header["labels"][dim] for dim in CUBE_DIMENSIONS}
+        labels["variant"] = [tuple(label) for label in labels["variant"]]
+        coords = dict(zip(CUBE_DIMENSIONS, arrays[:3]))
+        return cls(labels, coords, arrays[3], arrays[4], arrays[5])
+
+def build_stock_cube(products):
+    return StockCube.from_products(products)
+
+def create_variant_summary(products):
+    return build_stock_cube(products).to_variant_summary()
+
+def patch_variant_summary(summary, cube, variants):
+    """
+    Updates, in place and in order, the stock_summary.json entries of the given variant
+    tuples from the cube: changed stock is rewritten, variants left without stock are
+    removed and new ones are appended. Returns the number of entries touched.
+    """
+    variants = set(variants)
+    rollup = {variant: stats["stock"] for (variant,), stats in cube.slice(variant=list(variants)).rollup("variant").items()}
+    patched, touched = [], 0
+    for entry in summary:
+        variant = tuple(entry.get(field, "") for field in VARIANT_FIELDS)
+        if variant not in variants:
+            patched.append(entry)
+            continue
+        variants.discard(variant)
+        if variant not in rollup:
+            touched += 1
+            continue
+        if entry.get("stock") != rollup[variant]:
+            touched += 1
+        patched.append({**entry, "stock": rollup[variant]})
+    for variant in variants:
+        if variant in rollup:
+            patched.append({**dict(zip(VARIANT_FIELDS, variant)), "stock": rollup[variant]})
+            touched += 1
+    summary[:] = patched
+    return touched
 
 def main():
+    # The cube is built in one streaming pass: the product list is never held in memory
     try:
-        with open(INPUT_FILE, "r", encoding="utf-8") as f:
-            products_list = json.load(f)
+        stock_cube = build_stock_cube(read_records(INPUT_FILE))
     except FileNotFoundError:
         print(f"❌ Error: El archivo de entrada '{INPUT_FILE}' no fue encontrado.")
         return
-    except json.JSONDecodeError:
+    except ValueError:
         print(f"❌ Error: El archivo '{INPUT_FILE}' no es un JSON válido.")
         return
 
-    stock_summary = create_variant_summary(products_list)
+    stock_summary = stock_cube.to_variant_summary()
+    write_records(OUTPUT_FILE, stock_summary)
+    stock_cube.save(CUBE_FILE)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(stock_summary, f, indent=2, ensure_ascii=False)
+    # Local import: stock_history builds on this module
+    from stock_history import HISTORY_FILE, record_cube
+    history_written, _ = record_cube(stock_cube, HISTORY_FILE)
 
     print(f"\n📊 Resumen de stock por variantes únicas guardado en: {OUTPUT_FILE}")
     print(f"🧾 Variantes únicas encontradas: {len(stock_summary)}")
+    print(f"🧊 Cubo variante x sucursal x categoría guardado en: {CUBE_FILE} ({len(stock_cube)} celdas)")
+    print(f"🗂️ Historial: {history_written} variantes con cambios agregadas a {HISTORY_FILE}")
 
 if __name__ == "__main__":
     main()
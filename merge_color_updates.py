@@ -1,26 +1,31 @@
-import json
+import os
+
+from record_files import RecordWriter, read_records, write_records
 
 BASE_FILE = "products_enriched.json"
 UPDATED_FILE = "products_without_color.json"
 OUTPUT_FILE = "products_with_color_merged.json"
 
 def cargar_json(nombre_archivo):
+    """Loads a stage file (JSON, NDJSON or binary records), or [] if it is missing or invalid."""
     try:
-        with open(nombre_archivo, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return list(read_records(nombre_archivo))
     except FileNotFoundError:
         print(f"❌ Archivo no encontrado: {nombre_archivo}")
         return []
-    except json.JSONDecodeError:
+    except ValueError:
         print(f"❌ Error de formato en JSON: {nombre_archivo}")
         return []
 
-def merge_updates(base_products, updates):
-    updates_by_sku = {
+def updates_with_color(updates):
+    return {
         p["SKU"]: p for p in updates
         if p.get("Color", "").strip()  # Solo si ya tiene color definido
     }
 
+def merge_updates(base_products, updates):
+    updates_by_sku = updates_with_color(updates)
+
     actualizados = 0
     resultado = []
 
@@ -34,14 +39,58 @@ def merge_updates(base_products, updates):
 
     return resultado, actualizados
 
-def main():
-    base = cargar_json(BASE_FILE)
-    updates = cargar_json(UPDATED_FILE)
+def merge_streaming(output_path):
+    """
+    merge_updates writing straight to output_path: only the color updates are held in
+    memory, the enriched products are streamed. Returns the number of replaced products.
+    """
+    updates_by_sku = updates_with_color(cargar_json(UPDATED_FILE))
+    actualizados = 0
+    try:
+        with RecordWriter(output_path) as writer:
+            for producto in read_records(BASE_FILE):
+                update = updates_by_sku.get(producto.get("SKU"))
+                if update is not None:
+                    actualizados += 1
+                writer.write(update if update is not None else producto)
+    except (FileNotFoundError, ValueError) as e:
+        # Same outcome as merging an empty base file
+        print(f"❌ Archivo no encontrado: {BASE_FILE}" if isinstance(e, FileNotFoundError)
+              else f"❌ Error de formato en JSON: {BASE_FILE}")
+        write_records(output_path, [])
+        actualizados = 0
+    return actualizados
 
-    merged, actualizados = merge_updates(base, updates)
+def merge_with_datastore(db_path, output_path):
+    """
+    Streams both files into the SQLite store (only changed rows are written) and lets
+    the indexed SKU join do the merge, writing straight to output_path. A missing input
+    file stops the merge before the store is touched: it is not an empty product list.
+    Returns the number of replaced products.
+    """
+    from datastore import StockStore
+    for path in (BASE_FILE, UPDATED_FILE):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No existe '{path}'; no se reemplazan los productos del almacén.")
+    actualizados = 0
+    with StockStore(db_path) as store:
+        for table, path in (("enrichment", BASE_FILE), ("color_updates", UPDATED_FILE)):
+            store.replace_products(table, read_records(path))
+        with RecordWriter(output_path) as writer:
+            for producto, replaced in store.merged_products():
+                actualizados += replaced
+                writer.write(producto)
+    return actualizados
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(merged, f, indent=2, ensure_ascii=False)
+def main(db_path=None):
+    if db_path:
+        try:
+            actualizados = merge_with_datastore(db_path, OUTPUT_FILE)
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            raise
+    else:
+        actualizados = merge_streaming(OUTPUT_FILE)
 
     print(f"\n✅ Actualización completada.")
     print(f"🔁 Productos actualizados desde '{UPDATED_FILE}': {actualizados}")
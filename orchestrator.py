@@ -1,7 +1,7 @@
-import json
 import subprocess
+import sys
 from datetime import datetime
-from scraper_all_products import scrape_store_by_categories, STORES, CATEGORIES
+from scraper_all_products import CATEGORIES, load_page_sizes, save_page_sizes, save_scrape_results, scrape_all_stores
 
 RAW_INPUT_JSON = "raw_scraped_products_debug.json"
 
@@ -17,20 +17,11 @@ def mostrar_menu():
     return input("\nSelecciona una opción (1 a 7): ").strip()
 
 def iniciar_scraping():
-    all_products = []
     resumen = {}
+    page_sizes = load_page_sizes()
     print("\n🚀 Iniciando scraping de TODAS las sucursales y categorías...\n")
-    for store_id, store_name in STORES.items():
-        all_products.extend(scrape_store_by_categories(store_id, store_name, CATEGORIES, resumen))
-    with open(RAW_INPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(all_products, f, indent=2, ensure_ascii=False)
-    print(f"\n✅ Scraping completado. Resultados guardados en '{RAW_INPUT_JSON}'")
-    print(f"📊 Total de dispositivos válidos detectados: {len(all_products)}\n")
-    for (store, category), stats in resumen.items():
-        print(f"🧾 {store} - {category}")
-        for k, v in stats.items():
-            print(f"   • {k}: {v}")
-        print()
+    save_scrape_results(scrape_all_stores(CATEGORIES, resumen, page_sizes), resumen, RAW_INPUT_JSON)
+    save_page_sizes(page_sizes)
 
 def enriquecer_datos_consolidado():
     print("\n✨ Ejecutando enriquecimiento consolidado con 'add_color_from_description.py'...")
@@ -99,4 +90,8 @@ def main():
             print("❌ Opción inválida. Intenta de nuevo.")
 
 if __name__ == "__main__":
+    # With arguments (e.g. --from summary --to sync) run non-interactively through the stage runner
+    if len(sys.argv) > 1:
+        import pipeline
+        sys.exit(pipeline.main(sys.argv[1:]))
     main()
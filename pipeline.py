@@ -0,0 +1,461 @@
+import argparse
+import ast
+import contextlib
+import hashlib
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+
+import profiling
+import record_files
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, the daemon loop itself still never overlaps
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = ".pipeline_cache.json"
+LOCK_FILE = ".pipeline.lock"
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_INTERVAL_MINUTES = 15
+
+logger = logging.getLogger("pipeline")
+
+# Stages in execution order. inputs/outputs are local files; code lists the stage's entry
+# script, whose source is part of the stage's version together with every repository
+# module it imports (see stage_code_files). always_run stages have no local inputs to
+# compare (the scraper reads the live site), so they run whenever they are selected.
+STAGES = [
+    {
+        "name": "scrape", "module": "scraper_all_products", "function": "main",
+        "inputs": [], "outputs": ["raw_scraped_products_debug.json"],
+        "code": ["scraper_all_products.py"], "always_run": True,
+    },
+    {
+        "name": "enrich", "module": "add_color_from_description", "function": "enriquecer_productos_desde_descripcion",
+        "inputs": ["raw_scraped_products_debug.json"], "outputs": ["products_enriched.json", "products_without_color.json"],
+        "code": ["add_color_from_description.py"],
+    },
+    {
+        "name": "gpt", "module": "enrich_color_with_gpt", "function": "enriquecer_colores_con_gpt",
+        "inputs": ["products_without_color.json", "raw_scraped_products_debug.json", "principal_models.json"],
+        "outputs": ["products_without_color.json"],
+        "code": ["enrich_color_with_gpt.py"],
+    },
+    {
+        "name": "merge", "module": "merge_color_updates", "function": "main",
+        "inputs": ["products_enriched.json", "products_without_color.json"], "outputs": ["products_with_color_merged.json"],
+        "code": ["merge_color_updates.py"],
+    },
+    {
+        "name": "summary", "module": "generate_stock_summary", "function": "main",
+        "inputs": ["products_with_color_merged.json"], "outputs": ["stock_summary.json", "stock_cube.bin"],
+        "code": ["generate_stock_summary.py"],
+    },
+    {
+        "name": "sync", "module": "sync_stock_summary_to_sheets", "function": "main",
+        "inputs": ["stock_summary.json"], "outputs": [],
+        "code": ["sync_stock_summary_to_sheets.py"],
+    },
+]
+STAGE_NAMES = [stage["name"] for stage in STAGES]
+
+class StageError(Exception):
+    pass
+
+class PipelineBusy(Exception):
+    """Another process holds the pipeline lock."""
+
+@contextlib.contextmanager
+def pipeline_lock(path=LOCK_FILE):
+    """Exclusive, non-blocking lock so two runs (menu, cron or daemon) never overlap."""
+    with open(path, "a+") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise PipelineBusy(f"Otra ejecución del pipeline tiene el bloqueo '{path}'.")
+        try:
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# === HASHING & CACHE ===
+def file_hash(path):
+    """sha256 of the file contents, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def local_imports(path, base_dir=None):
+    """Repository modules imported anywhere in a source file, including imports inside functions."""
+    base_dir = base_dir or BASE_DIR
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError):
+        return []  # its own hash still changes
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return sorted(f"{name}.py" for name in names if os.path.exists(os.path.join(base_dir, f"{name}.py")))
+
+def stage_code_files(stage, base_dir=None):
+    """The stage's code files plus every repository module they import, transitively."""
+    base_dir = base_dir or BASE_DIR
+    files, pending = set(), list(stage["code"])
+    while pending:
+        path = pending.pop()
+        if path not in files:
+            files.add(path)
+            pending.extend(local_imports(os.path.join(base_dir, path), base_dir))
+    return sorted(files)
+
+def code_hash(stage, base_dir=None):
+    base_dir = base_dir or BASE_DIR
+    digest = hashlib.sha256()
+    for path in stage_code_files(stage, base_dir):
+        digest.update(path.encode("utf-8"))
+        digest.update((file_hash(os.path.join(base_dir, path)) or "").encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cache(path=CACHE_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache, path=CACHE_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def skip_reason(stage, record, extra_inputs=()):
+    """
+    Returns why the stage can be skipped, or None if it must run. A stage is skipped
+    when its code is unchanged, its outputs are still the ones it wrote, and its inputs
+    match the last run (an input that was missing then must still be missing). A file
+    that is both input and output (the GPT stage edits products_without_color.json in
+    place) is compared with what the stage wrote.
+    """
+    if stage.get("always_run") or not record:
+        return None
+    if record.get("code") != code_hash(stage):
+        return None
+    for path, digest in record.get("outputs", {}).items():
+        if digest is None or file_hash(path) != digest:
+            return None
+    for path in list(stage["inputs"]) + list(extra_inputs):
+        recorded = dict(record.get("inputs", {}), **record.get("outputs", {}))
+        if path not in recorded or file_hash(path) != recorded[path]:
+            return None
+    return "entradas sin cambios"
+
+def stopped_early(stage, result):
+    """Why a stage that finished left work pending (the GPT stage stops at its budget), or None."""
+    if stage["name"] == "gpt" and isinstance(result, dict):
+        return result.get("motivo")
+    return None
+
+# === RUNNER ===
+def select_stages(from_stage=None, to_stage=None):
+    for name in (from_stage, to_stage):
+        if name and name not in STAGE_NAMES:
+            raise ValueError(f"Etapa desconocida: {name}. Etapas: {', '.join(STAGE_NAMES)}")
+    start = STAGE_NAMES.index(from_stage) if from_stage else 0
+    end = STAGE_NAMES.index(to_stage) if to_stage else len(STAGES) - 1
+    if start > end:
+        raise ValueError(f"--from {from_stage} va después de --to {to_stage}.")
+    return STAGES[start:end + 1]
+
+def run_stage(stage, stage_kwargs=None):
+    module = importlib.import_module(stage["module"])
+    try:
+        result = getattr(module, stage["function"])(**(stage_kwargs or {}))
+    except SystemExit as e:
+        # Several scripts still call exit() on fatal errors
+        raise StageError(f"la etapa terminó con exit({e.code})")
+    missing = [path for path in stage["outputs"] if not os.path.exists(path)]
+    if missing:
+        raise StageError(f"no se generaron: {', '.join(missing)}")
+    if stage["name"] == "sync" and any(target.get("status") != "ok" for target in result or []):
+        raise StageError("la sincronización falló en al menos un destino")
+    return result
+
+def run_pipeline(from_stage=None, to_stage=None, force=False, cache_path=CACHE_FILE, stage_kwargs=None, extra_inputs=None,
+                 profile_options=None):
+    """
+    Runs the selected stages in order, skipping those whose inputs, outputs and code
+    are unchanged since their last successful run. stage_kwargs / extra_inputs map a
+    stage name to keyword arguments for its function / additional files it depends on
+    (e.g. the sync targets config). Every stage that runs is profiled (see
+    profiling.profile_stage) and the run is written as a JSON report.
+
+    profile_options: {"track_memory": bool, "cprofile": set of stage names (or {"all"}),
+    "cprofile_dir": str, "report_path": path, or False for no report}.
+    Returns a list of per-stage results.
+    """
+    profile_options = profile_options or {}
+    report = profiling.new_report()
+    with pipeline_lock():
+        results = _run_stages(from_stage, to_stage, force, cache_path, stage_kwargs or {}, extra_inputs or {}, profile_options)
+    report["stages"] = results
+    profiling.finish_report(report)
+    if profile_options.get("report_path", None) is not False:
+        report_path = profiling.save_report(report, profile_options.get("report_path"))
+        logger.info(f"🧾 Reporte de ejecución guardado en: {report_path}", extra={"event": "report", "path": report_path})
+    return results
+
+def _run_stages(from_stage, to_stage, force, cache_path, stage_kwargs, extra_inputs, profile_options):
+    cprofile_stages = profile_options.get("cprofile") or set()
+    cache = load_cache(cache_path)
+    results = []
+    for stage in select_stages(from_stage, to_stage):
+        name = stage["name"]
+        stage_extra_inputs = extra_inputs.get(name, [])
+        reason = None if force else skip_reason(stage, cache.get(name), stage_extra_inputs)
+        if reason:
+            logger.info(f"⏭️  {name}: omitida ({reason}).", extra={"stage": name, "event": "skipped"})
+            results.append({"stage": name, "status": "skipped"})
+            continue
+
+        logger.info(f"\n▶️  {name}: ejecutando {stage['module']}.{stage['function']}()...", extra={"stage": name, "event": "start"})
+        input_paths = list(stage["inputs"]) + list(stage_extra_inputs)
+        input_hashes = {path: file_hash(path) for path in input_paths}
+        cprofile_dir = None
+        if name in cprofile_stages or "all" in cprofile_stages:
+            cprofile_dir = profile_options.get("cprofile_dir", profiling.REPORTS_DIR)
+        profile = None
+        try:
+            with profiling.profile_stage(name, profile_options.get("track_memory", False), cprofile_dir) as profile:
+                with profiling.log_stage_output(name):
+                    result = run_stage(stage, stage_kwargs.get(name))
+        except Exception as e:
+            # profile stays None if the failure came before profiling started
+            details = profile or {"stage": name}
+            logger.error(f"❌ {name}: falló ({e}). Se detiene la ejecución.",
+                         extra={"event": "error", "error": str(e), **details})
+            cache.pop(name, None)
+            save_cache(cache, cache_path)
+            results.append(dict(details, status="error", error=str(e)))
+            break
+
+        pending = stopped_early(stage, result)
+        if pending:
+            # Its output changed, so later stages still run; this one is not up to date
+            logger.warning(f"⏸️ {name}: se detuvo antes de terminar ({pending}); se ejecutará de nuevo en la próxima corrida.",
+                           extra={"event": "partial", **profile})
+            cache.pop(name, None)
+            save_cache(cache, cache_path)
+            results.append(dict(profile, status="partial", reason=pending))
+            continue
+
+        cache[name] = {
+            "code": code_hash(stage),
+            "inputs": input_hashes,
+            "outputs": {path: file_hash(path) for path in stage["outputs"]},
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "finished_ts": time.time(),
+        }
+        save_cache(cache, cache_path)
+        logger.info(f"✅ {name}: completada en {profile['wall_seconds']} s.", extra={"event": "finished", **profile})
+        results.append(dict(profile, status="ok"))
+    return results
+
+def print_results(results):
+    logger.info("\n📋 Resumen de la ejecución:")
+    for result in results:
+        detail = ""
+        if "wall_seconds" in result:
+            calls = result["remote_calls"]
+            memory = f", pico {result['peak_memory_mb']} MB" if "peak_memory_mb" in result else ""
+            detail = (f" ({result['wall_seconds']} s, CPU {result['cpu_seconds']} s{memory}; "
+                      f"HTTP {calls['http']}, Sheets {calls['sheets']}, OpenAI {calls['openai']})")
+        if result["status"] == "error":
+            detail += f": {result['error']}"
+        elif result["status"] == "partial":
+            detail += f": {result['reason']}"
+        logger.info(f"   • {result['stage']}: {result['status']}{detail}")
+
+# === DAEMON ===
+def staleness_report(cache_path=CACHE_FILE, now=None):
+    """Seconds since each stage last completed successfully (None if it never did)."""
+    now = now or time.time()
+    cache = load_cache(cache_path)
+    return {name: (round(now - cache[name]["finished_ts"]) if "finished_ts" in cache.get(name, {}) else None)
+            for name in STAGE_NAMES}
+
+def _format_age(seconds):
+    if seconds is None:
+        return "nunca"
+    return f"hace {seconds // 60} min {seconds % 60} s" if seconds >= 60 else f"hace {seconds} s"
+
+def warm_stage_kwargs(stage_kwargs, from_stage=None, to_stage=None):
+    """
+    Builds the objects worth keeping between daemon cycles: the scraper's category list
+    and negotiated page sizes, the authorized gspread client and, for the default single
+    target, one SheetsClient whose quota state carries over. The scraper and GPT stages
+    keep their module-level HTTP sessions, and the sync keeps its option matches in memory.
+    If Sheets authentication fails, the sync stage retries it on every cycle.
+    """
+    stage_kwargs = {name: dict(kwargs) for name, kwargs in stage_kwargs.items()}
+    names = [stage["name"] for stage in select_stages(from_stage, to_stage)]
+    if "scrape" in names:
+        scraper = importlib.import_module("scraper_all_products")
+        scrape_kwargs = stage_kwargs.setdefault("scrape", {})
+        if not scrape_kwargs.get("categories"):
+            scrape_kwargs["categories"] = scraper.resolve_categories(scrape_kwargs.pop("discover", False))
+        if "page_sizes" not in scrape_kwargs:
+            scrape_kwargs["page_sizes"] = {} if scrape_kwargs.pop("renegotiate", False) else scraper.load_page_sizes()
+    if "sync" in names:
+        sync = importlib.import_module("sync_stock_summary_to_sheets")
+        from sheets_client import SheetsClient
+        sync_kwargs = stage_kwargs.setdefault("sync", {})
+        try:
+            sync_kwargs["client"] = sync.authenticate_gspread()
+        except sync.AuthenticationError as e:
+            logger.warning(f"⚠️ No se pudo autenticar con Google Sheets al iniciar ({e}); se reintentará en cada ciclo.")
+        if "config_path" not in sync_kwargs:
+            sync_kwargs["sheets_client"] = SheetsClient()
+    return stage_kwargs
+
+def refresh_stock_index(index=None):
+    """
+    Keeps the stock_query index in line with the latest summary, so queries between
+    cycles load it instead of rebuilding it. Returns the index, or the previous one
+    if it could not be refreshed.
+    """
+    try:
+        stock_query = importlib.import_module("stock_query")
+        if not os.path.exists(stock_query.SUMMARY_FILE):
+            return index
+        return stock_query.load_stock_index()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo actualizar el índice de consultas: {e}")
+        return index
+
+def run_daemon(interval_minutes=DEFAULT_INTERVAL_MINUTES, from_stage=None, to_stage=None, stage_kwargs=None,
+               extra_inputs=None, max_cycles=None, cache_path=CACHE_FILE, profile_options=None):
+    """
+    Runs the pipeline every interval_minutes in this process, keeping clients, sessions
+    and imported modules warm. Cycles never overlap: a slow cycle delays the next one,
+    and a cycle is skipped if another process holds the lock.
+    """
+    interval = interval_minutes * 60
+    stage_kwargs = warm_stage_kwargs(stage_kwargs or {}, from_stage, to_stage)
+    stock_index = None
+    logger.info(f"🕒 Modo continuo: ciclo cada {interval_minutes} min ({' -> '.join(s['name'] for s in select_stages(from_stage, to_stage))}).")
+    cycle = 0
+    try:
+        while max_cycles is None or cycle < max_cycles:
+            cycle += 1
+            started_at = time.monotonic()
+            logger.info(f"\n🔁 Ciclo {cycle} ({time.strftime('%Y-%m-%d %H:%M:%S')})")
+            try:
+                results = run_pipeline(from_stage, to_stage, cache_path=cache_path, stage_kwargs=stage_kwargs,
+                                       extra_inputs=extra_inputs, profile_options=profile_options)
+                print_results(results)
+                if stock_index is None or any(r["stage"] == "summary" and r["status"] == "ok" for r in results):
+                    stock_index = refresh_stock_index(stock_index)
+            except PipelineBusy as e:
+                logger.warning(f"⏳ {e} Se omite este ciclo.")
+            except Exception as e:
+                # A broken cycle must not stop the daemon
+                logger.error(f"❌ El ciclo {cycle} falló: {e}")
+
+            duration = time.monotonic() - started_at
+            ages = staleness_report(cache_path)
+            logger.info(f"⏱️ Ciclo {cycle} terminado en {duration:.1f} s. Datos del sitio: {_format_age(ages['scrape'])}; "
+                        f"resumen: {_format_age(ages['summary'])}; hoja: {_format_age(ages['sync'])}.")
+            if max_cycles is not None and cycle >= max_cycles:
+                break
+            wait = interval - duration
+            if wait <= 0:
+                logger.warning(f"⚠️ El ciclo duró más que el intervalo ({duration:.0f} s > {interval:.0f} s); el siguiente empieza ya.")
+                continue
+            time.sleep(wait)
+    except KeyboardInterrupt:
+        logger.info("\n👋 Modo continuo detenido.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ejecuta las etapas del pipeline sin menú, omitiendo las que no cambiaron")
+    parser.add_argument("--from", dest="from_stage", choices=STAGE_NAMES, help="Primera etapa a considerar")
+    parser.add_argument("--to", dest="to_stage", choices=STAGE_NAMES, help="Última etapa a considerar")
+    parser.add_argument("--only", choices=STAGE_NAMES, help="Ejecutar solo esta etapa")
+    parser.add_argument("--force", action="store_true", help="Ejecutar aunque las entradas no hayan cambiado")
+    parser.add_argument("--sync-config", help="Destinos de sincronización (ver sync_targets.example.json)")
+    parser.add_argument("--datastore", help="Base SQLite para la combinación de colores (ver datastore.py)")
+    parser.add_argument("--format", choices=record_files.FORMATS,
+                        help="Formato de los archivos que escriben las etapas (json, ndjson o bin; se leen todos)")
+    parser.add_argument("--list", action="store_true", help="Mostrar las etapas y si se omitirían")
+    parser.add_argument("--daemon", action="store_true", help="Repetir la ejecución periódicamente sin salir")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_MINUTES, help="Minutos entre ciclos del modo continuo")
+    parser.add_argument("--cycles", type=int, help="Número de ciclos del modo continuo (por defecto, sin límite)")
+    parser.add_argument("--profile", action="append", choices=STAGE_NAMES + ["all"], default=[],
+                        help="Capturar cProfile de esta etapa (repetible, o 'all')")
+    parser.add_argument("--memory", action="store_true", help="Medir el pico de memoria con tracemalloc (más lento)")
+    parser.add_argument("--report", help="Ruta del reporte JSON (por defecto reports/run_<fecha>.json)")
+    parser.add_argument("--no-report", action="store_true", help="No guardar reporte JSON")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Nivel de log; DEBUG muestra los mensajes por fila")
+    parser.add_argument("--log-json", action="store_true", help="Log en formato JSON (una línea por evento)")
+    args = parser.parse_args(argv)
+
+    profiling.configure_logging(args.log_level, args.log_json)
+    if args.format:
+        os.environ[record_files.FORMAT_ENV] = args.format
+    profile_options = {
+        "track_memory": args.memory,
+        "cprofile": set(args.profile),
+        "report_path": False if args.no_report else args.report,
+    }
+
+    stage_kwargs, extra_inputs = {}, {}
+    if args.sync_config:
+        stage_kwargs["sync"] = {"config_path": args.sync_config}
+        extra_inputs["sync"] = [args.sync_config]
+    if args.datastore:
+        stage_kwargs["merge"] = {"db_path": args.datastore}
+
+    if args.list:
+        cache = load_cache()
+        for stage in STAGES:
+            reason = skip_reason(stage, cache.get(stage["name"]), extra_inputs.get(stage["name"], []))
+            print(f"   • {stage['name']}: {', '.join(stage['inputs']) or '(sitio web)'} -> "
+                  f"{', '.join(stage['outputs']) or '(Google Sheets)'} [{'omitible' if reason else 'pendiente'}]")
+        return 0
+
+    from_stage, to_stage = (args.only, args.only) if args.only else (args.from_stage, args.to_stage)
+    if args.daemon:
+        run_daemon(args.interval, from_stage, to_stage, stage_kwargs, extra_inputs, max_cycles=args.cycles,
+                   profile_options=dict(profile_options, report_path=False if args.no_report else None))
+        return 0
+    try:
+        results = run_pipeline(from_stage, to_stage, force=args.force, stage_kwargs=stage_kwargs,
+                               extra_inputs=extra_inputs, profile_options=profile_options)
+    except PipelineBusy as e:
+        print(f"⏳ {e}")
+        return 1
+    print_results(results)
+    return 1 if any(result["status"] == "error" for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from urllib.parse import urlsplit
+
+REPORTS_DIR = "reports"
+PROFILE_TOP_FUNCTIONS = 15
+
+# Remote call category by host; anything else counts as plain HTTP (scraper, image lookups)
+HOST_CATEGORIES = {
+    "sheets.googleapis.com": "sheets",
+    "www.googleapis.com": "sheets",
+    "oauth2.googleapis.com": "sheets",
+    "api.openai.com": "openai",
+}
+
+# === LOGGING ===
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra={...} fields passed to the logger."""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self.RESERVED})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging(level="INFO", json_lines=False):
+    """
+    Sends log records to stdout. Per-row messages of the stages are logged at DEBUG,
+    so they only show up with level="DEBUG"; plain scripts that never call this keep
+    Python's default (warnings only).
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter("%(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    # Library chatter stays at WARNING even when the pipeline runs at DEBUG
+    for noisy in ("urllib3", "httpx", "httpcore", "openai", "google", "oauth2client"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+# Stage scripts report with print(); their leading emoji gives the level of the line
+OUTPUT_LEVELS = (("❌", logging.ERROR), ("🛑", logging.ERROR), ("⚠️", logging.WARNING))
+
+class StageOutputLogger(io.TextIOBase):
+    """File-like stdout replacement that logs every complete line written by a stage."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.logger = logging.getLogger(f"pipeline.{stage}")
+        self.pending = ""
+        self.lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self.lock:
+            lines = (self.pending + text).split("\n")
+            self.pending = lines.pop()
+        for line in lines:
+            self._log(line)
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            line, self.pending = self.pending, ""
+        self._log(line)
+
+    def _log(self, line):
+        message = line.strip()
+        if not message:
+            return
+        level = next((level for prefix, level in OUTPUT_LEVELS if message.startswith(prefix)), logging.INFO)
+        self.logger.log(level, message, extra={"stage": self.stage, "event": "output"})
+
+@contextlib.contextmanager
+def log_stage_output(stage):
+    """Routes what a stage prints through logging while the block runs (only once logging is configured)."""
+    if not logging.getLogger().handlers:
+        yield
+        return
+    output = StageOutputLogger(stage)
+    try:
+        with contextlib.redirect_stdout(output):
+            yield
+    finally:
+        output.flush()
+
+# === REMOTE CALL COUNTING ===
+class RemoteCallCounter:
+    """Counts outgoing HTTP requests by category (http / sheets / openai) while installed."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, url):
+        host = urlsplit(str(url)).hostname or ""
+        with self.lock:
+            self.counts[HOST_CATEGORIES.get(host, "http")] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {category: self.counts.get(category, 0) for category in ("http", "sheets", "openai")}
+
+_active_counters = []
+_patch_lock = threading.Lock()
+_originals = {}
+
+def _record_everywhere(url):
+    for counter in list(_active_counters):
+        counter.record(url)
+
+def _install_patches():
+    """Wraps requests' and httpx's transport send once; the wrappers only count while a counter is active."""
+    if _originals:
+        return
+    try:
+        from requests.adapters import HTTPAdapter
+        original_send = HTTPAdapter.send
+
+        def counted_send(self, request, *args, **kwargs):
+            _record_everywhere(request.url)
+            return original_send(self, request, *args, **kwargs)
+        _originals["requests"] = (HTTPAdapter, "send", original_send)
+        HTTPAdapter.send = counted_send
+    except ImportError:
+        pass
+    try:
+        import httpx
+        original_handle = httpx.HTTPTransport.handle_request
+
+        def counted_handle(self, request):
+            _record_everywhere(request.url)
+            return original_handle(self, request)
+        _originals["httpx"] = (httpx.HTTPTransport, "handle_request", original_handle)
+        httpx.HTTPTransport.handle_request = counted_handle
+    except ImportError:
+        pass
+
+@contextlib.contextmanager
+def count_remote_calls():
+    counter = RemoteCallCounter()
+    with _patch_lock:
+        _install_patches()
+        _active_counters.append(counter)
+    try:
+        yield counter
+    finally:
+        with _patch_lock:
+            _active_counters.remove(counter)
+
+# === STAGE PROFILING ===
+def _top_functions(profiler, limit=PROFILE_TOP_FUNCTIONS):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    stats.sort_stats("cumulative")
+    top = []
+    for (filename, line, function), (_, calls, own_time, cumulative, _) in list(stats.stats.items()):
+        top.append({"function": f"{os.path.basename(filename)}:{line}({function})", "calls": calls,
+                    "own_seconds": round(own_time, 4), "cumulative_seconds": round(cumulative, 4)})
+    top.sort(key=lambda entry: entry["cumulative_seconds"], reverse=True)
+    return top[:limit]
+
+@contextlib.contextmanager
+def profile_stage(name, track_memory=False, cprofile_dir=None):
+    """
+    Measures a block of work: wall and CPU time, remote calls and, with track_memory,
+    peak traced memory (tracemalloc, which slows the block down noticeably). With cprofile_dir it also captures a cProfile dump there. Yields a
+    dict that is filled in when the block ends (also when it raises).
+    """
+    profile = {"stage": name}
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif track_memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if cprofile_dir else None
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    with count_remote_calls() as counter:
+        if profiler:
+            profiler.enable()
+        try:
+            yield profile
+        finally:
+            if profiler:
+                profiler.disable()
+            profile["wall_seconds"] = round(time.perf_counter() - wall_start, 3)
+            profile["cpu_seconds"] = round(time.process_time() - cpu_start, 3)
+            profile["remote_calls"] = counter.snapshot()
+            if track_memory:
+                profile["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+                if started_tracing:
+                    tracemalloc.stop()
+            if profiler:
+                os.makedirs(cprofile_dir, exist_ok=True)
+                dump_path = os.path.join(cprofile_dir, f"{name}.prof")
+                profiler.dump_stats(dump_path)
+                profile["cprofile"] = dump_path
+                profile["top_functions"] = _top_functions(profiler)
+
+# === RUN REPORT ===
+def new_report(argv=None):
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "argv": list(sys.argv[1:] if argv is None else argv),
+        "pid": os.getpid(),
+        "stages": [],
+    }
+
+def finish_report(report):
+    ran = [stage for stage in report["stages"] if "wall_seconds" in stage]
+    report["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report["totals"] = {
+        "wall_seconds": round(sum(stage["wall_seconds"] for stage in ran), 3),
+        "cpu_seconds": round(sum(stage["cpu_seconds"] for stage in ran), 3),
+        "peak_memory_mb": max((stage.get("peak_memory_mb", 0) for stage in ran), default=0),
+        "remote_calls": {category: sum(stage["remote_calls"][category] for stage in ran)
+                         for category in ("http", "sheets", "openai")},
+    }
+    return report
+
+def save_report(report, path=None):
+    """Writes the report as JSON (by default reports/run_<timestamp>.json) and returns the path."""
+    if path is None:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        path = os.path.join(REPORTS_DIR, f"run_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
@@ -0,0 +1,392 @@
+import argparse
+import json
+import os
+import re
+import struct
+
+# Format used when a stage writes a new file: json (indented array, the historical
+# format), ndjson (one compact object per line) or bin (compact binary records).
+# Readers detect the format from the file contents, so file names never change.
+FORMAT_ENV = "PIPELINE_RECORD_FORMAT"
+FORMATS = ("json", "ndjson", "bin")
+DEFAULT_FORMAT = "json"
+
+BINARY_MAGIC = b"RECSTRM1"
+READ_BLOCK_SIZE = 1 << 16
+MAX_INTERNED_STRINGS = 1 << 16
+MAX_INTERNED_LENGTH = 64
+
+_WHITESPACE = re.compile(r"\s*")
+_FRAME_LENGTH = struct.Struct("<I")
+
+# Binary record frames: [u32 length][ops...]. Ops: KEYS defines the next key tuple,
+# RECORD holds a key tuple id and one tagged value per key.
+_OP_KEYS, _OP_RECORD = 1, 2
+_NONE, _FALSE, _TRUE, _INT, _STR, _STR_DEFINE, _STR_REF, _JSON = range(8)
+
+def default_format():
+    fmt = os.environ.get(FORMAT_ENV, DEFAULT_FORMAT).strip().lower() or DEFAULT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de registros desconocido en {FORMAT_ENV}: {fmt}. Formatos: {', '.join(FORMATS)}")
+    return fmt
+
+def detect_format(path):
+    """Format of an existing file: bin (magic header), json (starts with '[') or ndjson (anything else)."""
+    with open(path, "rb") as f:
+        head = f.read(len(BINARY_MAGIC))
+        if head == BINARY_MAGIC:
+            return "bin"
+        while head and not head.strip():
+            head = f.read(READ_BLOCK_SIZE)
+    return "json" if head.lstrip()[:1] == b"[" else "ndjson"
+
+# === VARINTS ===
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _write_bytes(out, raw):
+    _write_varint(out, len(raw))
+    out += raw
+
+# === BINARY CODEC ===
+class _BinaryState:
+    """Key tuples and interned strings seen so far; shared by the encoder and decoder of a file."""
+
+    def __init__(self):
+        self.schemas = []
+        self.schema_ids = {}
+        self.strings = []
+        self.string_ids = {}
+
+    def encode(self, record):
+        out = bytearray()
+        keys = tuple(record)
+        schema = self.schema_ids.get(keys)
+        if schema is None:
+            schema = self.schema_ids[keys] = len(self.schemas)
+            self.schemas.append(keys)
+            out.append(_OP_KEYS)
+            _write_varint(out, len(keys))
+            for key in keys:
+                _write_bytes(out, key.encode("utf-8"))
+        out.append(_OP_RECORD)
+        _write_varint(out, schema)
+        for value in record.values():
+            self._encode_value(out, value)
+        return _FRAME_LENGTH.pack(len(out)) + out
+
+    def _encode_value(self, out, value):
+        if value is None:
+            out.append(_NONE)
+        elif value is True or value is False:
+            out.append(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            out.append(_INT)
+            _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, str):
+            index = self.string_ids.get(value)
+            if index is not None:
+                out.append(_STR_REF)
+                _write_varint(out, index)
+            elif len(value) <= MAX_INTERNED_LENGTH and len(self.strings) < MAX_INTERNED_STRINGS:
+                self.string_ids[value] = len(self.strings)
+                self.strings.append(value)
+                out.append(_STR_DEFINE)
+                _write_bytes(out, value.encode("utf-8"))
+            else:
+                out.append(_STR)
+                _write_bytes(out, value.encode("utf-8"))
+        else:
+            out.append(_JSON)
+            _write_bytes(out, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def decode(self, frame):
+        """Applies the frame's definitions and returns its record."""
+        pos = 0
+        while True:
+            op = frame[pos]
+            pos += 1
+            if op == _OP_KEYS:
+                count, pos = _read_varint(frame, pos)
+                keys = []
+                for _ in range(count):
+                    length, pos = _read_varint(frame, pos)
+                    keys.append(frame[pos:pos + length].decode("utf-8"))
+                    pos += length
+                keys = tuple(keys)
+                self.schema_ids[keys] = len(self.schemas)
+                self.schemas.append(keys)
+                continue
+            schema, pos = _read_varint(frame, pos)
+            record = {}
+            for key in self.schemas[schema]:
+                record[key], pos = self._decode_value(frame, pos)
+            return record
+
+    def _decode_value(self, frame, pos):
+        tag = frame[pos]
+        pos += 1
+        if tag == _STR_REF:
+            index, pos = _read_varint(frame, pos)
+            return self.strings[index], pos
+        if tag in (_STR, _STR_DEFINE, _JSON):
+            length, pos = _read_varint(frame, pos)
+            text = frame[pos:pos + length].decode("utf-8")
+            pos += length
+            if tag == _STR_DEFINE:
+                self.string_ids[text] = len(self.strings)
+                self.strings.append(text)
+            return (json.loads(text) if tag == _JSON else text), pos
+        if tag == _INT:
+            value, pos = _read_varint(frame, pos)
+            return (value >> 1) ^ -(value & 1), pos
+        return {_NONE: None, _FALSE: False, _TRUE: True}[tag], pos
+
+def _iter_binary_frames(f):
+    """Yields (frame, end offset) for every complete frame; stops at a truncated tail."""
+    offset = len(BINARY_MAGIC)
+    while True:
+        head = f.read(_FRAME_LENGTH.size)
+        if len(head) < _FRAME_LENGTH.size:
+            return
+        (length,) = _FRAME_LENGTH.unpack(head)
+        frame = f.read(length)
+        if len(frame) < length:
+            return
+        offset += _FRAME_LENGTH.size + length
+        yield frame, offset
+
+# === READERS ===
+def _read_binary(path):
+    state = _BinaryState()
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"'{path}' no es un archivo de registros binario.")
+        for frame, _ in _iter_binary_frames(f):
+            yield state.decode(frame)
+
+def _read_ndjson(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _read_json_array(path):
+    """Yields the elements of a top-level JSON array reading the file in blocks."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+
+        def refill():
+            nonlocal buffer, pos, eof
+            block = f.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer, pos = buffer[pos:] + block, 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                pos = _WHITESPACE.match(buffer, pos).end()
+                if pos < len(buffer) or eof:
+                    return
+                refill()
+
+        refill()
+        skip_whitespace()
+        if buffer[pos:pos + 1] != "[":
+            raise json.JSONDecodeError("Se esperaba un arreglo JSON", buffer, pos)
+        pos += 1
+        skip_whitespace()
+        if buffer[pos:pos + 1] == "]":
+            return
+        while True:
+            skip_whitespace()
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Arreglo JSON sin cerrar", buffer, pos)
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    refill()
+                    continue
+                # A value is complete only once the ',' or ']' after it is in the buffer: a number
+                # split across blocks ("2345" + "67", "1.5e" + "3") would otherwise decode short
+                after = _WHITESPACE.match(buffer, end).end()
+                if not eof and (after == len(buffer) or buffer[after] not in ",]"):
+                    refill()
+                    continue
+                break
+            pos = end
+            yield value
+
+            skip_whitespace()
+            char = buffer[pos:pos + 1]
+            if char == "]":
+                return
+            if char != ",":
+                message = "Arreglo JSON sin cerrar" if not char else "Se esperaba ',' o ']'"
+                raise json.JSONDecodeError(message, buffer, pos)
+            pos += 1
+
+_READERS = {"json": _read_json_array, "ndjson": _read_ndjson, "bin": _read_binary}
+
+def read_records(path):
+    """
+    Iterates over the records of a stage file in any of the supported formats without
+    loading the whole file. Raises FileNotFoundError / ValueError (json.JSONDecodeError)
+    like json.load would, but only when iteration starts.
+    """
+    yield from _READERS[detect_format(path)](path)
+
+def load_records(path):
+    return list(read_records(path))
+
+# === WRITERS ===
+class RecordWriter:
+    """
+    Streams records into a stage file. A new file is written to a temporary path and
+    moved into place on close (an exception discards it, so a failed stage never leaves
+    a half-written output). With append=True records are added to the end of an
+    existing file in whatever format it already has.
+    """
+
+    def __init__(self, path, format=None, append=False):
+        self.path = path
+        self.count = 0
+        self.append = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.format = detect_format(path) if self.append else (format or default_format())
+        if self.format not in FORMATS:
+            raise ValueError(f"Formato de registros desconocido: {self.format}")
+        self._state = _BinaryState() if self.format == "bin" else None
+        if self.append:
+            self._target = path
+            self._file = self._open_for_append()
+        else:
+            self._target = f"{path}.{os.getpid()}.tmp"
+            self._file = open(self._target, "wb")
+            if self.format == "bin":
+                self._file.write(BINARY_MAGIC)
+
+    def _open_for_append(self):
+        f = open(self.path, "r+b")
+        if self.format == "bin":
+            # Rebuild the key and string tables, and drop a tail left by an interrupted write
+            f.seek(len(BINARY_MAGIC))
+            end = len(BINARY_MAGIC)
+            for frame, end in _iter_binary_frames(f):
+                self._state.decode(frame)
+            f.truncate(end)
+            f.seek(end)
+        elif self.format == "ndjson":
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 1))
+            if size and f.read(1) != b"\n":
+                f.write(b"\n")
+        else:
+            # Reopen the array: cut the closing bracket and continue after the last element
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - READ_BLOCK_SIZE))
+            tail = f.read()
+            closing = tail.rstrip().rfind(b"]")
+            if closing < 0:
+                f.close()
+                raise ValueError(f"'{self.path}' no termina en un arreglo JSON.")
+            body_end = len(tail[:closing].rstrip())
+            has_elements = tail[:body_end].rstrip()[-1:] != b"["
+            f.truncate(size - len(tail) + body_end)
+            f.seek(0, os.SEEK_END)
+            self.count = 1 if has_elements else 0
+        return f
+
+    def write(self, record):
+        if self.format == "ndjson":
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        elif self.format == "bin":
+            self._file.write(self._state.encode(record))
+        else:
+            # Same bytes json.dump(records, f, indent=2, ensure_ascii=False) produces
+            text = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            self._file.write((("[\n  " if self.count == 0 and not self.append else ",\n  " if self.count else "\n  ")
+                              + text).encode("utf-8"))
+        self.count += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.format == "json":
+            if self.append:
+                self._file.write(b"\n]" if self.count else b"]")
+            else:
+                self._file.write(b"\n]" if self.count else b"[]")
+        self._file.close()
+        if not self.append:
+            os.replace(self._target, self.path)
+
+    def abort(self):
+        """Closes without publishing a new file (appended records stay)."""
+        if not self._file.closed:
+            self._file.close()
+        if not self.append and os.path.exists(self._target):
+            os.remove(self._target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or self.append:
+            self.close()
+        else:
+            self.abort()
+
+def write_records(path, records, format=None):
+    """Writes an iterable of records as a new file. Returns how many were written."""
+    with RecordWriter(path, format) as writer:
+        return writer.write_many(records)
+
+def append_records(path, records):
+    with RecordWriter(path, append=True) as writer:
+        return writer.write_many(records)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convierte archivos de registros del pipeline entre formatos (json, ndjson, bin)")
+    parser.add_argument("action", choices=["convert", "info"])
+    parser.add_argument("paths", nargs="+", help="convert: ORIGEN DESTINO; info: uno o más archivos")
+    parser.add_argument("--format", choices=FORMATS, help=f"Formato de salida (por defecto, {FORMAT_ENV} o {DEFAULT_FORMAT})")
+    args = parser.parse_args(argv)
+
+    if args.action == "convert":
+        if len(args.paths) != 2:
+            parser.error("convert requiere ORIGEN y DESTINO.")
+        source, destination = args.paths
+        if os.path.abspath(source) == os.path.abspath(destination):
+            parser.error("ORIGEN y DESTINO deben ser archivos distintos.")
+        count = write_records(destination, read_records(source), args.format)
+        print(f"🔁 {count} registros convertidos de '{source}' ({detect_format(source)}) "
+              f"a '{destination}' ({detect_format(destination)}).")
+        return
+    for path in args.paths:
+        count = sum(1 for _ in read_records(path))
+        print(f"🗃️ {path}: {detect_format(path)}, {count} registros, {os.path.getsize(path) / 2 ** 20:.2f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import abc
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import scraper_all_products as scraper
+
+QUEUE_PATH = "scrape_queue.db"
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 5
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+def unit_id(store_id, category):
+    return f"{store_id}|{category}"
+
+def build_units(stores=None, categories=None):
+    """
+    One unit per (store, category), numbered in the order a single-node run visits them
+    (stores in STORES order, then categories), so merging by position reproduces it.
+    """
+    stores = scraper.STORES if stores is None else stores
+    categories = categories or scraper.CATEGORIES
+    units = []
+    for store_id, store_name in stores.items():
+        for category in categories:
+            units.append({"unit_id": unit_id(store_id, category), "position": len(units),
+                          "store_id": store_id, "store_name": store_name, "category": category})
+    return units
+
+# === QUEUE BACKENDS ===
+class WorkQueue(abc.ABC):
+    """
+    Lease-based queue of scrape units. A claimed unit belongs to its worker until the
+    lease expires; workers extend it with heartbeat() while they scrape, and expired
+    leases go back to the queue (up to max_attempts claims per unit). Results are stored
+    per unit and only accepted from the worker that holds the unit.
+
+    Backends implement the methods below; SQLiteWorkQueue is the default.
+    """
+
+    @abc.abstractmethod
+    def enqueue(self, units, reset=False):
+        """Adds the units not already queued (all of them after reset=True). Returns the counts."""
+
+    @abc.abstractmethod
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS):
+        """Leases the next available unit (pending, or leased with an expired lease). Returns the unit dict or None."""
+
+    @abc.abstractmethod
+    def heartbeat(self, unit_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extends the lease. Returns False if the worker no longer holds the unit."""
+
+    @abc.abstractmethod
+    def complete(self, unit_id, worker_id, products, resumen):
+        """Stores the unit's result. Returns False if the worker no longer holds the unit."""
+
+    @abc.abstractmethod
+    def fail(self, unit_id, worker_id, error):
+        """Gives the unit back to the queue (or marks it failed once it used all its attempts)."""
+
+    @abc.abstractmethod
+    def requeue_expired(self):
+        """Returns units whose lease expired to pending. Returns how many."""
+
+    @abc.abstractmethod
+    def counts(self):
+        """Number of units per state (pending, leased, done, failed)."""
+
+    @abc.abstractmethod
+    def results(self):
+        """(unit, products, resumen) of every finished unit, in unit position order."""
+
+    def close(self):
+        pass
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Queue in a SQLite file. Claims run in BEGIN IMMEDIATE transactions, so any number of
+    worker processes on the machine (or on machines sharing the file over a filesystem
+    with working locks) can pull from it safely.
+    """
+
+    def __init__(self, path=QUEUE_PATH, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS units (
+                unit_id TEXT PRIMARY KEY, position INTEGER NOT NULL, store_id TEXT NOT NULL, store_name TEXT NOT NULL,
+                category TEXT NOT NULL, state TEXT NOT NULL, worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL,
+                error TEXT, products TEXT, resumen TEXT, finished_at REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_units_state ON units(state, position)")
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.conn)
+
+    def enqueue(self, units, reset=False):
+        with self._transaction() as conn:
+            if reset:
+                conn.execute("DELETE FROM units")
+            conn.executemany("""
+                INSERT OR IGNORE INTO units (unit_id, position, store_id, store_name, category, state, attempts)
+                VALUES (?, ?, ?, ?, ?, 'pending', 0)""",
+                [(u["unit_id"], u["position"], u["store_id"], u["store_name"], u["category"]) for u in units])
+        return self.counts()
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("""
+                SELECT unit_id, position, store_id, store_name, category, attempts FROM units
+                WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) AND attempts < ?
+                ORDER BY position LIMIT 1""", (now, self.max_attempts)).fetchone()
+            if row is None:
+                # Units that expired on their last attempt will never be claimed again
+                conn.execute("""
+                    UPDATE units SET state = 'failed', error = COALESCE(error, 'lease vencido')
+                    WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, self.max_attempts))
+                return None
+            conn.execute("UPDATE units SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE unit_id = ?",
+                         (worker_id, now + lease_seconds, row[0]))
+        return dict(zip(("unit_id", "position", "store_id", "store_name", "category", "attempts"), row[:5] + (row[5] + 1,)))
+
+    def heartbeat(self, unit_id, worker_id, lease_seconds=LEASE_SECONDS):
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE units SET lease_expires = ? WHERE unit_id = ? AND worker = ? AND state = 'leased'",
+                                  (time.time() + lease_seconds, unit_id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, unit_id, worker_id, products, resumen):
+        # A worker whose lease expired may still finish first: its result is as good as
+        # the new holder's, so it is accepted as long as nobody else has claimed the unit.
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE units SET state = 'done', products = ?, resumen = ?, error = NULL, finished_at = ?, lease_expires = NULL
+                WHERE unit_id = ? AND worker = ? AND state = 'leased'""",
+                (json.dumps(products, ensure_ascii=False), json.dumps(resumen, ensure_ascii=False), time.time(), unit_id, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, unit_id, worker_id, error):
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    worker = NULL, lease_expires = NULL, error = ?
+                WHERE unit_id = ? AND worker = ? AND state = 'leased'""", (self.max_attempts, str(error), unit_id, worker_id))
+
+    def requeue_expired(self):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE units SET state = 'failed', error = COALESCE(error, 'lease vencido')
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, self.max_attempts))
+            cursor = conn.execute("""
+                UPDATE units SET state = 'pending', worker = NULL, lease_expires = NULL
+                WHERE state = 'leased' AND lease_expires < ?""", (now,))
+        return cursor.rowcount
+
+    def counts(self):
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(self.conn.execute("SELECT state, COUNT(*) FROM units GROUP BY state")))
+        return counts
+
+    def failures(self):
+        rows = self.conn.execute("SELECT store_name, category, error FROM units WHERE state = 'failed' ORDER BY position")
+        return [{"store_name": store, "category": category, "error": error} for store, category, error in rows]
+
+    def results(self):
+        rows = self.conn.execute("""
+            SELECT unit_id, position, store_id, store_name, category, products, resumen FROM units
+            WHERE state = 'done' ORDER BY position""")
+        for unit_id_, position, store_id, store_name, category, products, resumen in rows:
+            unit = {"unit_id": unit_id_, "position": position, "store_id": store_id, "store_name": store_name, "category": category}
+            yield unit, json.loads(products), json.loads(resumen)
+
+    def close(self):
+        self.conn.close()
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK: takes SQLite's write lock up front so claims never race."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+# Backend by URL scheme: "sqlite:///path/queue.db" or a plain path. Other backends
+# (e.g. a shared database or broker) register a factory here that takes the rest of the URL.
+QUEUE_BACKENDS = {
+    "sqlite": SQLiteWorkQueue,
+}
+
+def open_queue(url=QUEUE_PATH, **kwargs):
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return SQLiteWorkQueue(url, **kwargs)
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"Backend de cola desconocido: {scheme}. Disponibles: {', '.join(QUEUE_BACKENDS)}")
+    return QUEUE_BACKENDS[scheme](rest[1:] if scheme == "sqlite" and rest.startswith("/") else rest, **kwargs)
+
+# === WORKER ===
+class _Heartbeat(threading.Thread):
+    """Extends a unit's lease every interval seconds until stopped."""
+
+    def __init__(self, queue_url, unit_id, worker_id, lease_seconds, interval):
+        super().__init__(daemon=True)
+        self.args = (queue_url, unit_id, worker_id, lease_seconds)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        queue_url, unit_id_, worker_id, lease_seconds = self.args
+        queue = open_queue(queue_url)  # SQLite connections are per thread
+        try:
+            while not self.stopped.wait(self.interval):
+                if not queue.heartbeat(unit_id_, worker_id, lease_seconds):
+                    self.lost = True
+                    return
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def run_worker(queue_url=QUEUE_PATH, worker_id=None, lease_seconds=LEASE_SECONDS, heartbeat_seconds=HEARTBEAT_SECONDS,
+               max_units=None, scrape=None):
+    """
+    Claims units until the queue has none left, scraping each one with
+    scrape_store_by_categories and storing its products as soon as it finishes.
+    Returns the number of units completed by this worker.
+    """
+    worker_id = worker_id or default_worker_id()
+    scrape = scrape or scraper.scrape_store_by_categories
+    page_sizes = scraper.load_page_sizes()
+    queue = open_queue(queue_url)
+    completed = 0
+    try:
+        while max_units is None or completed < max_units:
+            unit = queue.claim(worker_id, lease_seconds)
+            if unit is None:
+                break
+            heartbeat = _Heartbeat(queue_url, unit["unit_id"], worker_id, lease_seconds, heartbeat_seconds)
+            heartbeat.start()
+            try:
+                resumen = {}
+                products = scrape(unit["store_id"], unit["store_name"], [unit["category"]], resumen, page_sizes)
+            except Exception as e:
+                heartbeat.stop()
+                print(f"❌ [{worker_id}] {unit['store_name']} - {unit['category']}: {e}")
+                queue.fail(unit["unit_id"], worker_id, e)
+                continue
+            heartbeat.stop()
+            stats = resumen.get((unit["store_name"], unit["category"]), {})
+            # Once a heartbeat failed the unit may already be claimed again: its result is
+            # dropped rather than merged twice
+            if not heartbeat.lost and queue.complete(unit["unit_id"], worker_id, products, stats):
+                completed += 1
+            else:
+                print(f"⚠️ [{worker_id}] Se perdió el lease de {unit['store_name']} - {unit['category']}; otro worker lo repite.")
+    finally:
+        queue.close()
+    if page_sizes:
+        scraper.save_page_sizes(dict(scraper.load_page_sizes(), **page_sizes))
+    return completed
+
+def _worker_process(queue_url, lease_seconds, heartbeat_seconds):
+    run_worker(queue_url, lease_seconds=lease_seconds, heartbeat_seconds=heartbeat_seconds)
+
+# === COORDINATOR ===
+def merge_results(queue, resumen):
+    """
+    Yields the products of every finished unit in unit order, filling resumen as it goes:
+    the same products and resumen a single-node scraper_all_products.main() produces for
+    the same stores and categories.
+    """
+    for unit, products, stats in queue.results():
+        yield from products
+        if stats:
+            resumen[(unit["store_name"], unit["category"])] = stats
+
+def print_counts(counts):
+    print(f"📋 Unidades: {counts[DONE]} terminadas, {counts[LEASED]} en curso, "
+          f"{counts[PENDING]} pendientes, {counts[FAILED]} fallidas")
+
+def wait_for_queue(queue, poll_seconds=POLL_SECONDS, timeout=None):
+    """Re-queues expired leases until no unit is pending or leased. Returns the final counts."""
+    started = time.monotonic()
+    while True:
+        requeued = queue.requeue_expired()
+        if requeued:
+            print(f"🔁 {requeued} unidades con lease vencido regresaron a la cola.")
+        counts = queue.counts()
+        if counts[PENDING] == 0 and counts[LEASED] == 0:
+            return counts
+        if timeout is not None and time.monotonic() - started > timeout:
+            return counts
+        time.sleep(poll_seconds)
+
+def run_local(queue_url=QUEUE_PATH, workers=4, categories=None, lease_seconds=LEASE_SECONDS,
+              heartbeat_seconds=HEARTBEAT_SECONDS, output=scraper.OUTPUT_JSON):
+    """Coordinator plus worker processes on this machine: fills the queue, scrapes and merges."""
+    queue = open_queue(queue_url)
+    try:
+        print_counts(queue.enqueue(build_units(categories=categories), reset=True))
+        processes = [multiprocessing.Process(target=_worker_process, args=(queue_url, lease_seconds, heartbeat_seconds))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        # Units of a worker that died mid-lease come back once their lease expires;
+        # the coordinator scrapes whatever is left itself
+        while True:
+            queue.requeue_expired()
+            counts = queue.counts()
+            if counts[PENDING] == 0 and counts[LEASED] == 0:
+                break
+            if not run_worker(queue_url, lease_seconds=lease_seconds, heartbeat_seconds=heartbeat_seconds):
+                time.sleep(min(POLL_SECONDS, lease_seconds))
+        return finish(queue, output)
+    finally:
+        queue.close()
+
+def finish(queue, output=scraper.OUTPUT_JSON):
+    counts = queue.counts()
+    print_counts(counts)
+    for failure in getattr(queue, "failures", lambda: [])():
+        print(f"❌ {failure['store_name']} - {failure['category']}: {failure['error']}")
+    resumen = {}
+    scraper.save_scrape_results(merge_results(queue, resumen), resumen, output)
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scraping distribuido con una cola de unidades (sucursal, categoría)")
+    parser.add_argument("action", choices=["init", "worker", "status", "wait", "merge", "run"],
+                        help="init: llena la cola; worker: procesa unidades; status: muestra el avance; "
+                             "wait: espera a que termine (re-encola leases vencidos); merge: escribe el JSON; "
+                             "run: todo en esta máquina con --workers procesos")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="Ruta o URL de la cola (sqlite:///ruta.db)")
+    parser.add_argument("--categories", nargs="+", help="Familias a extraer (por defecto, CATEGORIES)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker-id")
+    parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="Duración del lease en segundos")
+    parser.add_argument("--heartbeat", type=int, default=HEARTBEAT_SECONDS, help="Cada cuántos segundos se renueva el lease")
+    parser.add_argument("--output", default=scraper.OUTPUT_JSON)
+    args = parser.parse_args(argv)
+    if args.heartbeat >= args.lease:
+        parser.error("--heartbeat debe ser menor que --lease.")
+
+    if args.action == "run":
+        counts = run_local(args.queue, args.workers, args.categories, args.lease, args.heartbeat, args.output)
+        return 1 if counts[FAILED] else 0
+    if args.action == "worker":
+        completed = run_worker(args.queue, args.worker_id, args.lease, args.heartbeat)
+        print(f"✅ Worker terminado: {completed} unidades completadas.")
+        return 0
+
+    queue = open_queue(args.queue)
+    try:
+        if args.action == "init":
+            print_counts(queue.enqueue(build_units(categories=args.categories), reset=True))
+        elif args.action == "status":
+            queue.requeue_expired()
+            print_counts(queue.counts())
+        elif args.action == "wait":
+            print_counts(wait_for_queue(queue))
+        elif args.action == "merge":
+            counts = finish(queue, args.output)
+            return 1 if counts[PENDING] or counts[LEASED] or counts[FAILED] else 0
+    finally:
+        queue.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,12 @@
+import argparse
 import json
-import urllib.request
-import urllib.parse
+import os
+import requests
 from html.parser import HTMLParser
 from collections import defaultdict
 
+from record_files import write_records
+
 STORES = {
     "154": "Atizapán Plaza Cristal",
     "155": "Azcapotzalco",
@@ -102,6 +105,29 @@ STORES = {
 
 CATEGORIES = ["CELULARES", "CONSOLAS DE JUEGOS"]
 OUTPUT_JSON = "raw_scraped_products_debug.json"
+REQUEST_TIMEOUT = 30
+
+CATALOG_URL = "https://efectimundo.com.mx/catalogo/catalogo.php"
+CATALOG_QUERY_URL = "https://efectimundo.com.mx/catalogo/consulta_catalogo.php?metodo=consulta_catalogo&salida=res&id_sucursal={store_id}"
+
+# === PAGE SIZE ===
+# The catalog answers 50 rows per page by default. Larger sizes are probed through these
+# form fields (the endpoint ignores fields it does not know, which the probe detects) and
+# the result is cached per category in PAGE_SIZES_FILE so later runs skip the probe.
+DEFAULT_PAGE_SIZE = 50
+PAGE_SIZE_CANDIDATES = (1000, 500, 200, 100)
+PAGE_SIZE_FIELDS = ("registros", "limite", "por_pagina")
+PAGE_SIZES_FILE = "scraper_page_sizes.json"
+
+# === RECONCILIATION ===
+# Rounds of targeted re-fetches of missing/short pages, and full category re-downloads
+# allowed when the rows still do not match rowCount.
+RECONCILE_ROUNDS = 2
+FULL_REFETCHES = 1
+SKU_HEADER = "Prenda / Sku Lote"
+
+# One keep-alive session for every page request (and across runs when the process stays up)
+HTTP_SESSION = requests.Session()
 
 class TableParser(HTMLParser):
     def __init__(self):
@@ -143,8 +169,93 @@ class TableParser(HTMLParser):
         elif self.in_td:
             self.current_row.append(data.strip())
 
-def fetch_page_data(page_number, category, store_id):
-    url = f"https://efectimundo.com.mx/catalogo/consulta_catalogo.php?metodo=consulta_catalogo&salida=res&id_sucursal={store_id}"
+class SelectOptionsParser(HTMLParser):
+    """Collects the <option> values of every <select> in a page, keyed by the select's name (or id)."""
+
+    def __init__(self):
+        super().__init__()
+        self.current = None
+        self.options = defaultdict(list)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'select':
+            self.current = attrs.get('name') or attrs.get('id') or ''
+        elif tag == 'option' and self.current is not None:
+            value = (attrs.get('value') or '').strip()
+            if value and value not in self.options[self.current]:
+                self.options[self.current].append(value)
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self.current = None
+
+def parse_table(html):
+    parser = TableParser()
+    parser.feed(html)
+    return parser.headers, parser.rows
+
+def discover_categories():
+    """
+    Lists the familia values offered by the catalog's filter form. Returns an empty
+    list when the page cannot be read or has no familia selector.
+    """
+    try:
+        response = HTTP_SESSION.get(CATALOG_URL, timeout=REQUEST_TIMEOUT,
+                                    headers={'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'})
+        response.raise_for_status()
+    except Exception as e:
+        print(f"❌ Error al consultar las familias del catálogo: {e}")
+        return []
+    parser = SelectOptionsParser()
+    parser.feed(response.text)
+    for name, values in parser.options.items():
+        if "familia" in name.lower():
+            return [value for value in values if value not in ("0", "-1") and "selecciona" not in value.lower()]
+    return []
+
+def load_page_sizes(path=PAGE_SIZES_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_page_sizes(page_sizes, path=PAGE_SIZES_FILE):
+    # Written through a temporary file: several scrape workers may save at once
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(page_sizes, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def negotiate_page_size(category, store_id, initial_data):
+    """
+    Probes larger page sizes for a category, largest first, using the store whose first
+    page is initial_data. A size is accepted only if page 1 comes back with the same
+    rowCount, exactly min(size, rowCount) rows and the same leading rows as the default
+    page. Returns {"field": ..., "page_size": ...}, with field None for the default.
+    """
+    total_items = int(initial_data.get('rowCount', 0))
+    _, default_rows = parse_table(initial_data['tabla'])
+    default_size = len(default_rows) or DEFAULT_PAGE_SIZE
+    for field in PAGE_SIZE_FIELDS:
+        for size in PAGE_SIZE_CANDIDATES:
+            if size <= default_size:
+                continue
+            data = fetch_page_data(1, category, store_id, page_size=size, page_size_field=field)
+            if not data or not data.get('tabla') or int(data.get('rowCount', 0)) != total_items:
+                continue
+            _, rows = parse_table(data['tabla'])
+            if len(rows) == default_size:
+                break  # Field ignored by the endpoint: no point in trying other sizes with it
+            if len(rows) == min(size, total_items) and rows[:default_size] == default_rows:
+                return {"field": field, "page_size": size}
+    return {"field": None, "page_size": default_size}
+
+def fetch_page_data(page_number, category, store_id, page_size=None, page_size_field=None):
+    url = CATALOG_QUERY_URL.format(store_id=store_id)
     headers = {
         'Accept': 'application/json, text/javascript, */*; q=0.01',
         'Accept-Language': 'es-419,es;q=0.6',
@@ -157,7 +268,7 @@ def fetch_page_data(page_number, category, store_id):
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)',
         'X-Requested-With': 'XMLHttpRequest'
     }
-    data = urllib.parse.urlencode({
+    data = {
         "pagina": page_number,
         "ramo": "",
         "familia": category,
@@ -166,13 +277,13 @@ def fetch_page_data(page_number, category, store_id):
         "marca": "",
         "modelo": "",
         "descripcion": ""
-    }).encode('utf-8')
-    req = urllib.request.Request(url, data=data, headers=headers)
+    }
+    if page_size_field and page_size:
+        data[page_size_field] = page_size
     try:
-        with urllib.request.urlopen(req) as response:
-            response_content = response.read().decode('utf-8')
-            parsed_json = json.loads(response_content)
-            return parsed_json
+        response = HTTP_SESSION.post(url, data=data, headers=headers, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return json.loads(response.content.decode('utf-8'))
     except Exception as e:
         print(f"❌ Error al obtener página {page_number} de {category} en sucursal {store_id}: {e}")
         return None
@@ -189,8 +300,152 @@ def is_valid_product(product):
     except:
         return False
 
-def scrape_store_by_categories(store_id, store_name, categories, resumen):
+def fetch_page_rows(page_number, category, store_id, page_size=None, page_size_field=None):
+    """Rows of one page and the rowCount it reported, or (None, None) if the page failed."""
+    data = fetch_page_data(page_number, category, store_id, page_size, page_size_field)
+    if not data or not data.get("tabla"):
+        return None, None
+    return parse_table(data["tabla"])[1], int(data.get("rowCount", 0))
+
+def expected_page_rows(page_number, page_size, total_items):
+    return max(0, min(page_size, total_items - (page_number - 1) * page_size))
+
+def incomplete_pages(pages, page_size, total_items):
+    """Pages that failed (None) or came back with fewer rows than rowCount implies."""
+    return [page for page, rows in sorted(pages.items())
+            if rows is None or len(rows) < expected_page_rows(page, page_size, total_items)]
+
+def dedupe_rows(pages, sku_index):
+    """
+    Joins the pages in order, keeping the first occurrence of each SKU (rows without SKU
+    are compared whole): an item that shifts to the next page mid-pagination appears twice.
+    Returns (rows, duplicates dropped).
+    """
+    rows, seen, duplicates = [], set(), 0
+    for page in sorted(pages):
+        for row in pages[page] or []:
+            sku = row[sku_index].strip() if sku_index is not None and sku_index < len(row) else ""
+            key = sku or tuple(row)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            rows.append(row)
+    return rows, duplicates
+
+def download_category_snapshot(category, store_id, total_items, page_size, requested_size, field, first_rows):
+    """
+    Downloads pages 2..N for a rowCount taken from page 1, then re-fetches only the pages
+    that failed or came back short. Page boundaries are only meaningful for that rowCount,
+    so a page reporting a different one marks the snapshot as drifted: targeted
+    re-fetches stop and the caller decides whether to download the category again.
+    Returns (pages, drifted, pages re-fetched).
+    """
+    total_pages = (total_items + page_size - 1) // page_size
+    pages = {1: first_rows}
+    drifted = False
+    for page_num in range(2, total_pages + 1):
+        rows, row_count = fetch_page_rows(page_num, category, store_id, requested_size, field)
+        pages[page_num] = rows
+        drifted |= row_count is not None and row_count != total_items
+
+    refetched = 0
+    for _ in range(RECONCILE_ROUNDS):
+        missing = incomplete_pages(pages, page_size, total_items)
+        if not missing or drifted:
+            break
+        for page_num in missing:
+            rows, row_count = fetch_page_rows(page_num, category, store_id, requested_size, field)
+            refetched += 1
+            if row_count is not None and row_count != total_items:
+                drifted = True
+                break
+            if rows is not None and (pages[page_num] is None or len(rows) > len(pages[page_num])):
+                pages[page_num] = rows
+    return pages, drifted, refetched
+
+def fetch_category_rows(category, store_id, store_name, page_sizes):
+    """
+    Downloads every row of a category in one store and reconciles it with rowCount:
+    failed or short pages are re-fetched, rows are deduplicated by SKU and, if the count
+    still does not match, the whole category is downloaded again (FULL_REFETCHES times).
+    Returns (headers, rows, rowCount, reconciliation stats), or None without data.
+    """
+    setting = page_sizes.get(category, {})
+    field, requested_size = setting.get("field"), setting.get("page_size")
+    initial_data = fetch_page_data(1, category, store_id, requested_size, field)
+    if not initial_data or not initial_data.get('tabla'):
+        return None
+
+    total_items = int(initial_data.get('rowCount', 0))
+    headers, first_rows = parse_table(initial_data['tabla'])
+
+    if category not in page_sizes and total_items > len(first_rows):
+        setting = negotiate_page_size(category, store_id, initial_data)
+        page_sizes[category] = setting
+        print(f"   -> Tamaño de página para {category}: {setting['page_size']} filas")
+        if setting["field"]:
+            resized_data = fetch_page_data(1, category, store_id, setting["page_size"], setting["field"])
+            if resized_data and resized_data.get('tabla'):
+                field, requested_size = setting["field"], setting["page_size"]
+                initial_data = resized_data
+                total_items = int(initial_data.get('rowCount', 0))
+                headers, first_rows = parse_table(initial_data['tabla'])
+            else:
+                # Keep the default-size first page already downloaded; other stores still use the new size
+                print(f"⚠️ No se pudo descargar la página 1 de {category} en {store_name} con el nuevo tamaño; "
+                      f"se usa el predeterminado.")
+
+    # The page size actually served decides the page count; if the endpoint stops
+    # honouring the negotiated size this falls back to whatever it returns.
+    page_size = len(first_rows) if total_items > len(first_rows) else max(total_items, 1)
+    if requested_size and page_size != min(requested_size, total_items):
+        print(f"⚠️ {category} en {store_name}: se pidieron {requested_size} filas por página y llegaron {page_size}.")
+
+    sku_index = headers.index(SKU_HEADER) if SKU_HEADER in headers else None
+    pages, drifted, refetched = download_category_snapshot(
+        category, store_id, total_items, page_size, requested_size, field, first_rows)
+    rows, duplicates = dedupe_rows(pages, sku_index)
+    stats = {"Páginas re-descargadas": refetched, "Duplicados descartados": duplicates, "Re-descargas completas": 0}
+
+    for _ in range(FULL_REFETCHES):
+        if len(rows) == total_items and not drifted:
+            break
+        print(f"🔁 {category} en {store_name}: {len(rows)} filas de {total_items} esperadas"
+              f"{' (el catálogo cambió durante la paginación)' if drifted else ''}. Descargando la categoría de nuevo...")
+        stats["Re-descargas completas"] += 1
+        new_rows, new_total = fetch_page_rows(1, category, store_id, requested_size, field)
+        if new_rows is None:
+            break
+        page_size = len(new_rows) if new_total > len(new_rows) else max(new_total, 1)
+        pages, drifted, refetched = download_category_snapshot(
+            category, store_id, new_total, page_size, requested_size, field, new_rows)
+        new_unique, duplicates = dedupe_rows(pages, sku_index)
+        stats["Páginas re-descargadas"] += refetched
+        stats["Duplicados descartados"] += duplicates
+        if len(new_unique) < new_total:
+            # Rows of the previous pass that slipped between pages of this one are added
+            # back, as long as that never goes over the count the catalog reports
+            known = {row[sku_index].strip() if sku_index is not None and sku_index < len(row) else "" for row in new_unique}
+            missed = [row for row in rows if sku_index is not None and sku_index < len(row)
+                      and row[sku_index].strip() and row[sku_index].strip() not in known]
+            if len(new_unique) + len(missed) <= new_total:
+                new_unique = new_unique + missed
+        rows, total_items = new_unique, new_total
+
+    stats["Conciliado"] = "Sí" if len(rows) == total_items else "No"
+    if len(rows) != total_items:
+        print(f"⚠️ {category} en {store_name}: {len(rows)} filas tras conciliar, rowCount {total_items}.")
+    return headers, rows, total_items, stats
+
+def scrape_store_by_categories(store_id, store_name, categories, resumen, page_sizes=None):
+    """
+    page_sizes maps category -> {"field", "page_size"} as returned by negotiate_page_size.
+    Categories missing from it are negotiated on the first store with more than one
+    default page and added to the dict, so callers can share and persist it.
+    """
     all_products = []
+    page_sizes = {} if page_sizes is None else page_sizes
 
     for category in categories:
         total_rowcount = 0
@@ -199,34 +454,16 @@ def scrape_store_by_categories(store_id, store_name, categories, resumen):
         total_danado = 0
         total_invalid_price = 0
 
-        all_rows = []
-        headers = []
+        reconciliation = {}
 
         print(f"📦 Procesando {category} en {store_name} ({store_id})")
 
         try:
-            initial_data = fetch_page_data(1, category, store_id)
-            if not initial_data or not initial_data.get('tabla'):
+            fetched = fetch_category_rows(category, store_id, store_name, page_sizes)
+            if fetched is None:
                 print(f"⚠️ No hay datos para {category} en {store_name}.")
                 continue
-
-            total_items = int(initial_data.get('rowCount', 0))
-            page_size = 50
-            total_pages = (total_items + page_size - 1) // page_size
-            total_rowcount = total_items
-
-            parser = TableParser()
-            parser.feed(initial_data['tabla'])
-            headers = parser.headers
-            all_rows.extend(parser.rows)
-
-            for page_num in range(2, total_pages + 1):
-                data = fetch_page_data(page_num, category, store_id)
-                if data and data.get("tabla"):
-                    parser = TableParser()
-                    parser.feed(data["tabla"])
-                    all_rows.extend(parser.rows)
-
+            headers, all_rows, total_rowcount, reconciliation = fetched
             total_rows = len(all_rows)
 
             for row in all_rows:
@@ -268,23 +505,44 @@ def scrape_store_by_categories(store_id, store_name, categories, resumen):
             "Parseados": total_rows,
             "Guardados": total_saved,
             "Descartados por Familia dañada": total_danado,
-            "Descartados por precio inválido": total_invalid_price
+            "Descartados por precio inválido": total_invalid_price,
+            **reconciliation
         }
 
     return all_products
 
-def main():
-    all_products = []
+def resolve_categories(discover=False):
+    """CATEGORIES, or every familia listed by the catalog when discover is set (CATEGORIES if discovery fails)."""
+    if not discover:
+        return CATEGORIES
+    discovered = discover_categories()
+    if not discovered:
+        print(f"⚠️ No se pudieron descubrir familias; se usan las predeterminadas: {', '.join(CATEGORIES)}")
+        return CATEGORIES
+    print(f"🔎 Familias descubiertas ({len(discovered)}): {', '.join(discovered)}")
+    return discovered
+
+def scrape_all_stores(categories, resumen, page_sizes):
+    """Yields the products store by store, so they can be written while the next store is scraped."""
+    for store_id, store_name in STORES.items():
+        yield from scrape_store_by_categories(store_id, store_name, categories, resumen, page_sizes)
+
+def main(categories=None, discover=False, renegotiate=False, page_sizes=None):
+    """page_sizes, if given, is updated in place, so a long-running process keeps the negotiated sizes."""
     resumen = {}
+    categories = categories or resolve_categories(discover)
+    if page_sizes is None:
+        page_sizes = {} if renegotiate else load_page_sizes()
 
-    for store_id, store_name in STORES.items():
-        all_products.extend(scrape_store_by_categories(store_id, store_name, CATEGORIES, resumen))
+    save_scrape_results(scrape_all_stores(categories, resumen, page_sizes), resumen)
+    save_page_sizes(page_sizes)
 
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(all_products, f, indent=2, ensure_ascii=False)
+def save_scrape_results(products, resumen, path=OUTPUT_JSON):
+    """Writes the products (any iterable; resumen may fill up while it is consumed) and prints the summary."""
+    total = write_records(path, products)
 
-    print(f"\n✅ Scraping completado. Resultados guardados en '{OUTPUT_JSON}'")
-    print(f"📊 Total de dispositivos válidos detectados: {len(all_products)}\n")
+    print(f"\n✅ Scraping completado. Resultados guardados en '{path}'")
+    print(f"📊 Total de dispositivos válidos detectados: {total}\n")
 
     for (store, category), stats in resumen.items():
         print(f"🧾 {store} - {category}")
@@ -293,4 +551,15 @@ def main():
         print()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Extrae el catálogo de todas las sucursales")
+    parser.add_argument("--categories", nargs="+", help="Familias a extraer (por defecto, CATEGORIES)")
+    parser.add_argument("--discover", action="store_true", help="Extrae todas las familias que ofrece el catálogo")
+    parser.add_argument("--list-categories", action="store_true", help="Solo muestra las familias del catálogo y termina")
+    parser.add_argument("--renegotiate", action="store_true",
+                        help=f"Vuelve a probar el tamaño de página aunque esté guardado en {PAGE_SIZES_FILE}")
+    args = parser.parse_args()
+    if args.list_categories:
+        for familia in discover_categories():
+            print(familia)
+    else:
+        main(args.categories, args.discover, args.renegotiate)
@@ -0,0 +1,151 @@
+import bisect
+
+from sheet_snapshot import col_to_letter, parse_a1_range
+
+def cells_from_updates(updates):
+    """Expands [{'range': A1, 'values': [[...]]}] into {(row, col): value} (1-based rows, 0-based cols)."""
+    cells = {}
+    for update in updates:
+        first_row, first_col, _, _ = parse_a1_range(update['range'])
+        for row_offset, row_values in enumerate(update['values']):
+            for col_offset, value in enumerate(row_values):
+                cells[(first_row + row_offset, first_col + col_offset)] = value
+    return cells
+
+def values_equal(current, intended):
+    """Compares a value read from the sheet (always a string) with the value we would write."""
+    current = '' if current is None else str(current).strip()
+    intended = '' if intended is None else str(intended).strip()
+    if current == intended:
+        return True
+    try:
+        return float(current.replace(',', '')) == float(intended)
+    except ValueError:
+        return False
+
+def coalesce_cells(cells):
+    """Merges cells that are adjacent in the same column into single A1 ranges."""
+    updates = []
+    run_col, run_start, run_values = None, None, []
+
+    def close_run():
+        if run_values:
+            col_letter = col_to_letter(run_col)
+            run_end = run_start + len(run_values) - 1
+            a1_range = f'{col_letter}{run_start}' if run_end == run_start else f'{col_letter}{run_start}:{col_letter}{run_end}'
+            updates.append({'range': a1_range, 'values': [[value] for value in run_values]})
+
+    for (row, col) in sorted(cells, key=lambda cell: (cell[1], cell[0])):
+        if col == run_col and row == run_start + len(run_values):
+            run_values.append(cells[(row, col)])
+            continue
+        close_run()
+        run_col, run_start, run_values = col, row, [cells[(row, col)]]
+    close_run()
+    return updates
+
+def diff_cells(intended_cells, current_value):
+    """
+    Compares the intended {(row, col): value} state with the current one (current_value
+    is a callable (row, col) -> str, e.g. SheetSnapshot.cell) and returns
+    (coalesced updates, changed cell count, avoided write count).
+    """
+    changed = {cell: value for cell, value in intended_cells.items() if not values_equal(current_value(*cell), value)}
+    return coalesce_cells(changed), len(changed), len(intended_cells) - len(changed)
+
+# Google recommends keeping request payloads around 2 MB; these bounds stay well below that for typical cell values
+MAX_RANGES_PER_CHUNK = 1000
+MAX_CELLS_PER_CHUNK = 20000
+
+def split_update(update, max_cells=MAX_CELLS_PER_CHUNK):
+    """Splits one update whose values exceed max_cells into consecutive row slices."""
+    width = max((len(row_values) for row_values in update['values']), default=1) or 1
+    rows_per_piece = max(1, max_cells // width)
+    if len(update['values']) <= rows_per_piece:
+        return [update]
+    first_row, first_col, _, _ = parse_a1_range(update['range'])
+    first_letter, last_letter = col_to_letter(first_col), col_to_letter(first_col + width - 1)
+    pieces = []
+    for offset in range(0, len(update['values']), rows_per_piece):
+        piece_values = update['values'][offset:offset + rows_per_piece]
+        start = first_row + offset
+        pieces.append({'range': f'{first_letter}{start}:{last_letter}{start + len(piece_values) - 1}', 'values': piece_values})
+    return pieces
+
+def chunk_updates(updates, max_ranges=MAX_RANGES_PER_CHUNK, max_cells=MAX_CELLS_PER_CHUNK):
+    """Splits a list of value updates, keeping their order, into chunks bounded by range and cell count."""
+    chunks = []
+    current, current_cells = [], 0
+    for update in (piece for original in updates for piece in split_update(original, max_cells)):
+        cells = sum(len(row_values) for row_values in update['values']) or 1
+        if current and (len(current) >= max_ranges or current_cells + cells > max_cells):
+            chunks.append(current)
+            current, current_cells = [], 0
+        current.append(update)
+        current_cells += cells
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _update_rect(update):
+    first_row, first_col, last_row, last_col = parse_a1_range(update['range'])
+    # Open-ended or single-cell ranges cover whatever the values span
+    last_row = max(last_row, first_row + len(update['values']) - 1)
+    last_col = max(last_col, first_col + max((len(row_values) for row_values in update['values']), default=1) - 1)
+    return first_row, first_col, last_row, last_col
+
+def _rects_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class _ColumnIntervals:
+    """Row intervals per column of one chunk, answering 'does this rectangle touch any of them' with bisect."""
+
+    def __init__(self, rects):
+        by_col = {}
+        for first_row, first_col, last_row, last_col in rects:
+            for col in range(first_col, last_col + 1):
+                by_col.setdefault(col, []).append((first_row, last_row))
+        self.columns = {}
+        for col, intervals in by_col.items():
+            intervals.sort()
+            starts, max_ends, running = [], [], 0
+            for first_row, last_row in intervals:
+                running = max(running, last_row)
+                starts.append(first_row)
+                max_ends.append(running)
+            self.columns[col] = (starts, max_ends)
+
+    def overlaps(self, rect):
+        first_row, first_col, last_row, last_col = rect
+        for col in range(first_col, last_col + 1):
+            if col not in self.columns:
+                continue
+            starts, max_ends = self.columns[col]
+            count = bisect.bisect_right(starts, last_row)
+            if count and max_ends[count - 1] >= first_row:
+                return True
+        return False
+
+def chunk_waves(chunks):
+    """
+    Orders chunks into waves that can be sent concurrently: a chunk that writes a
+    cell also written by an earlier chunk goes into a later wave, so the last
+    value in the original update list still wins. Returns lists of chunk indices.
+    """
+    rects = [[_update_rect(update) for update in chunk] for chunk in chunks]
+    bounds = [(min(r[0] for r in chunk_rects), min(r[1] for r in chunk_rects),
+               max(r[2] for r in chunk_rects), max(r[3] for r in chunk_rects)) for chunk_rects in rects]
+    intervals = [_ColumnIntervals(chunk_rects) for chunk_rects in rects]
+    wave_of = []
+    for i in range(len(chunks)):
+        wave = 0
+        for j in range(i):
+            if wave_of[j] + 1 <= wave or not _rects_overlap(bounds[i], bounds[j]):
+                continue
+            if any(intervals[j].overlaps(rect) for rect in rects[i]):
+                wave = wave_of[j] + 1
+        wave_of.append(wave)
+    waves = [[] for _ in range(max(wave_of, default=-1) + 1)]
+    for i, wave in enumerate(wave_of):
+        waves[wave].append(i)
+    return waves
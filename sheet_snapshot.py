@@ -0,0 +1,151 @@
+import re
+
+from gspread.utils import absolute_range_name
+
+HEADER_ROW = 2  # 1-based row holding the column titles
+FIRST_DATA_ROW = 3
+
+_A1_CELL_RE = re.compile(r"^\$?([A-Z]+)\$?(\d+)$")
+
+def col_to_letter(col_idx):
+    letter = ''
+    temp_idx = col_idx
+    while temp_idx >= 0:
+        temp_idx, remainder = divmod(temp_idx, 26)
+        letter = chr(65 + remainder) + letter
+        temp_idx -= 1
+    return letter
+
+def letter_to_col(letters):
+    col_idx = 0
+    for char in letters.upper():
+        col_idx = col_idx * 26 + (ord(char) - ord('A') + 1)
+    return col_idx - 1
+
+def parse_a1_range(a1_range):
+    """
+    Parses 'B5', 'A5:F7' or "'Hoja'!B5" into (first_row, first_col, last_row, last_col)
+    with 1-based rows and 0-based columns.
+    """
+    if "!" in a1_range:
+        a1_range = a1_range.rsplit("!", 1)[1]
+    start, _, end = a1_range.partition(":")
+    parsed = []
+    for cell in (start, end or start):
+        match = _A1_CELL_RE.match(cell.strip().upper())
+        if not match:
+            raise ValueError(f"Rango A1 no soportado: {a1_range}")
+        letters, row = match.groups()
+        parsed.append((int(row), letter_to_col(letters)))
+    (first_row, first_col), (last_row, last_col) = parsed
+    return first_row, first_col, last_row, last_col
+
+class SheetSnapshot:
+    """
+    Local copy of a worksheet's values, read once and kept in sync with every
+    change the sync makes (cleanups, normalizations, inventory writes, inserts),
+    so row counts and indices are computed locally instead of re-downloading
+    the sheet. Remote edits by someone else are detected with a single-column
+    probe and trigger a full reload.
+
+    With select_columns (a function from the header row to the 0-based column
+    indices needed) the snapshot is projected: only the header row and those
+    columns are downloaded, in one batched values read, and every other cell
+    reads as ''. Rows holding data only in skipped columns past the last
+    loaded value are not counted in row_count.
+    """
+
+    def __init__(self, sheet, spreadsheet=None, select_columns=None):
+        self.sheet = sheet
+        self.spreadsheet = spreadsheet
+        self.select_columns = select_columns
+        self.values = []
+        self.full_reads = 0
+        self.load()
+
+    def load(self):
+        if self.select_columns is not None and self.spreadsheet is not None:
+            self.values = self._load_projected()
+        else:
+            self.values = [list(row) for row in self.sheet.get_all_values()]
+        self.full_reads += 1
+
+    def _load_projected(self):
+        headers = list(self.sheet.row_values(HEADER_ROW))
+        columns = sorted(set(self.select_columns(headers)))
+        ranges = [absolute_range_name(self.sheet.title, f"{col_to_letter(c)}1:{col_to_letter(c)}") for c in columns]
+        response = self.spreadsheet.values_batch_get(ranges, params={"majorDimension": "COLUMNS"})
+        column_values = [(value_range.get("values") or [[]])[0] for value_range in response.get("valueRanges", [])]
+
+        width = len(headers)
+        row_count = max([HEADER_ROW] + [len(values) for values in column_values])
+        values = [[''] * width for _ in range(row_count)]
+        values[HEADER_ROW - 1] = headers
+        for col_idx, column in zip(columns, column_values):
+            for row_idx, value in enumerate(column):
+                if row_idx != HEADER_ROW - 1:
+                    values[row_idx][col_idx] = value
+        return values
+
+    # --- Reads ---
+    @property
+    def headers(self):
+        return self.values[HEADER_ROW - 1] if len(self.values) >= HEADER_ROW else []
+
+    @property
+    def rows(self):
+        """Data rows (from FIRST_DATA_ROW on), same structure as get_all_values()[2:]."""
+        return self.values[FIRST_DATA_ROW - 1:]
+
+    @property
+    def row_count(self):
+        return len(self.values)
+
+    def cell(self, row_number, col_idx):
+        if row_number > len(self.values):
+            return ''
+        row = self.values[row_number - 1]
+        return row[col_idx] if col_idx < len(row) else ''
+
+    def col_values(self, col_idx):
+        """Same result as worksheet.col_values(col_idx + 1): trailing empty cells are dropped."""
+        column = [row[col_idx] if col_idx < len(row) else '' for row in self.values]
+        while column and column[-1] == '':
+            column.pop()
+        return column
+
+    # --- Local changes ---
+    def set_cell(self, row_number, col_idx, value):
+        while len(self.values) < row_number:
+            self.values.append([])
+        row = self.values[row_number - 1]
+        if len(row) <= col_idx:
+            row.extend([''] * (col_idx + 1 - len(row)))
+        row[col_idx] = '' if value is None else str(value)
+
+    def apply_value_updates(self, updates):
+        """Records a list of {'range': A1, 'values': [[...]]} updates, as sent to worksheet.batch_update."""
+        for update in updates:
+            first_row, first_col, _, _ = parse_a1_range(update['range'])
+            for row_offset, row_values in enumerate(update['values']):
+                for col_offset, value in enumerate(row_values):
+                    self.set_cell(first_row + row_offset, first_col + col_offset, value)
+
+    def insert_rows(self, row_number, new_rows):
+        """Records rows inserted before row_number (1-based), as insertDimension + values write would."""
+        while len(self.values) < row_number - 1:
+            self.values.append([])
+        self.values[row_number - 1:row_number - 1] = [['' if v is None else str(v) for v in row] for row in new_rows]
+
+    # --- Staleness ---
+    def refresh_if_changed(self, probe_col_idx):
+        """
+        Reads one column and compares it with the local copy. If it differs, someone
+        else edited the sheet: reload everything. Returns True when a reload happened.
+        """
+        remote_column = self.sheet.col_values(probe_col_idx + 1)
+        if remote_column == self.col_values(probe_col_idx):
+            return False
+        print("🔄 La hoja cambió durante la sincronización. Recargando la copia local...")
+        self.load()
+        return True
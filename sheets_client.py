@@ -0,0 +1,216 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import gspread
+import requests
+
+from sheet_diff import chunk_updates, chunk_waves
+
+# Google Sheets API limits are per minute and per user (service account)
+READ_REQUESTS_PER_MINUTE = 60
+WRITE_REQUESTS_PER_MINUTE = 60
+BURST_REQUESTS = 10
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+CHUNK_WORKERS = 4
+
+READ_OPERATIONS = {
+    "open_by_key", "worksheet", "worksheets", "get_all_values", "col_values", "row_values", "get",
+    "batch_get", "fetch_sheet_metadata", "values_batch_get", "values_get",
+}
+WRITE_OPERATIONS = {
+    "batch_update", "batch_clear", "update", "insert_row", "insert_rows", "append_rows", "add_worksheet",
+    "values_batch_update", "values_update", "values_batch_clear",
+}
+# Writes that change the sheet's structure: if the server applied one and only the
+# response was lost, sending it again inserts (or appends) the rows a second time
+NON_IDEMPOTENT_OPERATIONS = {"insert_row", "insert_rows", "append_row", "append_rows", "add_worksheet"}
+# Spreadsheet batchUpdate requests with the same problem (formatting and validation requests are safe to repeat)
+NON_IDEMPOTENT_REQUESTS = {"insertDimension", "appendDimension", "insertRange", "addSheet", "duplicateSheet", "appendCells"}
+
+class TokenBucket:
+    """
+    Paces calls so that no 60-second window exceeds per_minute calls: up to burst
+    calls go out immediately and the rest refill at (per_minute - burst) / 60 per
+    second (burst is meant to be a small fraction of per_minute). Callers reserve
+    their token under the lock and sleep outside it, so concurrent callers queue
+    in order instead of all waking up at once.
+    """
+
+    def __init__(self, per_minute, burst=BURST_REQUESTS):
+        self.capacity = max(1, min(burst, per_minute))
+        # Burst + one minute of refill stays within per_minute (a burst of a whole minute would allow twice the quota)
+        self.refill_per_second = max(per_minute - self.capacity, per_minute / 2) / 60.0
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until it is available. Returns the seconds waited."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.refill_per_second
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def drain(self):
+        """Empties the bucket after the API reported a quota error."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated_at = time.monotonic()
+
+def _status_code(error):
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+def is_retryable_error(error, idempotent=True):
+    """
+    Transient errors worth retrying. A 429 is rejected before anything is applied, so
+    it is always retried; 5xx and network errors may arrive after the server applied
+    the request, so they are only retried for requests that are safe to repeat.
+    """
+    if isinstance(error, gspread.exceptions.APIError):
+        status = _status_code(error)
+        return status == 429 or (idempotent and status in RETRYABLE_STATUS_CODES)
+    return idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+def is_idempotent_call(operation, args, kwargs):
+    """False for writes that insert or append (see NON_IDEMPOTENT_OPERATIONS and NON_IDEMPOTENT_REQUESTS)."""
+    if operation in NON_IDEMPOTENT_OPERATIONS:
+        return False
+    body = kwargs.get("body", args[0] if args else None)
+    if operation == "batch_update" and isinstance(body, dict):
+        return not any(kind in NON_IDEMPOTENT_REQUESTS for request in body.get("requests", []) for kind in request)
+    return True
+
+class SheetsClient:
+    """
+    Single entry point for every Google Sheets call of the sync: paces reads and
+    writes with separate token buckets, retries transient errors (429/5xx, network)
+    with jittered exponential backoff and counts calls per operation. Inserts and
+    appends are only retried on 429 (see is_retryable_error).
+    """
+
+    def __init__(self, read_per_minute=READ_REQUESTS_PER_MINUTE, write_per_minute=WRITE_REQUESTS_PER_MINUTE,
+                 burst=BURST_REQUESTS, max_retries=6, base_backoff=1.0, max_backoff=64.0):
+        self.buckets = {"read": TokenBucket(read_per_minute, burst), "write": TokenBucket(write_per_minute, burst)}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.call_counts = Counter()
+        self.retry_counts = Counter()
+        self.waited_seconds = Counter()
+        self.stats_lock = threading.Lock()
+
+    def call(self, kind, operation, func, *args, **kwargs):
+        idempotent = is_idempotent_call(operation, args, kwargs)
+        attempt = 0
+        while True:
+            waited = self.buckets[kind].acquire()
+            with self.stats_lock:
+                self.call_counts[operation] += 1
+                self.waited_seconds[kind] += waited
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable_error(e, idempotent) or attempt >= self.max_retries:
+                    raise
+                if _status_code(e) == 429:
+                    self.buckets[kind].drain()
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                attempt += 1
+                with self.stats_lock:
+                    self.retry_counts[operation] += 1
+                print(f"   -> Error transitorio en '{operation}' ({e}). Reintento {attempt}/{self.max_retries} en {backoff:.1f} s...")
+                time.sleep(backoff)
+
+    def read(self, operation, func, *args, **kwargs):
+        return self.call("read", operation, func, *args, **kwargs)
+
+    def write(self, operation, func, *args, **kwargs):
+        return self.call("write", operation, func, *args, **kwargs)
+
+    def wrap(self, target):
+        """Returns a proxy of a gspread client, spreadsheet or worksheet whose API calls go through this client."""
+        return PacedProxy(target, self)
+
+    def report(self):
+        total = sum(self.call_counts.values())
+        print(f"📈 Llamadas a Google Sheets: {total} "
+              f"(espera por cuota: lectura {self.waited_seconds['read']:.1f} s, escritura {self.waited_seconds['write']:.1f} s)")
+        for operation, count in sorted(self.call_counts.items()):
+            retries = self.retry_counts.get(operation, 0)
+            print(f"   • {operation}: {count}" + (f" ({retries} reintentos)" if retries else ""))
+
+def _is_sheets_object(value):
+    return hasattr(value, "batch_update") and not isinstance(value, (dict, list, PacedProxy))
+
+class PacedProxy:
+    """Forwards attribute access to the wrapped gspread object, routing known API methods through SheetsClient."""
+
+    def __init__(self, target, client):
+        self._target = target
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        if name in READ_OPERATIONS:
+            kind = "read"
+        elif name in WRITE_OPERATIONS:
+            kind = "write"
+        else:
+            return attr
+
+        def paced(*args, **kwargs):
+            result = self._client.call(kind, name, attr, *args, **kwargs)
+            return self._client.wrap(result) if _is_sheets_object(result) else result
+        return paced
+
+    def __repr__(self):
+        return f"PacedProxy({self._target!r})"
+
+class ChunkedUpdateError(Exception):
+    """Some chunks of a split batch_update failed after their retries; 'applied' holds the updates that went through."""
+
+    def __init__(self, applied, failures):
+        self.applied = applied
+        self.failures = failures  # list of (chunk of updates, exception)
+        super().__init__(f"{len(failures)} bloques de actualización fallaron: {failures[0][1]}")
+
+def batch_update_in_chunks(sheet, updates, max_workers=CHUNK_WORKERS, max_ranges=None, max_cells=None, **kwargs):
+    """
+    Sends worksheet.batch_update(updates, **kwargs) split into size-bounded chunks.
+    Chunks that do not overlap go out concurrently (a paced sheet keeps them within
+    quota and retries each one on its own); overlapping chunks keep their original
+    order. Returns the number of chunks sent, or raises ChunkedUpdateError once
+    every chunk has been tried.
+    """
+    limits = {k: v for k, v in (("max_ranges", max_ranges), ("max_cells", max_cells)) if v}
+    chunks = chunk_updates(updates, **limits)
+    if len(chunks) <= 1:
+        if chunks:
+            sheet.batch_update(chunks[0], **kwargs)
+        return len(chunks)
+
+    print(f"   -> Enviando {len(updates)} rangos en {len(chunks)} bloques...")
+    succeeded, failures = set(), []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for wave in chunk_waves(chunks):
+            futures = {i: executor.submit(sheet.batch_update, chunks[i], **kwargs) for i in wave}
+            for i, future in futures.items():
+                try:
+                    future.result()
+                    succeeded.add(i)
+                except Exception as e:
+                    failures.append((chunks[i], e))
+    if failures:
+        applied = [update for i, chunk in enumerate(chunks) if i in succeeded for update in chunk]
+        raise ChunkedUpdateError(applied, failures)
+    return len(chunks)
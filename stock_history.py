@@ -0,0 +1,388 @@
+import argparse
+import bisect
+import json
+import os
+import struct
+import time
+from array import array
+from datetime import datetime
+
+from generate_stock_summary import CUBE_FILE, VARIANT_FIELDS, StockCube
+
+HISTORY_FILE = "stock_history.bin"
+HISTORY_MAGIC = b"STKHIST1"
+SNAPSHOT_EVERY = 24  # a full snapshot every N frames bounds the replay needed for a point in time
+
+FRAME_MARKER = b"F"
+FRAME_SNAPSHOT = 1
+FRAME_DELTA = 2
+FRAME_HEADER = struct.Struct("<cBdI")  # marker, frame type, timestamp, payload length
+# Frame index kept next to the history (<history>.idx), so opening it does not decode every frame
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"STKHIDX1"
+
+NO_PRICE = -1     # price columns: no valid price in that run
+REMOVED = -1      # stock column: the variant disappeared from the summary
+STAT_FIELDS = ("stock", "min_price", "median_price", "max_price")
+COLUMN_TYPECODES = ("I", "i", "q", "q", "q")  # ids, stock, min, median, max
+
+def _encode_stats(stats):
+    return (stats["stock"],) + tuple(NO_PRICE if stats[field] is None else stats[field] for field in STAT_FIELDS[1:])
+
+def _decode_stats(values):
+    stock, *prices = values
+    return dict(zip(STAT_FIELDS, [stock] + [None if price == NO_PRICE else price for price in prices]))
+
+def _parse_time(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+class StockHistory:
+    """
+    Append-only binary history of the per-variant stock and prices (from the stock
+    cube). Each run appends one frame: a full snapshot every SNAPSHOT_EVERY frames,
+    otherwise only the variants whose stock or min/median/max price changed (removed
+    variants are stored with stock -1). Variants get a stable numeric id in the order
+    they first appear; frames only carry ids, sorted, plus the labels of new variants.
+
+    Frame = header (marker, type, unix time, payload length) + JSON meta + 5 column
+    arrays (ids, stock, min, median, max prices in cents). A side file keeps the frame
+    offsets and variant labels; the latest state is replayed from the last snapshot
+    only when it is needed.
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.variants = []      # id -> variant tuple
+        self.variant_ids = {}   # variant tuple -> id
+        self.frame_index = []   # (timestamp, frame type, payload offset, payload length, label)
+        self._state = None      # latest encoded stats per variant id, replayed on first use
+        self.valid_end = None   # end of the last complete frame
+        if os.path.exists(path):
+            self._open()
+
+    # --- Frame index ---
+    def _open(self):
+        """
+        Loads the frame index kept next to the history instead of decoding every frame.
+        Frames past the indexed end (written by a run that had no index, or an index
+        that is missing or does not match the file) are scanned and indexed again.
+        """
+        if not self._load_index():
+            self.variants, self.variant_ids, self.frame_index = [], {}, []
+            self.valid_end = len(HISTORY_MAGIC)
+        if os.path.getsize(self.path) > self.valid_end and self._scan(self.valid_end):
+            self._save_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return False
+                index = json.loads(f.read().decode("utf-8"))
+            frames = [tuple(frame) for frame in index["frames"]]
+            if index["valid_end"] > os.path.getsize(self.path) or not self._frame_matches(frames[-1] if frames else None):
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        self.frame_index = frames
+        self.valid_end = index["valid_end"]
+        self._register_variants(index["variants"])
+        return True
+
+    def _frame_matches(self, frame):
+        """Whether the history still holds this frame where the index says (the file was not replaced)."""
+        with open(self.path, "rb") as f:
+            if f.read(len(HISTORY_MAGIC)) != HISTORY_MAGIC:
+                return False
+            if frame is None:
+                return True
+            timestamp, frame_type, offset, length, _ = frame
+            f.seek(offset - FRAME_HEADER.size)
+            return FRAME_HEADER.unpack(f.read(FRAME_HEADER.size)) == (FRAME_MARKER, frame_type, timestamp, length)
+
+    def _save_index(self):
+        index = json.dumps({
+            "valid_end": self.valid_end,
+            "variants": [list(variant) for variant in self.variants],
+            "frames": self.frame_index,
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(index)
+        os.replace(tmp_path, self.index_path)
+
+    # --- Reading ---
+    def _read_frames(self, f, start):
+        if start <= len(HISTORY_MAGIC):
+            if f.read(len(HISTORY_MAGIC)) != HISTORY_MAGIC:
+                raise ValueError(f"'{self.path}' no es un historial de stock válido.")
+        else:
+            f.seek(start)
+        while True:
+            offset = f.tell()
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            marker, frame_type, timestamp, length = FRAME_HEADER.unpack(header)
+            if marker != FRAME_MARKER:
+                raise ValueError(f"Historial corrupto en el byte {offset}.")
+            payload_offset = f.tell()
+            payload = f.read(length)
+            if len(payload) < length:
+                # A run that died mid-append: ignore the partial frame (append() cuts it off)
+                return
+            self.valid_end = f.tell()
+            yield frame_type, timestamp, payload_offset, length, payload
+
+    @staticmethod
+    def _decode_meta(payload):
+        (meta_len,) = struct.unpack_from("<I", payload, 0)
+        return json.loads(payload[4:4 + meta_len].decode("utf-8")), 4 + meta_len
+
+    @classmethod
+    def _decode_payload(cls, payload):
+        meta, position = cls._decode_meta(payload)
+        (count,) = struct.unpack_from("<I", payload, position)
+        position += 4
+        columns = []
+        for typecode in COLUMN_TYPECODES:
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(payload[position:position + size])
+            position += size
+            columns.append(column)
+        return meta, columns
+
+    @classmethod
+    def _lookup(cls, payload, variant_id):
+        """The encoded stats of one variant in a frame, or None if the frame does not carry it."""
+        _, position = cls._decode_meta(payload)
+        (count,) = struct.unpack_from("<I", payload, position)
+        position += 4
+        view = memoryview(payload)
+        ids = view[position:position + array(COLUMN_TYPECODES[0]).itemsize * count].cast(COLUMN_TYPECODES[0])
+        i = bisect.bisect_left(ids, variant_id)
+        if i == count or ids[i] != variant_id:
+            return None
+        values, position = [], position + ids.nbytes
+        for typecode in COLUMN_TYPECODES[1:]:
+            itemsize = array(typecode).itemsize
+            values.append(view[position + i * itemsize:position + (i + 1) * itemsize].cast(typecode)[0])
+            position += itemsize * count
+        return tuple(values)
+
+    def _scan(self, start):
+        """Indexes the frames from start on, decoding only their meta. Returns how many were found."""
+        found = 0
+        with open(self.path, "rb") as f:
+            for frame_type, timestamp, offset, length, payload in self._read_frames(f, start):
+                meta, _ = self._decode_meta(payload)
+                self._register_variants(meta.get("new_variants", []))
+                self.frame_index.append((timestamp, frame_type, offset, length, meta.get("label")))
+                found += 1
+        return found
+
+    def _register_variants(self, labels):
+        for label in labels:
+            variant = tuple(label)
+            self.variant_ids[variant] = len(self.variants)
+            self.variants.append(variant)
+
+    def _payload(self, offset, length, f):
+        f.seek(offset)
+        return f.read(length)
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = self._replay(len(self.frame_index) - 1)
+        return self._state
+
+    def _replay(self, last):
+        """Encoded stats per variant id after frame `last`, replaying from the closest snapshot before it."""
+        if last < 0:
+            return {}
+        first = last
+        while first > 0 and self.frame_index[first][1] != FRAME_SNAPSHOT:
+            first -= 1
+        state = {}
+        with open(self.path, "rb") as f:
+            for _, frame_type, offset, length, _ in self.frame_index[first:last + 1]:
+                _, (ids, *stats) = self._decode_payload(self._payload(offset, length, f))
+                if frame_type == FRAME_SNAPSHOT:
+                    state = {}
+                for i, variant_id in enumerate(ids):
+                    values = tuple(column[i] for column in stats)
+                    if values[0] == REMOVED:
+                        state.pop(variant_id, None)
+                    else:
+                        state[variant_id] = values
+        return state
+
+    def state_at(self, when=None):
+        """
+        Reconstructs {variant tuple: stats} as of the last frame at or before `when`
+        (unix time or ISO string; None = latest) by replaying from the closest snapshot.
+        """
+        when = _parse_time(when)
+        if when is None:
+            state = self.state
+        else:
+            state = self._replay(bisect.bisect_right([frame[0] for frame in self.frame_index], when) - 1)
+        return {self.variants[i]: _decode_stats(values) for i, values in state.items()}
+
+    def summary_at(self, when=None):
+        """The stock_summary.json list as it was at that moment."""
+        summary = []
+        for variant, stats in self.state_at(when).items():
+            entry = dict(zip(VARIANT_FIELDS, variant))
+            entry["stock"] = stats["stock"]
+            summary.append(entry)
+        return summary
+
+    def series(self, variant):
+        """[(timestamp, stats or None if absent)] for every frame where the variant changed."""
+        variant_id = self.variant_ids.get(tuple(variant))
+        if variant_id is None:
+            return []
+        points = []
+        with open(self.path, "rb") as f:
+            for timestamp, frame_type, offset, length, _ in self.frame_index:
+                values = self._lookup(self._payload(offset, length, f), variant_id)
+                if values is not None:
+                    point = None if values[0] == REMOVED else _decode_stats(values)
+                elif frame_type == FRAME_SNAPSHOT:
+                    point = None
+                else:
+                    continue
+                if not points or points[-1][1] != point:
+                    points.append((timestamp, point))
+        return points
+
+    def find_variants(self, model):
+        model = model.strip().lower()
+        return [variant for variant in self.variants if variant[0].strip().lower() == model]
+
+    # --- Writing ---
+    def append(self, rollup, timestamp=None, label=None, force_snapshot=False):
+        """
+        Appends one frame from a {(variant,): stats} roll-up (StockCube.rollup("variant"))
+        or a {variant: stats} dict. Returns the number of variants written.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        current, new_variants = {}, []
+        for key, stats in rollup.items():
+            variant = key[0] if len(key) == 1 and isinstance(key[0], tuple) else tuple(key)
+            variant_id = self.variant_ids.get(variant)
+            if variant_id is None:
+                variant_id = len(self.variants)
+                self.variant_ids[variant] = variant_id
+                self.variants.append(variant)
+                new_variants.append(list(variant))
+            current[variant_id] = _encode_stats(stats)
+
+        snapshot = force_snapshot or len(self.frame_index) % SNAPSHOT_EVERY == 0
+        if snapshot:
+            changes = current
+        else:
+            changes = {variant_id: values for variant_id, values in current.items() if self.state.get(variant_id) != values}
+            for variant_id in self.state:
+                if variant_id not in current:
+                    changes[variant_id] = (REMOVED, NO_PRICE, NO_PRICE, NO_PRICE)
+
+        columns = [array(typecode) for typecode in COLUMN_TYPECODES]
+        for variant_id in sorted(changes):
+            columns[0].append(variant_id)
+            for column, value in zip(columns[1:], changes[variant_id]):
+                column.append(value)
+
+        meta = json.dumps({"label": label, "new_variants": new_variants}, ensure_ascii=False).encode("utf-8")
+        payload = b"".join([struct.pack("<I", len(meta)), meta, struct.pack("<I", len(columns[0]))]
+                           + [column.tobytes() for column in columns])
+        frame_type = FRAME_SNAPSHOT if snapshot else FRAME_DELTA
+
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "ab") as f:
+            if new_file:
+                f.write(HISTORY_MAGIC)
+            elif self.valid_end is not None and f.tell() > self.valid_end:
+                f.truncate(self.valid_end)
+                f.seek(self.valid_end)
+            f.write(FRAME_HEADER.pack(FRAME_MARKER, frame_type, timestamp, len(payload)))
+            offset = f.tell()
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.frame_index.append((timestamp, frame_type, offset, len(payload), label))
+        self.valid_end = offset + len(payload)
+        self._state = current
+        self._save_index()
+        return len(columns[0])
+
+def record_cube(cube, path=HISTORY_FILE, timestamp=None, label=None):
+    """Appends the per-variant roll-up of a stock cube to the history. Returns (variants written, frame type)."""
+    history = StockHistory(path)
+    written = history.append(cube.rollup("variant"), timestamp=timestamp, label=label)
+    return written, history.frame_index[-1][1]
+
+# === CLI ===
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+def _format_price(cents):
+    return "-" if cents is None else f"${cents / 100:,.2f}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Historial de stock y precios por variante")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    record = sub.add_parser("record", help="Agregar el cubo actual al historial")
+    record.add_argument("--cube", default=CUBE_FILE)
+    record.add_argument("--label")
+    sub.add_parser("stats", help="Resumen del historial")
+    at = sub.add_parser("at", help="Reconstruir el resumen en un momento (ISO, p. ej. 2025-06-01T10:00)")
+    at.add_argument("when")
+    at.add_argument("--output", help="Guardar como JSON con el formato de stock_summary.json")
+    series = sub.add_parser("series", help="Serie de stock y precios de las variantes de un modelo")
+    series.add_argument("model")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        written, frame_type = record_cube(StockCube.load(args.cube), args.history, label=args.label)
+        kind = "instantánea" if frame_type == FRAME_SNAPSHOT else "delta"
+        print(f"🗂️ Historial actualizado ({kind}): {written} variantes registradas en '{args.history}'.")
+        return
+
+    history = StockHistory(args.history)
+    if args.command == "stats":
+        snapshots = sum(1 for frame in history.frame_index if frame[1] == FRAME_SNAPSHOT)
+        size = os.path.getsize(args.history) if os.path.exists(args.history) else 0
+        print(f"🗂️ {len(history.frame_index)} ejecuciones ({snapshots} instantáneas), {len(history.variants)} variantes, {size / 1024:.1f} KB")
+        if history.frame_index:
+            print(f"   Desde {_format_time(history.frame_index[0][0])} hasta {_format_time(history.frame_index[-1][0])}")
+    elif args.command == "at":
+        summary = history.summary_at(args.when)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            print(f"📁 {len(summary)} variantes guardadas en: {args.output}")
+        else:
+            print(f"🧾 {len(summary)} variantes, stock total: {sum(v['stock'] for v in summary)}")
+    else:
+        for variant in history.find_variants(args.model):
+            print(f"📦 {' | '.join(value for value in variant if value)}")
+            for timestamp, stats in history.series(variant):
+                if stats is None:
+                    print(f"   {_format_time(timestamp)}  (sin existencias)")
+                else:
+                    print(f"   {_format_time(timestamp)}  stock {stats['stock']:>4}  "
+                          f"min {_format_price(stats['min_price'])}  mediana {_format_price(stats['median_price'])}  "
+                          f"max {_format_price(stats['max_price'])}")
+
+if __name__ == "__main__":
+    main()
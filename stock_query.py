@@ -0,0 +1,250 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import struct
+from array import array
+
+from generate_stock_summary import OUTPUT_FILE as SUMMARY_FILE, CUBE_FILE, VARIANT_FIELDS, StockCube
+from record_files import load_records
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"STKIDX02"
+HASH_BLOCK_SIZE = 1 << 20
+
+# Query field -> key in stock_summary.json ("store" comes from the stock cube)
+FIELD_TO_SUMMARY_KEY = {
+    "model": "model_original",
+    "storage": "storage",
+    "color": "color",
+    "compania": "compania",
+    "familia": "familia",
+    "caja": "caja",
+}
+INDEXED_FIELDS = tuple(FIELD_TO_SUMMARY_KEY) + ("store",)
+
+def normalize_value(value):
+    return str(value).strip().lower()
+
+def _file_fingerprint(path):
+    """[size, mtime, sha256] of a file, or None if it does not exist. The hash catches
+    rewrites that keep the size and land on the same mtime tick."""
+    try:
+        stat = os.stat(path)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+
+def default_index_path(summary_path):
+    return summary_path + INDEX_SUFFIX
+
+# === INDEX ===
+class StockIndex:
+    """
+    In-memory inverted indexes over the variants of stock_summary.json.
+
+    Each indexed field maps a normalized value to a sorted array of variant ids
+    (positions in the summary list). Filtered lookups intersect the posting
+    lists, starting from the shortest one.
+    """
+
+    def __init__(self, variants, postings, store_stock, fingerprint=None):
+        self.variants = variants
+        self.postings = postings          # field -> {normalized value -> array('I') of variant ids}
+        self.store_stock = store_stock    # (variant id, store id) -> stock in that store
+        self.fingerprint = fingerprint
+        self.sorted_models = sorted(postings["model"])
+        self._model_display = {normalize_value(v["model_original"]): v["model_original"] for v in variants}
+
+    @classmethod
+    def build(cls, variants, cube=None, fingerprint=None):
+        postings = {field: {} for field in INDEXED_FIELDS}
+        for variant_id, variant in enumerate(variants):
+            for field, summary_key in FIELD_TO_SUMMARY_KEY.items():
+                value = normalize_value(variant.get(summary_key, ""))
+                if value:
+                    postings[field].setdefault(value, array('I')).append(variant_id)
+
+        store_stock = {}
+        if cube is not None:
+            ids_by_variant = {tuple(v.get(key, "") for key in VARIANT_FIELDS): i for i, v in enumerate(variants)}
+            for (variant, store), stats in cube.rollup("variant", "store").items():
+                variant_id = ids_by_variant.get(variant)
+                if variant_id is None:
+                    continue
+                store_stock[(variant_id, store)] = stats["stock"]
+                postings["store"].setdefault(normalize_value(store), array('I')).append(variant_id)
+            for ids in postings["store"].values():
+                ids[:] = array('I', sorted(set(ids)))
+
+        return cls(variants, postings, store_stock, fingerprint)
+
+    # --- Persistence ---
+    def save(self, path):
+        """
+        Same layout as the stock cube: magic, JSON header (fingerprint, variants, posting
+        values and lengths, store stock) and then every posting list as raw array bytes.
+        Nothing in the file is executed when it is loaded.
+        """
+        postings = [(field, value, ids) for field in INDEXED_FIELDS for value, ids in self.postings[field].items()]
+        header = json.dumps({
+            "fingerprint": self.fingerprint,
+            "variants": self.variants,
+            "postings": [(field, value, len(ids)) for field, value, ids in postings],
+            "store_stock": [(variant_id, store, stock) for (variant_id, store), stock in self.store_stock.items()],
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for _, _, ids in postings:
+                f.write(ids.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError("Versión de índice incompatible.")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+            postings = {field: {} for field in INDEXED_FIELDS}
+            for field, value, length in header["postings"]:
+                ids = array('I')
+                ids.frombytes(f.read(ids.itemsize * length))
+                postings[field][value] = ids
+        store_stock = {(variant_id, store): stock for variant_id, store, stock in header["store_stock"]}
+        return cls(header["variants"], postings, store_stock, header["fingerprint"])
+
+    # --- Lookups ---
+    def _ids_for(self, field, value):
+        if field not in self.postings:
+            raise ValueError(f"Campo no indexado: {field}")
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        if len(values) == 1:
+            return self.postings[field].get(normalize_value(values[0]), array('I'))
+        ids = set()
+        for v in values:
+            ids.update(self.postings[field].get(normalize_value(v), ()))
+        return array('I', sorted(ids))
+
+    def find_ids(self, **filters):
+        """Returns the sorted variant ids matching every filter (a value or a list of accepted values)."""
+        active = [(field, value) for field, value in filters.items() if value not in (None, "", [])]
+        if not active:
+            return list(range(len(self.variants)))
+        posting_lists = sorted((self._ids_for(field, value) for field, value in active), key=len)
+        result = set(posting_lists[0])
+        for ids in posting_lists[1:]:
+            if not result:
+                break
+            result.intersection_update(ids)
+        return sorted(result)
+
+    def query(self, **filters):
+        """
+        Returns the matching variants. When a single store is given, 'stock' is the
+        stock in that store instead of the total.
+        """
+        store = filters.get("store")
+        single_store = store if isinstance(store, str) and store else None
+        results = []
+        for variant_id in self.find_ids(**filters):
+            variant = dict(self.variants[variant_id])
+            if single_store is not None:
+                variant["stock"] = self.store_stock.get((variant_id, single_store.strip()), 0)
+            results.append(variant)
+        return results
+
+    def total_stock(self, **filters):
+        return sum(variant["stock"] for variant in self.query(**filters))
+
+    def search_models_by_prefix(self, prefix, limit=20):
+        prefix = normalize_value(prefix)
+        start = bisect.bisect_left(self.sorted_models, prefix)
+        matches = []
+        for model in self.sorted_models[start:]:
+            if not model.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(self._model_display[model])
+        return matches
+
+    def search_models_fuzzy(self, text, limit=5, score_cutoff=60):
+        from thefuzz import process
+        matches = process.extract(normalize_value(text), self.sorted_models, limit=limit)
+        return [(self._model_display[model], score) for model, score in matches if score >= score_cutoff]
+
+def load_stock_index(summary_path=SUMMARY_FILE, cube_path=CUBE_FILE, index_path=None, rebuild=False):
+    """
+    Loads the persisted index next to the summary, rebuilding it when the summary
+    or the stock cube changed since it was written.
+    """
+    index_path = index_path or default_index_path(summary_path)
+    fingerprint = [_file_fingerprint(summary_path), _file_fingerprint(cube_path)]
+
+    if not rebuild and os.path.exists(index_path):
+        try:
+            index = StockIndex.load(index_path)
+            if index.fingerprint == fingerprint:
+                return index
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar el índice '{index_path}', se reconstruirá. Error: {e}")
+
+    variants = load_records(summary_path)
+    cube = None
+    if fingerprint[1] is not None:
+        cube = StockCube.load(cube_path)
+    else:
+        print(f"⚠️ No se encontró '{cube_path}'. Las consultas por sucursal no estarán disponibles.")
+
+    index = StockIndex.build(variants, cube, fingerprint)
+    index.save(index_path)
+    return index
+
+# === CLI ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta indexada sobre stock_summary.json")
+    for field in INDEXED_FIELDS:
+        parser.add_argument(f"--{field}", action="append", help=f"Filtrar por {field} (repetible)")
+    parser.add_argument("--prefix", help="Buscar modelos que empiezan con este texto")
+    parser.add_argument("--fuzzy", help="Buscar modelos parecidos a este texto")
+    parser.add_argument("--summary", default=SUMMARY_FILE)
+    parser.add_argument("--cube", default=CUBE_FILE)
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruir el índice aunque esté al día")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    index = load_stock_index(args.summary, args.cube, rebuild=args.rebuild)
+
+    if args.prefix or args.fuzzy:
+        if args.prefix:
+            models = index.search_models_by_prefix(args.prefix)
+        else:
+            models = [model for model, _ in index.search_models_fuzzy(args.fuzzy)]
+        if args.json:
+            print(json.dumps(models, ensure_ascii=False, indent=2))
+        else:
+            print(f"🔎 {len(models)} modelos encontrados:")
+            for model in models:
+                print(f"   • {model}")
+        return
+
+    filters = {field: getattr(args, field) for field in INDEXED_FIELDS}
+    filters = {field: (values[0] if len(values) == 1 else values) for field, values in filters.items() if values}
+    results = index.query(**filters)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for variant in results:
+        details = " | ".join(variant.get(key, "") for key in VARIANT_FIELDS[1:] if variant.get(key))
+        print(f"📦 {variant['model_original']} | {details} -> stock: {variant['stock']}")
+    print(f"🧾 {len(results)} variantes, stock total: {sum(v['stock'] for v in results)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,45 @@
 import gspread
-import time
+import argparse
 import json
+import logging
+import os
 import re
+import sys
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
 from oauth2client.service_account import ServiceAccountCredentials
-from thefuzz import process
+from thefuzz import process, utils as thefuzz_utils
+try:
+    from rapidfuzz import process as rapidfuzz_process, fuzz as rapidfuzz_fuzz
+except ImportError:
+    rapidfuzz_process = None
+from record_files import load_records
+from sheet_snapshot import SheetSnapshot, FIRST_DATA_ROW, col_to_letter, parse_a1_range
+from sheet_diff import cells_from_updates, coalesce_cells, diff_cells
+from sheets_client import SheetsClient, ChunkedUpdateError, batch_update_in_chunks
 
 # === CONFIGURATION ===
 SPREADSHEET_ID = '1aX1yUvj2kJFv331P9P2xgzdVwD2Miadb47wEJVMI4TQ'
 SHEET_NAME = 'Articulos publicados Reventa'
 AUX_SHEET_NAME = 'Auxiliar'
 VARIANT_SUMMARY_JSON_PATH = 'stock_summary.json'
+NORMALIZATION_CACHE_PATH = 'normalization_cache.json'
+# Parsed normalization caches by absolute path, with the file version they were read or written at
+_NORMALIZATION_CACHES = {}
+# Models marked 'Principal' at the last sync; the GPT color stage ranks them first
+PRINCIPAL_MODELS_PATH = 'principal_models.json'
+DEFAULT_TARGET_NAME = 'principal'
+SYNC_TARGETS_EXAMPLE_PATH = 'sync_targets.example.json'
+NORMALIZATION_SCORE_THRESHOLD = 85
+
+logger = logging.getLogger(__name__)
 
 # === AUTHENTICATION & DATA LOADING ===
+class AuthenticationError(Exception):
+    """The Google Sheets credentials could not be loaded or authorized."""
+
 def authenticate_gspread():
     try:
         scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
@@ -22,7 +49,7 @@ def authenticate_gspread():
         return client
     except Exception as e:
         print(f"❌ Falló la autenticación: {e}")
-        exit()
+        raise AuthenticationError(str(e)) from e
 
 def load_sheet_data(client, spreadsheet_id, sheet_name):
     try:
@@ -38,8 +65,7 @@ def load_sheet_data(client, spreadsheet_id, sheet_name):
 
 def load_local_variant_summary(json_path):
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_records(json_path)
     except Exception as e:
         print(f"❌ Falló la carga del archivo de resumen de variantes JSON: {e}")
         exit()
@@ -53,25 +79,35 @@ def find_column_index(headers, column_title):
             return i
     raise ValueError(f"No se pudo encontrar la columna: {column_title}")
 
-def col_to_letter(col_idx):
-    letter = ''
-    temp_idx = col_idx
-    while temp_idx >= 0:
-        temp_idx, remainder = divmod(temp_idx, 26)
-        letter = chr(65 + remainder) + letter
-        temp_idx -= 1
-    return letter
+# Columns the sync reads; the rest of the sheet is only written (new rows, formatting)
+PROJECTED_COLUMN_TITLES = ("Modelo", "Familia", "Variante Primaria", "Variante Secundaria", "Variante Terciaria",
+                           "Color", "¿Principal o Extra?", "Inventario Partner")
+
+def projected_columns(headers):
+    """Indices of PROJECTED_COLUMN_TITLES in the header row; missing ones are reported later by find_column_index."""
+    columns = []
+    for title in PROJECTED_COLUMN_TITLES:
+        try:
+            columns.append(find_column_index(headers, title))
+        except ValueError:
+            continue
+    return columns
+
+def write_value_updates(snapshot, updates, **kwargs):
+    """Sends value updates in size-bounded chunks and records in the snapshot the ones that reached the sheet."""
+    try:
+        batch_update_in_chunks(snapshot.sheet, updates, **kwargs)
+    except ChunkedUpdateError as e:
+        snapshot.apply_value_updates(e.applied)
+        raise
+    snapshot.apply_value_updates(updates)
 
 # === CLEANUP, AUX & FORMATTING FUNCTIONS ===
-def clean_column_brackets(sheet, column_index):
+def clean_column_brackets(snapshot, column_index):
     col_letter = col_to_letter(column_index)
     print(f"🧼 Limpiando datos antiguos con corchetes en la columna {col_letter}...")
     updates_to_clean = []
-    try:
-        col_values = sheet.col_values(column_index + 1)
-    except gspread.exceptions.APIError as e:
-        print(f"⚠️ No se pudo leer la columna para limpiar. Es posible que no exista. Error: {e}")
-        return
+    col_values = snapshot.col_values(column_index)
 
     for i, value in enumerate(col_values):
         if i < 2: continue
@@ -81,11 +117,21 @@ def clean_column_brackets(sheet, column_index):
     
     if updates_to_clean:
         print(f"-> Se encontraron {len(updates_to_clean)} celdas para limpiar. Actualizando...")
-        sheet.batch_update(updates_to_clean, value_input_option='USER_ENTERED')
+        write_value_updates(snapshot, updates_to_clean, value_input_option='USER_ENTERED')
         print("✅ Datos antiguos limpiados.")
     else:
         print("-> No se encontraron datos con corchetes para limpiar.")
 
+def bracketless_rows(rows, column_index):
+    """Copy of the rows with the brackets removed from one column, as clean_column_brackets would leave them."""
+    cleaned = []
+    for row in rows:
+        if column_index < len(row) and ('[' in row[column_index] or ']' in row[column_index]):
+            row = list(row)
+            row[column_index] = row[column_index].replace('[', '').replace(']', '')
+        cleaned.append(row)
+    return cleaned
+
 def update_aux_sheet(spreadsheet, aux_sheet_name, local_variant_summary):
     print(f"📋 Actualizando la hoja '{aux_sheet_name}' con opciones de variantes...")
     vp_options, vs_options, vt_options = set(), set(), set()
@@ -98,9 +144,10 @@ def update_aux_sheet(spreadsheet, aux_sheet_name, local_variant_summary):
         elif "CONSOLAS" in familia:
             vp_options.add(variant.get("storage", ""))
             vs_options.add(variant.get("caja", ""))
+    current_values = []
     try:
         aux_sheet = spreadsheet.worksheet(aux_sheet_name)
-        aux_sheet.batch_clear(['E:G'])
+        current_values = aux_sheet.get('E1:G')
     except gspread.exceptions.WorksheetNotFound:
         aux_sheet = spreadsheet.add_worksheet(title=aux_sheet_name, rows=100, cols=26)
     
@@ -110,237 +157,411 @@ def update_aux_sheet(spreadsheet, aux_sheet_name, local_variant_summary):
     vt_list = sorted([opt for opt in vt_options if opt])
     max_len = max(len(vp_list), len(vs_list), len(vt_list))
     data_to_write = [headers] + list(zip(vp_list + [''] * (max_len - len(vp_list)), vs_list + [''] * (max_len - len(vs_list)), vt_list + [''] * (max_len - len(vt_list))))
-    aux_sheet.update(values=data_to_write, range_name='E1', value_input_option='USER_ENTERED')
+
+    # Intended E:G grid, blanking whatever is left below the new options
+    first_col = 4  # column E
+    intended_cells = {}
+    for row_number in range(1, max(len(data_to_write), len(current_values)) + 1):
+        row_values = data_to_write[row_number - 1] if row_number <= len(data_to_write) else ('', '', '')
+        for offset, value in enumerate(row_values):
+            intended_cells[(row_number, first_col + offset)] = value
+
+    def current_value(row_number, col_idx):
+        if row_number > len(current_values):
+            return ''
+        row = current_values[row_number - 1]
+        offset = col_idx - first_col
+        return row[offset] if offset < len(row) else ''
+
+    aux_updates, changed_cells, avoided_writes = diff_cells(intended_cells, current_value)
+    if aux_updates:
+        batch_update_in_chunks(aux_sheet, aux_updates, value_input_option='USER_ENTERED')
+    print(f"-> {changed_cells} celdas de opciones cambian; {avoided_writes} escrituras evitadas.")
     print(f"✅ Hoja '{aux_sheet_name}' actualizada.")
     return vp_options, vs_options, vt_options
 
-def normalize_variant_columns(sheet, rows, indices, vp_options, vs_options, vt_options):
-    print("🧼 Normalizando columnas de variantes...")
-    updates_to_normalize = []
-    
-    vp_options_list = list(vp_options)
-    vs_options_list = list(vs_options)
-    vt_options_list = list(vt_options)
+def _options_fingerprint(options):
+    return hashlib.sha1("\x1f".join(sorted(options)).encode("utf-8")).hexdigest()
 
-    for i, row in enumerate(rows, start=3):
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def load_normalization_cache(path=NORMALIZATION_CACHE_PATH):
+    """
+    The cached option matches of path. The parsed cache stays in memory while the
+    process is up (daemon mode) and is read again only when the file changed on disk.
+    """
+    version = _file_version(path)
+    warm = _NORMALIZATION_CACHES.get(os.path.abspath(path))
+    if warm and version is not None and warm[0] == version:
+        return warm[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    _NORMALIZATION_CACHES[os.path.abspath(path)] = (version, cache)
+    return cache
+
+def save_normalization_cache(cache, path=NORMALIZATION_CACHE_PATH):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        _NORMALIZATION_CACHES[os.path.abspath(path)] = (_file_version(path), cache)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar la caché de normalización: {e}")
+
+def _thefuzz_processor(text):
+    # What thefuzz's extractOne applies to both sides with its default processor and WRatio
+    return thefuzz_utils.full_process(text, force_ascii=True)
+
+def match_values_to_options(values, options_list):
+    """
+    Returns {value: (best_option, score)} scoring every value against every option in one
+    batch. Matches and integer scores are the ones thefuzz's extractOne gives, so the
+    threshold decides the same way on both paths.
+    """
+    if not values or not options_list:
+        return {}
+    if rapidfuzz_process is not None:
         try:
-            # Normalize Variante Primaria
-            vp_val = row[indices["vp"]].strip()
-            if vp_val and vp_val not in vp_options:
-                best_match, score = process.extractOne(vp_val, vp_options_list)
-                if score > 85:
-                    updates_to_normalize.append({
-                        'range': f'{col_to_letter(indices["vp"])}{i}',
-                        'values': [[best_match]]
-                    })
-                    print(f"  -> Corrigiendo VP en fila {i}: '{vp_val}' -> '{best_match}'")
-
-            # Normalize Variante Secundaria
-            vs_val = row[indices["vs"]].strip()
-            if vs_val and vs_val not in vs_options:
-                best_match, score = process.extractOne(vs_val, vs_options_list)
-                if score > 85:
-                    updates_to_normalize.append({
-                        'range': f'{col_to_letter(indices["vs"])}{i}',
-                        'values': [[best_match]]
-                    })
-                    print(f"  -> Corrigiendo VS en fila {i}: '{vs_val}' -> '{best_match}'")
-
-            # Normalize Variante Terciaria
-            vt_val = row[indices["vt"]].strip()
-            if vt_val and vt_val not in vt_options:
-                best_match, score = process.extractOne(vt_val, vt_options_list)
-                if score > 85:
-                    updates_to_normalize.append({
-                        'range': f'{col_to_letter(indices["vt"])}{i}',
-                        'values': [[best_match]]
-                    })
-                    print(f"  -> Corrigiendo VT en fila {i}: '{vt_val}' -> '{best_match}'")
-        except IndexError:
+            queries = [thefuzz_utils.full_process(value) for value in values]
+            scores = rapidfuzz_process.cdist(queries, options_list, scorer=rapidfuzz_fuzz.WRatio, processor=_thefuzz_processor)
+        except ImportError:
+            scores = None  # cdist needs numpy; fall back to one extractOne per distinct value
+        if scores is not None:
+            matches = {}
+            for value, row_scores in zip(values, scores):
+                # First best option on the unrounded score, rounded afterwards (as extractOne does)
+                best_index = max(range(len(options_list)), key=lambda j: row_scores[j])
+                matches[value] = (options_list[best_index], int(round(float(row_scores[best_index]))))
+            return matches
+    return {value: process.extractOne(value, options_list) for value in values}
+
+def normalize_variant_columns(snapshot, indices, vp_options, vs_options, vt_options, cache_path=NORMALIZATION_CACHE_PATH):
+    print("🧼 Normalizando columnas de variantes...")
+    rows = snapshot.rows
+    cache = load_normalization_cache(cache_path)
+    cells_to_normalize = {}
+
+    for column_key, options in (("vp", vp_options), ("vs", vs_options), ("vt", vt_options)):
+        col_idx = indices[column_key]
+        options_list = sorted(opt for opt in options if opt)
+
+        # Distinct non-conforming values and the rows where they appear
+        rows_by_value = defaultdict(list)
+        for i, row in enumerate(rows, start=FIRST_DATA_ROW):
+            if col_idx >= len(row):
+                continue
+            value = row[col_idx].strip()
+            if value and value not in options:
+                rows_by_value[value].append(i)
+        if not rows_by_value:
             continue
 
-    if updates_to_normalize:
-        print(f"-> Se encontraron {len(updates_to_normalize)} celdas para normalizar. Actualizando...")
-        sheet.batch_update(updates_to_normalize, value_input_option='USER_ENTERED')
+        # Matches are only reusable while the option list stays the same
+        fingerprint = _options_fingerprint(options_list)
+        column_cache = cache.get(column_key)
+        if not column_cache or column_cache.get("options") != fingerprint:
+            column_cache = cache[column_key] = {"options": fingerprint, "matches": {}}
+        known_matches = column_cache["matches"]
+
+        unseen_values = [value for value in rows_by_value if value not in known_matches]
+        for value, (best_match, score) in match_values_to_options(unseen_values, options_list).items():
+            known_matches[value] = best_match if score > NORMALIZATION_SCORE_THRESHOLD else None
+        print(f"  -> {column_key.upper()}: {len(rows_by_value)} valores distintos fuera de catálogo, {len(unseen_values)} evaluados (resto desde caché).")
+
+        for value, row_numbers in rows_by_value.items():
+            best_match = known_matches.get(value)
+            if best_match is None:
+                continue
+            for row_number in row_numbers:
+                cells_to_normalize[(row_number, col_idx)] = best_match
+            logger.debug(f"  -> Corrigiendo {column_key.upper()} '{value}' -> '{best_match}' en {len(row_numbers)} filas")
+
+    save_normalization_cache(cache, cache_path)
+
+    if cells_to_normalize:
+        # Adjacent cells of the same column go out as one range, all columns in one request
+        updates_to_normalize = coalesce_cells(cells_to_normalize)
+        print(f"-> Se encontraron {len(cells_to_normalize)} celdas para normalizar ({len(updates_to_normalize)} rangos). Actualizando...")
+        # Keep the local copy in line with the sheet instead of downloading it again
+        write_value_updates(snapshot, updates_to_normalize, value_input_option='USER_ENTERED')
         print("✅ Normalización completada.")
-        # Re-read the data from the sheet to have the normalized values
-        time.sleep(2) # Give a moment for the updates to propagate
-        return sheet.get_all_values()[2:]
     else:
         print("-> No se encontraron valores para normalizar.")
-        return rows
-
-def apply_data_validation_rule(spreadsheet, sheet, column_index, end_row, rule_dict, column_name):
-    print(f"🎨 Aplicando regla de validación a la columna '{column_name}'...")
-    try:
-        request = {"setDataValidation": {"range": {"sheetId": sheet.id, "startRowIndex": 2, "endRowIndex": end_row, "startColumnIndex": column_index, "endColumnIndex": column_index + 1}, "rule": rule_dict}}
-        spreadsheet.batch_update({"requests": [request]})
-        print(f"✅ Regla de validación aplicada a '{column_name}'.")
-    except Exception as e:
-        print(f"⚠️ No se pudo aplicar la regla de validación a '{column_name}'. Error: {e}")
-
-def apply_chip_style_from_template(spreadsheet, sheet, column_index, end_row, template_cell_a1, column_name):
-    """Copies the data validation from a template cell to a whole column."""
-    print(f"🎨 Aplicando estilo de validación 'chip' a la columna '{column_name}' desde la plantilla '{template_cell_a1}'...")
-    try:
-        match = re.match(r"([A-Z]+)([0-9]+)", template_cell_a1.upper())
-        if not match:
-            raise ValueError(f"Formato de celda de plantilla no válido: {template_cell_a1}")
-        
-        col_str, row_str = match.groups()
-        
-        col_idx = 0
-        for char in col_str:
-            col_idx = col_idx * 26 + (ord(char) - ord('A') + 1)
-        col_idx = col_idx - 1
-
-        row_idx = int(row_str) - 1
-
-        source_range = {
-            "sheetId": sheet.id,
-            "startRowIndex": row_idx,
-            "endRowIndex": row_idx + 1,
-            "startColumnIndex": col_idx,
-            "endColumnIndex": col_idx + 1,
-        }
-        
-        destination_range = {
-            "sheetId": sheet.id,
-            "startRowIndex": 2,
-            "endRowIndex": end_row,
-            "startColumnIndex": column_index,
-            "endColumnIndex": column_index + 1,
-        }
-
+    return snapshot.rows
+
+def _strip_defaults(value):
+    """Drops empty/false entries so a rule we send compares equal to the one the API echoes back."""
+    if isinstance(value, dict):
+        return {k: _strip_defaults(v) for k, v in value.items() if v not in (None, False, "", [], {})}
+    if isinstance(value, list):
+        return [_strip_defaults(v) for v in value]
+    return value
+
+def _is_subset(expected, actual):
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(_is_subset(v, actual.get(k)) for k, v in expected.items())
+    return expected == actual
+
+class FormattingRequestBuilder:
+    """
+    Collects the setDataValidation, copyPaste and repeatCell requests applied after
+    a sync and sends them as a single spreadsheet batchUpdate. Requests whose rule
+    or format is already present on every cell of the target range are skipped
+    (never when rows were inserted, since new rows start unformatted).
+    """
+
+    def __init__(self, spreadsheet, sheet, end_row, structure_changed=False):
+        self.spreadsheet = spreadsheet
+        self.sheet = sheet
+        self.end_row = end_row
+        self.structure_changed = structure_changed
+        self.entries = []
+
+    def _column_range(self, column_index):
+        return {"sheetId": self.sheet.id, "startRowIndex": 2, "endRowIndex": self.end_row,
+                "startColumnIndex": column_index, "endColumnIndex": column_index + 1}
+
+    def add_data_validation(self, column_index, rule_dict, column_name):
+        request = {"setDataValidation": {"range": self._column_range(column_index), "rule": rule_dict}}
+        self.entries.append({"kind": "validation", "column": column_index, "expected": rule_dict,
+                             "name": column_name, "request": request})
+
+    def add_chip_style_from_template(self, column_index, template_cell_a1, column_name):
+        """Copies the data validation from a template cell to a whole column."""
+        row_number, col_idx, _, _ = parse_a1_range(template_cell_a1)
+        source_range = {"sheetId": self.sheet.id, "startRowIndex": row_number - 1, "endRowIndex": row_number,
+                        "startColumnIndex": col_idx, "endColumnIndex": col_idx + 1}
         request = {
             "copyPaste": {
                 "source": source_range,
-                "destination": destination_range,
+                "destination": self._column_range(column_index),
                 "pasteType": "PASTE_DATA_VALIDATION",
                 "pasteOrientation": "NORMAL"
             }
         }
-        
-        spreadsheet.batch_update({"requests": [request]})
-        print(f"✅ Estilo de validación 'chip' aplicado a '{column_name}'.")
-
-    except Exception as e:
-        print(f"⚠️ No se pudo aplicar el estilo de validación 'chip' a '{column_name}'. Error: {e}")
+        self.entries.append({"kind": "template", "column": column_index, "template": (row_number - 1, col_idx),
+                             "name": column_name, "request": request})
 
-
-def apply_cell_format(spreadsheet, sheet, column_index, end_row, format_payload, column_name):
-    print(f"🎨 Aplicando formato de celda a la columna '{column_name}'...")
-    try:
+    def add_cell_format(self, column_index, format_payload, column_name):
         fields = "userEnteredFormat(" + ",".join(format_payload.keys()) + ")"
         if 'textFormat' in format_payload: fields = "userEnteredFormat(horizontalAlignment,numberFormat,textFormat.fontSize)"
-        request = {"repeatCell": {"range": {"sheetId": sheet.id, "startRowIndex": 2, "endRowIndex": end_row, "startColumnIndex": column_index, "endColumnIndex": column_index + 1}, "cell": {"userEnteredFormat": format_payload}, "fields": fields}}
-        spreadsheet.batch_update({"requests": [request]})
-        print(f"✅ Formato de celda aplicado a '{column_name}'.")
-    except Exception as e:
-        print(f"⚠️ No se pudo aplicar el formato de celda a '{column_name}'. Error: {e}")
-
-# === CORE LOGIC ===
-def map_sheet_variants(rows, headers, indices):
-    print("📊 Mapeando variantes existentes en la hoja de Google...")
-    sheet_variants = {}
-    for i, row in enumerate(rows, start=3):
-        try:
-            model = row[indices["model"]].strip()
-            familia = row[indices["familia"]].strip().upper()
-            vp = row[indices["vp"]].strip()
-            vs = row[indices["vs"]].strip()
-            vt = row[indices["vt"]].strip()
-            if not model: continue
-            
-            variant_key = None
-            if "CELULARES" in familia:
-                variant_key = f"{model.lower()}::{vp.lower()}::{vs.lower()}::{vt.lower()}"
-            elif "CONSOLAS" in familia:
-                color_from_sheet = row[indices["color_col"]].strip()
-                variant_key = f"{model.lower()}::{vp.lower()}::{vs.lower()}::{color_from_sheet.lower()}"
-
-            if variant_key: sheet_variants[variant_key] = i
-        except IndexError: 
-            continue
-    print(f"-> Se mapearon {len(sheet_variants)} variantes de la hoja de Google.")
-    return sheet_variants
-
-def insert_row_with_retry(sheet, data, index, max_retries=5, initial_backoff=1):
-    retries = 0
-    backoff = initial_backoff
-    while retries < max_retries:
-        try:
-            sheet.insert_row(data, index, value_input_option='USER_ENTERED')
-            print(f"   -> Insertada fila en la línea {index}")
-            return # Success
-        except gspread.exceptions.APIError as e:
-            if e.response.status_code == 429:
-                print(f"   -> Cuota excedida. Reintentando en {backoff} segundos...")
-                time.sleep(backoff)
-                backoff *= 2 # Exponential backoff
-                retries += 1
-            else:
-                raise # Re-raise other API errors
-    print(f"   -> Falló la inserción de la fila en la línea {index} después de {max_retries} reintentos.")
-
-def main():
-    client = authenticate_gspread()
-    spreadsheet = client.open_by_key(SPREADSHEET_ID)
-    sheet = spreadsheet.worksheet(SHEET_NAME)
-    all_values = sheet.get_all_values()
-    headers = all_values[1] if len(all_values) > 1 else []
-    
-    try:
-        indices = {
-            "model": find_column_index(headers, "Modelo"), "inventory": find_column_index(headers, "Inventario Partner"),
-            "familia": find_column_index(headers, "Familia"), "vp": find_column_index(headers, "Variante Primaria"),
-            "vs": find_column_index(headers, "Variante Secundaria"), "vt": find_column_index(headers, "Variante Terciaria"),
-            "principal_extra": find_column_index(headers, "¿Principal o Extra?"), "cert": find_column_index(headers, "¿Certificado?"),
-            "pub_exitosa": find_column_index(headers, "¿Publicación exitosa?"), "tiene_ventas": find_column_index(headers, "Tiene ventas?"),
-            "ads_primaria": find_column_index(headers, "Pagamos Ads? (primaria)"), "ads_secundaria": find_column_index(headers, "Pagamos Ads? (secundaria)"),
-            "color_col": find_column_index(headers, "Color")
-        }
-        try:
-            indices["caja"] = find_column_index(headers, "¿Caja?")
-        except ValueError:
-            print("⚠️ No se encontró la columna '¿Caja?'. Se omitirá.")
+        request = {"repeatCell": {"range": self._column_range(column_index), "cell": {"userEnteredFormat": format_payload}, "fields": fields}}
+        self.entries.append({"kind": "format", "column": column_index, "expected": format_payload,
+                             "name": column_name, "request": request})
+
+    def _fetch_cells(self, blocks):
+        """
+        Reads dataValidation and userEnteredFormat of every cell in the given
+        (first row, last row, column) blocks (0-based, inclusive) in one metadata call.
+        Returns {(row, col): cell}; cells the API leaves out are simply missing.
+        """
+        blocks = sorted(set(blocks))
+        ranges = [f"'{self.sheet.title}'!{col_to_letter(col)}{first + 1}:{col_to_letter(col)}{last + 1}"
+                  for first, last, col in blocks]
+        metadata = self.spreadsheet.fetch_sheet_metadata(params={
+            "includeGridData": "true",
+            "ranges": ranges,
+            "fields": "sheets(data(startRow,startColumn,rowData(values(dataValidation,userEnteredFormat))))",
+        })
+        found = {}
+        for sheet_data in metadata.get("sheets", []):
+            for grid in sheet_data.get("data", []):
+                start_row, col = grid.get("startRow", 0), grid.get("startColumn", 0)
+                for offset, row_data in enumerate(grid.get("rowData") or []):
+                    values = (row_data or {}).get("values") or [{}]
+                    found[(start_row + offset, col)] = values[0]
+        return found
+
+    def _already_applied(self, entry, cells):
+        column = [cells.get((row, entry["column"]), {}) for row in range(2, self.end_row)]
+        if entry["kind"] == "validation":
+            expected = _strip_defaults(entry["expected"])
+            return all(_strip_defaults(cell.get("dataValidation")) == expected for cell in column)
+        if entry["kind"] == "template":
+            expected = cells.get(entry["template"], {}).get("dataValidation")
+            return expected is not None and all(cell.get("dataValidation") == expected for cell in column)
+        return all(_is_subset(entry["expected"], cell.get("userEnteredFormat") or {}) for cell in column)
+
+    def pending_requests(self):
+        if self.structure_changed or self.end_row <= 2:
+            return self.entries
+        blocks = [(2, self.end_row - 1, e["column"]) for e in self.entries]
+        blocks += [(row, row, col) for row, col in (e["template"] for e in self.entries if e["kind"] == "template")]
         try:
-            indices["clase"] = find_column_index(headers, "Clase")
-        except ValueError:
-            print("⚠️ No se encontró la columna 'Clase'. Se omitirá.")
+            cells = self._fetch_cells(blocks)
+        except Exception as e:
+            print(f"⚠️ No se pudo leer el formato actual de la hoja, se aplicará todo. Error: {e}")
+            return self.entries
+        return [entry for entry in self.entries if not self._already_applied(entry, cells)]
+
+    def flush(self):
+        pending = self.pending_requests()
+        skipped = len(self.entries) - len(pending)
+        if not pending:
+            print(f"🎨 Formato y validaciones ya aplicados ({skipped} reglas sin cambios).")
+            return 0
+        print(f"🎨 Aplicando {len(pending)} reglas de formato/validación en una sola solicitud ({skipped} ya aplicadas)...")
         try:
-            indices["quien_publica"] = find_column_index(headers, "Quien publica?")
-        except ValueError:
-            print("⚠️ No se encontró la columna 'Quien publica?'. Se omitirá.")
-
-        inventory_col_letter = col_to_letter(indices["inventory"])
-    except ValueError as e:
-        print(f"❌ Error crítico: {e}. Revisa los nombres de las columnas en tu hoja."); exit()
+            self.spreadsheet.batch_update({"requests": [entry["request"] for entry in pending]})
+            print(f"✅ Reglas aplicadas a: {', '.join(entry['name'] for entry in pending)}.")
+        except Exception as e:
+            print(f"⚠️ No se pudieron aplicar las reglas de formato/validación. Error: {e}")
+        return len(pending)
 
-    clean_column_brackets(sheet, indices["vp"])
-    rows = sheet.get_all_values()[2:] if len(sheet.get_all_values()) > 2 else []
-
-    # --- Get all existing models from the sheet ---
-    existing_models = set(row[indices["model"]].strip().lower() for row in rows if len(row) > indices["model"] and row[indices["model"]].strip())
-    print(f"🔍 Se encontraron {len(existing_models)} modelos únicos en la hoja.")
-
-    # --- NEW: Pre-process to find models marked as 'Principal' ---
-    principal_models = set()
-    print("🔍 Identificando modelos 'Principales' en la hoja...")
-    for row in rows:
-        try:
-            if row[indices["principal_extra"]].strip().lower() == 'principal':
-                principal_models.add(row[indices["model"]].strip())
-        except IndexError:
-            continue
-    print(f"-> {len(principal_models)} modelos marcados como 'Principal' encontrados.")
-    # ---------------------------------------------------------
+# === CORE LOGIC ===
+class SheetIndex:
+    """
+    Indexed view of the sheet rows, built in a single pass: lowercased model ->
+    (first row, last row), variant key tuple -> row, and the models marked as
+    'Principal'. Row numbers are 1-based sheet rows.
+    """
+
+    def __init__(self, rows, indices, familias=None):
+        print("📊 Mapeando variantes existentes en la hoja de Google...")
+        wanted_familias = [familia.upper() for familia in familias] if familias else None
+        self.model_spans = {}
+        self.variant_rows = {}
+        self.principal_models = set()
+        self.last_row = FIRST_DATA_ROW - 1
+
+        for i, row in enumerate(rows, start=FIRST_DATA_ROW):
+            model = row[indices["model"]].strip() if len(row) > indices["model"] else ''
+            if not model:
+                continue
+            self.last_row = i
+            model_key = model.lower()
+            span = self.model_spans.get(model_key)
+            if span is None:
+                self.model_spans[model_key] = [i, i]
+            else:
+                span[1] = i
+
+            try:
+                if row[indices["principal_extra"]].strip().lower() == 'principal':
+                    self.principal_models.add(model)
+                familia = row[indices["familia"]].strip().upper()
+                # Rows of other familias belong to another target: never update nor zero them here
+                if wanted_familias and not any(wanted in familia for wanted in wanted_familias):
+                    continue
+                variant_key = sheet_variant_key(model, familia, row[indices["vp"]], row[indices["vs"]],
+                                                row[indices["vt"]], row[indices["color_col"]] if "CONSOLAS" in familia else '')
+            except IndexError:
+                continue
+            if variant_key:
+                self.variant_rows[variant_key] = i
+
+        print(f"🔍 Se encontraron {len(self.model_spans)} modelos únicos en la hoja.")
+        print(f"-> {len(self.principal_models)} modelos marcados como 'Principal' encontrados.")
+        print(f"-> Se mapearon {len(self.variant_rows)} variantes de la hoja de Google.")
+
+    def has_model(self, model):
+        return model.lower() in self.model_spans
+
+    def insertion_row(self, model):
+        """Row (in the current layout) right after the last row of the model, or after the last used row."""
+        span = self.model_spans.get(model.lower())
+        return (span[1] if span else self.last_row) + 1
+
+def sheet_variant_key(model, familia, vp, vs, vt, color=''):
+    """Key shared by sheet rows and local variants: CELULARES (model, vp, vs, vt), CONSOLAS (model, vp, vs, color)."""
+    values = (model, vp, vs, vt) if "CELULARES" in familia else (model, vp, vs, color) if "CONSOLAS" in familia else None
+    if values is None:
+        return None
+    return tuple(value.strip().lower() for value in values)
+
+def plan_bulk_insertions(insertions):
+    """
+    Groups insertions by their target row (1-based, in the sheet as it was before
+    inserting) and computes where each group ends up once every group is in place.
+    Rows sharing a target are reversed so the result matches inserting them one by
+    one, in descending order, at the same index.
+    """
+    groups = defaultdict(list)
+    for insertion in insertions:
+        groups[insertion['insert_at']].append(insertion['data'])
+
+    plan = []
+    shift = 0
+    for insert_at in sorted(groups):
+        rows_at_target = groups[insert_at][::-1]
+        plan.append({'insert_at': insert_at, 'final_row': insert_at + shift, 'rows': rows_at_target})
+        shift += len(rows_at_target)
+    return plan
+
+def insert_rows_bulk(spreadsheet, snapshot, insertions):
+    """Reserves space for all new rows in one batchUpdate and then writes their values (chunked if large)."""
+    sheet = snapshot.sheet
+    plan = plan_bulk_insertions(insertions)
+    if not plan:
+        return
 
-    local_variant_summary = load_local_variant_summary(VARIANT_SUMMARY_JSON_PATH)
-    vp_options, vs_options, vt_options = update_aux_sheet(spreadsheet, AUX_SHEET_NAME, local_variant_summary)
-    rows = normalize_variant_columns(sheet, rows, indices, vp_options, vs_options, vt_options)
+    # Bottom-up, so every startIndex still refers to the original layout when it is applied.
+    dimension_requests = [{
+        "insertDimension": {
+            "range": {"sheetId": sheet.id, "dimension": "ROWS",
+                      "startIndex": group['insert_at'] - 1, "endIndex": group['insert_at'] - 1 + len(group['rows'])},
+            "inheritFromBefore": False
+        }
+    } for group in reversed(plan)]
+    spreadsheet.batch_update({"requests": dimension_requests})
+
+    value_updates = []
+    for group in plan:
+        width = max(len(row) for row in group['rows'])
+        last_row = group['final_row'] + len(group['rows']) - 1
+        value_updates.append({'range': f"A{group['final_row']}:{col_to_letter(width - 1)}{last_row}", 'values': group['rows']})
+    # The rows exist now; record them empty and let the value write fill them in
+    for group in plan:
+        snapshot.insert_rows(group['final_row'], [[] for _ in group['rows']])
+    write_value_updates(snapshot, value_updates, value_input_option='USER_ENTERED')
+    print(f"   -> Insertadas {len(insertions)} filas en {len(plan)} bloques.")
+
+def prepare_local_variants(local_variant_summary):
+    """
+    Computes, once per run, the sheet key, new-row details and validity of every
+    local variant, so several sync targets can share the work.
+    """
+    local_variants = []
+    for variant in local_variant_summary:
+        model_original = variant.get("model_original", "")
+        familia = variant.get("familia", "").upper()
+        storage = variant.get("storage", "")
+        color = variant.get("color", "")
+        compania = variant.get("compania", "")
+        caja = variant.get("caja", "")
 
-    sheet_variants_map = map_sheet_variants(rows, headers, indices)
+        key = None
+        variant_details_for_new_row = {}
+        is_valid = False
+        if "CELULARES" in familia:
+            key = sheet_variant_key(model_original, familia, storage, color, compania)
+            variant_details_for_new_row = {"model": model_original, "familia": familia, "vp": storage, "vs": color, "vt": compania}
+            is_valid = bool(model_original and storage and color and compania)
+        elif "CONSOLAS" in familia:
+            key = sheet_variant_key(model_original, familia, storage, caja, "", color)
+            variant_details_for_new_row = {"model": model_original, "familia": familia, "vp": storage, "vs": caja, "vt": "", "color_col": color}
+            is_valid = bool(model_original and storage and caja and color)
+
+        local_variants.append({
+            "model": model_original, "familia": familia, "key": key, "details": variant_details_for_new_row,
+            "is_valid": is_valid, "stock": variant.get("stock", 0), "summary": variant,
+        })
+    return local_variants
+
+def plan_sync(sheet_index, headers, indices, local_variants, only_keys=None):
+    """
+    Works out the inventory writes, new rows and zeroed variants from the indexed sheet
+    rows. With only_keys (a set of variant keys), every other variant is left untouched.
+    """
+    inventory_col_letter = col_to_letter(indices["inventory"])
+    sheet_variants_map = sheet_index.variant_rows
     local_variants_map = {}
 
     batch_updates = []
@@ -348,52 +569,32 @@ def main():
     
     print("\n🔄 Sincronizando el resumen de stock local con la hoja de Google...")
 
-    for variant in local_variant_summary:
-        model_original = variant.get("model_original", "")
+    for local_variant in local_variants:
+        model_original = local_variant["model"]
 
         # --- 'Principal' Filter Logic ---
-        if model_original not in principal_models:
+        if model_original not in sheet_index.principal_models:
             continue
         
         # --- NEW: Check if model exists in sheet ---
-        if model_original.lower() not in existing_models:
+        if not sheet_index.has_model(model_original):
             continue
         # ------------------------------------
 
-        familia = variant.get("familia", "").upper()
-        storage = variant.get("storage", "")
-        color = variant.get("color", "")
-        compania = variant.get("compania", "")
-        caja = variant.get("caja", "")
-
-        key = None
-        variant_details_for_new_row = {}
-        if "CELULARES" in familia:
-            key = f"{model_original.lower()}::{storage.lower()}::{color.lower()}::{compania.lower()}"
-            variant_details_for_new_row = {"model": model_original, "familia": familia, "vp": storage, "vs": color, "vt": compania}
-        elif "CONSOLAS" in familia:
-            key = f"{model_original.lower()}::{storage.lower()}::{caja.lower()}::{color.lower()}"
-            variant_details_for_new_row = {"model": model_original, "familia": familia, "vp": storage, "vs": caja, "vt": "", "color_col": color}
-        
+        key = local_variant["key"]
+        variant_details_for_new_row = local_variant["details"]
         if not key: continue
+        if only_keys is not None and key not in only_keys: continue
         
-        local_variants_map[key] = variant["stock"]
+        local_variants_map[key] = local_variant["stock"]
 
         if key in sheet_variants_map:
             row_index = sheet_variants_map[key]
-            batch_updates.append({'range': f'{inventory_col_letter}{row_index}', 'values': [[variant["stock"]]]})
+            batch_updates.append({'range': f'{inventory_col_letter}{row_index}', 'values': [[local_variant["stock"]]]})
         else:
             # --- VALIDATION: Ensure essential fields are not empty ---
-            is_valid = False
-            if "CELULARES" in familia:
-                if model_original and storage and color and compania:
-                    is_valid = True
-            elif "CONSOLAS" in familia:
-                if model_original and storage and caja and color:
-                    is_valid = True
-            
-            if not is_valid:
-                print(f"⚠️ Variante de '{model_original}' omitida por tener datos incompletos.")
+            if not local_variant["is_valid"]:
+                logger.debug(f"⚠️ Variante de '{model_original}' omitida por tener datos incompletos.")
                 continue
             # ---------------------------------------------------------
 
@@ -403,7 +604,7 @@ def main():
                 if col_name in variant_details_for_new_row:
                     new_row[index] = variant_details_for_new_row[col_name]
                 elif col_name == "inventory":
-                    new_row[index] = variant["stock"]
+                    new_row[index] = local_variant["stock"]
                 elif col_name == "color_col" and "color_col" in variant_details_for_new_row:
                     new_row[index] = variant_details_for_new_row["color_col"]
             
@@ -415,83 +616,252 @@ def main():
             # ---------------------------------------------------------
 
     variants_to_zero_out = set(sheet_variants_map.keys()) - set(local_variants_map.keys())
+    if only_keys is not None:
+        variants_to_zero_out &= only_keys
     if variants_to_zero_out:
         print(f"🧹 Se encontraron {len(variants_to_zero_out)} variantes en la hoja que no existen localmente. Poniendo su stock a 0...")
         for key in variants_to_zero_out:
             row_index = sheet_variants_map[key]
             batch_updates.append({'range': f'{inventory_col_letter}{row_index}', 'values': [[0]]})
 
-    if batch_updates:
-        print(f"-> Actualizando {len(batch_updates)} filas existentes...")
-        sheet.batch_update(batch_updates)
+    return batch_updates, variants_to_insert, variants_to_zero_out
+
+# === SYNC TARGETS ===
+def default_sync_target():
+    return {"name": DEFAULT_TARGET_NAME, "spreadsheet_id": SPREADSHEET_ID, "sheet_name": SHEET_NAME, "aux_sheet_name": AUX_SHEET_NAME}
+
+def load_sync_targets(config_path):
+    """
+    Reads a JSON list of targets: {"name", "spreadsheet_id", "sheet_name"} plus optional
+    "aux_sheet_name", "familias" (e.g. ["CONSOLAS"]), "read_per_minute"/"write_per_minute"
+    and "projected_reads" (false downloads every column of the sheet).
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        targets = json.load(f)
+    for i, target in enumerate(targets):
+        for field in ("spreadsheet_id", "sheet_name"):
+            if not target.get(field):
+                raise ValueError(f"El destino #{i + 1} de '{config_path}' no tiene '{field}'.")
+        target.setdefault("name", f"{target['spreadsheet_id']}/{target['sheet_name']}")
+        target.setdefault("aux_sheet_name", AUX_SHEET_NAME)
+    return targets
+
+def filter_local_variants(local_variants, familias):
+    if not familias:
+        return local_variants
+    wanted = [familia.upper() for familia in familias]
+    return [lv for lv in local_variants if any(familia in lv["familia"] for familia in wanted)]
+
+def target_sheets_client(target, client_options=None):
+    """A paced client of the target's own: client_options (SheetsClient arguments) with the target's quotas on top."""
+    quota = {k: target[k] for k in ("read_per_minute", "write_per_minute") if k in target}
+    return SheetsClient(**{**(client_options or {}), **quota})
+
+def sync_target(raw_client, target, local_variants, sheets_client=None, only_keys=None):
+    """
+    Syncs the prepared local variants into one spreadsheet/worksheet target and returns
+    its result. With only_keys, only the rows of those variant keys are written (see
+    plan_sync): the bracket cleanup, the Auxiliar options and the variant normalization
+    are skipped, and rows still waiting for normalization are matched as they are.
+    """
+    started_at = time.monotonic()
+    if sheets_client is None:
+        sheets_client = target_sheets_client(target)
+    aux_sheet_name = target.get("aux_sheet_name", AUX_SHEET_NAME)
+    cache_path = NORMALIZATION_CACHE_PATH
+    if target.get("name", DEFAULT_TARGET_NAME) != DEFAULT_TARGET_NAME:
+        cache_path = NORMALIZATION_CACHE_PATH.replace(".json", f".{re.sub(r'[^A-Za-z0-9_-]+', '_', target['name'])}.json")
+    local_variants = filter_local_variants(local_variants, target.get("familias"))
+
+    # Every Sheets call below goes through the paced, retrying client
+    client = sheets_client.wrap(raw_client)
+    spreadsheet = client.open_by_key(target["spreadsheet_id"])
+    sheet = spreadsheet.worksheet(target["sheet_name"])
+    if target.get("projected_reads", True):
+        snapshot = SheetSnapshot(sheet, spreadsheet, select_columns=projected_columns)
+    else:
+        snapshot = SheetSnapshot(sheet)
+    headers = snapshot.headers
+    
+    try:
+        indices = {
+            "model": find_column_index(headers, "Modelo"), "inventory": find_column_index(headers, "Inventario Partner"),
+            "familia": find_column_index(headers, "Familia"), "vp": find_column_index(headers, "Variante Primaria"),
+            "vs": find_column_index(headers, "Variante Secundaria"), "vt": find_column_index(headers, "Variante Terciaria"),
+            "principal_extra": find_column_index(headers, "¿Principal o Extra?"), "cert": find_column_index(headers, "¿Certificado?"),
+            "pub_exitosa": find_column_index(headers, "¿Publicación exitosa?"), "tiene_ventas": find_column_index(headers, "Tiene ventas?"),
+            "ads_primaria": find_column_index(headers, "Pagamos Ads? (primaria)"), "ads_secundaria": find_column_index(headers, "Pagamos Ads? (secundaria)"),
+            "color_col": find_column_index(headers, "Color")
+        }
+        try:
+            indices["caja"] = find_column_index(headers, "¿Caja?")
+        except ValueError:
+            print("⚠️ No se encontró la columna '¿Caja?'. Se omitirá.")
+        try:
+            indices["clase"] = find_column_index(headers, "Clase")
+        except ValueError:
+            print("⚠️ No se encontró la columna 'Clase'. Se omitirá.")
+        try:
+            indices["quien_publica"] = find_column_index(headers, "Quien publica?")
+        except ValueError:
+            print("⚠️ No se encontró la columna 'Quien publica?'. Se omitirá.")
+    except ValueError as e:
+        print(f"❌ Error crítico: {e}. Revisa los nombres de las columnas en tu hoja.")
+        raise
+
+    if only_keys is None:
+        clean_column_brackets(snapshot, indices["vp"])
+        target_summary = [lv["summary"] for lv in local_variants]
+        vp_options, vs_options, vt_options = update_aux_sheet(spreadsheet, aux_sheet_name, target_summary)
+        rows = normalize_variant_columns(snapshot, indices, vp_options, vs_options, vt_options, cache_path=cache_path)
+    else:
+        # Targeted sync: the cleanup passes write all over the sheet, so they are left to full syncs
+        rows = bracketless_rows(snapshot.rows, indices["vp"])
+
+    sheet_index = SheetIndex(rows, indices, target.get("familias"))
+    batch_updates, variants_to_insert, variants_to_zero_out = plan_sync(sheet_index, headers, indices, local_variants, only_keys)
+
+    # Row indices above come from the local snapshot; make sure nobody moved rows meanwhile
+    if snapshot.refresh_if_changed(indices["model"]):
+        rows = snapshot.rows if only_keys is None else bracketless_rows(snapshot.rows, indices["vp"])
+        sheet_index = SheetIndex(rows, indices, target.get("familias"))
+        batch_updates, variants_to_insert, variants_to_zero_out = plan_sync(sheet_index, headers, indices, local_variants, only_keys)
+
+    # Only send the inventory cells whose value actually changes
+    inventory_updates, changed_cells, avoided_writes = diff_cells(cells_from_updates(batch_updates), snapshot.cell)
+    print(f"-> {changed_cells} celdas de inventario cambian; {avoided_writes} escrituras evitadas.")
+    if inventory_updates:
+        print(f"-> Actualizando {changed_cells} celdas en {len(inventory_updates)} rangos...")
+        write_value_updates(snapshot, inventory_updates)
     
     # --- NEW: Intelligent insertion logic ---
     if variants_to_insert:
         print(f"-> Insertando {len(variants_to_insert)} nuevas variantes de modelos existentes...")
-        # Get a fresh copy of the sheet's models column
-        all_sheet_models = sheet.col_values(indices["model"] + 1)
-        
-        insertions = []
-        for item in variants_to_insert:
-            model_to_find = item['model']
-            # Find the last row for this model
-            last_row_index = -1
-            for i in range(len(all_sheet_models) - 1, -1, -1):
-                if all_sheet_models[i].strip().lower() == model_to_find.lower():
-                    last_row_index = i + 1 # 1-based index
-                    break
-            
-            if last_row_index != -1:
-                # We insert after this row
-                insertions.append({'insert_at': last_row_index + 1, 'data': item['row_data']})
-            else:
-                # Should not happen based on the logic above, but as a fallback, append
-                insertions.append({'insert_at': len(all_sheet_models) + 1, 'data': item['row_data']})
-
-        # Sort insertions by row index in descending order to not mess up indices
-        insertions.sort(key=lambda x: x['insert_at'], reverse=True)
+        # Every target row refers to the layout before inserting; insert_rows_bulk shifts them group by group
+        insertions = [{'insert_at': sheet_index.insertion_row(item['model']), 'data': item['row_data']}
+                      for item in variants_to_insert]
 
-        for insertion in insertions:
-            insert_row_with_retry(sheet, insertion['data'], insertion['insert_at'])
-            time.sleep(1) # Keep a small delay to be respectful to the API
+        insert_rows_bulk(spreadsheet, snapshot, insertions)
     # ------------------------------------
 
     # --- Final Formatting Calls ---
-    final_row_count = len(sheet.get_all_values())
+    final_row_count = snapshot.row_count
     checkbox_rule = {"condition": {"type": "BOOLEAN"}, "strict": True, "showCustomUi": True}
-    
-    apply_data_validation_rule(spreadsheet, sheet, indices["cert"], final_row_count, checkbox_rule, "¿Certificado?")
-    apply_data_validation_rule(spreadsheet, sheet, indices["pub_exitosa"], final_row_count, checkbox_rule, "¿Publicación exitosa?")
-    apply_data_validation_rule(spreadsheet, sheet, indices["tiene_ventas"], final_row_count, checkbox_rule, "Tiene ventas?")
+    formatting = FormattingRequestBuilder(spreadsheet, sheet, final_row_count, structure_changed=bool(variants_to_insert))
+
+    formatting.add_data_validation(indices["cert"], checkbox_rule, "¿Certificado?")
+    formatting.add_data_validation(indices["pub_exitosa"], checkbox_rule, "¿Publicación exitosa?")
+    formatting.add_data_validation(indices["tiene_ventas"], checkbox_rule, "Tiene ventas?")
 
-    apply_chip_style_from_template(spreadsheet, sheet, indices["principal_extra"], final_row_count, 'L3', "¿Principal o Extra?")
-    apply_chip_style_from_template(spreadsheet, sheet, indices["ads_primaria"], final_row_count, 'Q3', "Pagamos Ads? (primaria)")
-    apply_chip_style_from_template(spreadsheet, sheet, indices["ads_secundaria"], final_row_count, 'R3', "Pagamos Ads? (secundaria)")
+    formatting.add_chip_style_from_template(indices["principal_extra"], 'L3', "¿Principal o Extra?")
+    formatting.add_chip_style_from_template(indices["ads_primaria"], 'Q3', "Pagamos Ads? (primaria)")
+    formatting.add_chip_style_from_template(indices["ads_secundaria"], 'R3', "Pagamos Ads? (secundaria)")
     if "caja" in indices:
-        apply_chip_style_from_template(spreadsheet, sheet, indices["caja"], final_row_count, 'S3', "¿Caja?")
+        formatting.add_chip_style_from_template(indices["caja"], 'S3', "¿Caja?")
     if "clase" in indices:
-        apply_chip_style_from_template(spreadsheet, sheet, indices["clase"], final_row_count, 'W3', "Clase")
+        formatting.add_chip_style_from_template(indices["clase"], 'W3', "Clase")
     if "quien_publica" in indices:
-        apply_chip_style_from_template(spreadsheet, sheet, indices["quien_publica"], final_row_count, 'X3', "Quien publica?")
+        formatting.add_chip_style_from_template(indices["quien_publica"], 'X3', "Quien publica?")
     if "familia" in indices:
-        apply_chip_style_from_template(spreadsheet, sheet, indices["familia"], final_row_count, 'AA3', "Familia")
+        formatting.add_chip_style_from_template(indices["familia"], 'AA3', "Familia")
 
-    dropdown_vp_rule = {"condition": {"type": "ONE_OF_RANGE", "values": [{"userEnteredValue": f"={AUX_SHEET_NAME}!E2:E"}]}, "strict": False}
-    dropdown_vs_rule = {"condition": {"type": "ONE_OF_RANGE", "values": [{"userEnteredValue": f"={AUX_SHEET_NAME}!F2:F"}]}, "strict": False}
-    dropdown_vt_rule = {"condition": {"type": "ONE_OF_RANGE", "values": [{"userEnteredValue": f"={AUX_SHEET_NAME}!G2:G"}]}, "strict": False}
+    dropdown_vp_rule = {"condition": {"type": "ONE_OF_RANGE", "values": [{"userEnteredValue": f"={aux_sheet_name}!E2:E"}]}, "strict": False}
+    dropdown_vs_rule = {"condition": {"type": "ONE_OF_RANGE", "values": [{"userEnteredValue": f"={aux_sheet_name}!F2:F"}]}, "strict": False}
+    dropdown_vt_rule = {"condition": {"type": "ONE_OF_RANGE", "values": [{"userEnteredValue": f"={aux_sheet_name}!G2:G"}]}, "strict": False}
     vp_cell_format = {"horizontalAlignment": "CENTER", "textFormat": {"fontSize": 10}}
 
-    apply_data_validation_rule(spreadsheet, sheet, indices["vp"], final_row_count, dropdown_vp_rule, "Variante Primaria")
-    apply_data_validation_rule(spreadsheet, sheet, indices["vs"], final_row_count, dropdown_vs_rule, "Variante Secundaria")
-    apply_data_validation_rule(spreadsheet, sheet, indices["vt"], final_row_count, dropdown_vt_rule, "Variante Terciaria")
-    apply_cell_format(spreadsheet, sheet, indices["vp"], final_row_count, vp_cell_format, "Variante Primaria (Formato)")
+    formatting.add_data_validation(indices["vp"], dropdown_vp_rule, "Variante Primaria")
+    formatting.add_data_validation(indices["vs"], dropdown_vs_rule, "Variante Secundaria")
+    formatting.add_data_validation(indices["vt"], dropdown_vt_rule, "Variante Terciaria")
+    formatting.add_cell_format(indices["vp"], vp_cell_format, "Variante Primaria (Formato)")
+    # A targeted sync that added no rows has nothing new to validate or format
+    if only_keys is None or variants_to_insert:
+        formatting.flush()
 
-    if not batch_updates and not variants_to_insert and not variants_to_zero_out:
+    if not inventory_updates and not variants_to_insert:
         print("\n🤷 No se necesitaron cambios. La hoja ya está sincronizada.")
     else:
         print("\n✅ Sincronización completada.")
+    sheets_client.report()
 
+    return {
+        "name": target.get("name", DEFAULT_TARGET_NAME), "status": "ok",
+        "updated_cells": changed_cells, "avoided_writes": avoided_writes, "inserted_rows": len(variants_to_insert),
+        "zeroed_variants": len(variants_to_zero_out), "api_calls": sum(sheets_client.call_counts.values()),
+        "seconds": round(time.monotonic() - started_at, 2), "principal_models": sorted(sheet_index.principal_models),
+    }
 
+def _run_target(raw_client, target, local_variants, sheets_client, only_keys=None):
+    try:
+        return sync_target(raw_client, target, local_variants, sheets_client, only_keys)
+    except Exception as e:
+        return {"name": target.get("name", DEFAULT_TARGET_NAME), "status": "error", "error": str(e)}
+
+def print_target_results(results):
+    print("\n📋 Resultado por destino:")
+    for result in results:
+        if result["status"] == "ok":
+            print(f"   • {result['name']}: {result['updated_cells']} celdas actualizadas, {result['inserted_rows']} filas insertadas, "
+                  f"{result['avoided_writes']} escrituras evitadas, {result['api_calls']} llamadas, {result['seconds']} s")
+        else:
+            print(f"   • {result['name']}: ❌ {result['error']}")
+
+def save_principal_models(results, path=PRINCIPAL_MODELS_PATH):
+    """Saves the 'Principal' models of every synced target (only when at least one target succeeded)."""
+    models = set()
+    for result in results:
+        models.update(result.get("principal_models", []))
+    if not models:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(sorted(models), f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def main(client=None, sheets_client=None, config_path=None, max_workers=None, projected_reads=True, only_keys=None,
+         client_options=None):
+    """
+    Syncs stock_summary.json into the default sheet or, with config_path, into every
+    configured target concurrently. The summary is parsed and keyed only once; every
+    target gets a paced client of its own (see target_sheets_client), so quotas and
+    retries are per target. sheets_client, if given, is used for a single target only.
+    only_keys restricts the writes to those variant keys (see sheet_variant_key).
+    """
+    raw_client = client or authenticate_gspread()
+    local_variant_summary = load_local_variant_summary(VARIANT_SUMMARY_JSON_PATH)
+    local_variants = prepare_local_variants(local_variant_summary)
+    targets = load_sync_targets(config_path) if config_path else [default_sync_target()]
+    if not projected_reads:
+        for target in targets:
+            target["projected_reads"] = False
+
+    if len(targets) == 1:
+        sheets_client = sheets_client or target_sheets_client(targets[0], client_options)
+        results = [_run_target(raw_client, targets[0], local_variants, sheets_client, only_keys)]
+    else:
+        if sheets_client is not None:
+            print("⚠️ Con varios destinos cada uno usa su propio cliente y su cuota; se ignora el cliente compartido.")
+        print(f"🚀 Sincronizando {len(targets)} destinos en paralelo...")
+        with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+            futures = [executor.submit(_run_target, raw_client, target, local_variants,
+                                       target_sheets_client(target, client_options), only_keys)
+                       for target in targets]
+            results = [future.result() for future in futures]
+
+    save_principal_models(results)
+    if config_path or any(result["status"] != "ok" for result in results):
+        print_target_results(results)
+    return results
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sincroniza stock_summary.json con Google Sheets")
+    parser.add_argument("--config", help=f"JSON con los destinos a sincronizar (ver {SYNC_TARGETS_EXAMPLE_PATH})")
+    parser.add_argument("--workers", type=int, help="Máximo de destinos sincronizados a la vez")
+    parser.add_argument("--full-read", action="store_true", help="Descargar todas las columnas de la hoja (sin lectura proyectada)")
+    args = parser.parse_args()
+    try:
+        results = main(config_path=args.config, max_workers=args.workers, projected_reads=not args.full_read)
+    except AuthenticationError:
+        sys.exit(1)
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
\ No newline at end of file
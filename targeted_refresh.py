@@ -0,0 +1,225 @@
+"""
+Targeted refresh of a few stores (ID Sucursal) and/or models, end to end: scrapes only
+those stores, enriches only their products, patches products_with_color_merged.json,
+the stock cube and stock_summary.json in place, and syncs only the sheet rows of the
+variants whose stock changed. Everything outside the scope is left as it was.
+
+Usage:
+    python targeted_refresh.py --stores 154 155 [--models "CPH2599-MEM:256GB" ...] [--gpt] [--no-sync]
+"""
+import argparse
+import os
+import sys
+import time
+
+import scraper_all_products as scraper
+from add_color_from_description import enriquecer_producto
+from generate_stock_summary import (CUBE_DIMENSIONS, CUBE_FILE, OUTPUT_FILE as SUMMARY_FILE, VARIANT_FIELDS, StockCube,
+                                    build_stock_cube, patch_variant_summary)
+from merge_color_updates import OUTPUT_FILE as MERGED_FILE
+from pipeline import PipelineBusy, pipeline_lock
+from record_files import RecordWriter, detect_format, load_records, read_records, write_records
+
+class ScrapeFailed(Exception):
+    """No store/category pair of the scope could be downloaded and reconciled."""
+
+class RefreshScope:
+    """
+    Stores (ID Sucursal) and models to refresh, within the categories that get scraped;
+    no stores or no models means all of them. Products of other categories are never
+    in the scope, since the refresh would not download them again, and neither are the
+    store/category pairs excluded after a failed download.
+    """
+
+    def __init__(self, stores=None, models=None, categories=None):
+        self.stores = {str(store).strip() for store in stores or []}
+        self.models = {model.strip().upper() for model in models or []}
+        self.categories = list(categories or scraper.CATEGORIES)
+        self._category_keys = {category.strip().upper() for category in self.categories}
+        self.excluded = set()  # (store id, category key) pairs whose old products are kept
+        unknown = self.stores - set(scraper.STORES)
+        if unknown:
+            raise ValueError(f"Sucursales desconocidas: {', '.join(sorted(unknown))}")
+        if not self.stores and not self.models:
+            raise ValueError("Indica al menos una sucursal o un modelo.")
+
+    def matches(self, store_id, model, category):
+        return ((not self.stores or str(store_id).strip() in self.stores)
+                and (not self.models or model.strip().upper() in self.models)
+                and category.strip().upper() in self._category_keys
+                and (str(store_id).strip(), category.strip().upper()) not in self.excluded)
+
+    def exclude(self, store_id, category):
+        self.excluded.add((str(store_id).strip(), category.strip().upper()))
+
+    def matches_product(self, product):
+        return self.matches(product.get("ID Sucursal", ""), product.get("Modelo", ""), product.get("Categoría", ""))
+
+    def matches_cell(self, variant, store, category):
+        return self.matches(store, variant[0], category)
+
+    def store_ids(self):
+        return [store_id for store_id in scraper.STORES if not self.stores or store_id in self.stores]
+
+    def describe(self):
+        stores = ", ".join(sorted(self.stores)) or "todas"
+        models = ", ".join(sorted(self.models)) or "todos"
+        return f"sucursales: {stores}; modelos: {models}; familias: {', '.join(self.categories)}"
+
+# === STEPS ===
+def scrape_scope(scope, page_sizes, resumen):
+    """Scrapes only the stores and categories of the scope and keeps the products of its models."""
+    products = []
+    for store_id in scope.store_ids():
+        store_products = scraper.scrape_store_by_categories(store_id, scraper.STORES[store_id], scope.categories,
+                                                            resumen, page_sizes)
+        products.extend(product for product in store_products if scope.matches_product(product))
+    return products
+
+def unreconciled_pairs(scope, resumen):
+    """
+    (store id, category) pairs of the scope whose download failed, came back empty or
+    did not match the catalog's rowCount: their rows cannot replace the old ones.
+    """
+    return [(store_id, category) for store_id in scope.store_ids() for category in scope.categories
+            if resumen.get((scraper.STORES[store_id], category), {}).get("Conciliado") != "Sí"]
+
+def detect_gpt_colors(products):
+    """Runs the budgeted GPT color stage over the refreshed products that still have no color."""
+    # Local import: the OpenAI client is only created when it is actually used
+    import enrich_color_with_gpt as gpt
+    resultados, motivo = gpt.analizar_productos(products, gpt.Presupuesto.from_env(), gpt.load_principal_models())
+    if motivo:
+        print(f"⏹️ GPT detenido ({motivo}); {resultados['pendientes']} productos quedan sin color.")
+    return resultados["actualizados"]
+
+def replace_scoped_products(scope, products, use_gpt=False, path=MERGED_FILE):
+    """
+    Rewrites the merged product file in one streaming pass: products outside the scope
+    are copied, those inside it are replaced by the freshly scraped ones, enriched from
+    their description. Colors detected earlier (e.g. by GPT) are kept by SKU.
+    Returns (products removed, colors reused, colors detected by GPT).
+    """
+    removed = 0
+    previous_colors = {}
+    with RecordWriter(path, format=detect_format(path)) as writer:
+        for product in read_records(path):
+            if not scope.matches_product(product):
+                writer.write(product)
+                continue
+            removed += 1
+            if product.get("Color", "").strip() and product.get("SKU"):
+                previous_colors[product["SKU"]] = product["Color"]
+
+        reused = 0
+        for product in products:
+            enriquecer_producto(product)
+            if not product.get("Color") and product.get("SKU") in previous_colors:
+                product["Color"] = previous_colors[product["SKU"]]
+                reused += 1
+        detected = detect_gpt_colors(products) if use_gpt else 0
+        writer.write_many(products)
+    return removed, reused, detected
+
+def changed_variants(old_cube, new_cube, variants):
+    """Variants among the given ones whose total stock differs between the two cubes."""
+    variants = list(variants)
+    old = old_cube.slice(variant=variants).rollup("variant")
+    new = new_cube.slice(variant=variants).rollup("variant")
+    return {variant for variant in variants
+            if old.get((variant,), {}).get("stock", 0) != new.get((variant,), {}).get("stock", 0)}
+
+def sync_keys(variants):
+    """Sheet variant keys of the given variant tuples (see sync.prepare_local_variants)."""
+    import sync_stock_summary_to_sheets as sync
+    entries = [dict(zip(VARIANT_FIELDS, variant)) for variant in variants]
+    return {local_variant["key"] for local_variant in sync.prepare_local_variants(entries) if local_variant["key"]}
+
+def refresh(scope, use_gpt=False, run_sync=True, config_path=None):
+    """Runs the targeted refresh and returns the sync results (None when nothing was synced)."""
+    started_at = time.monotonic()
+    print(f"🎯 Actualización dirigida ({scope.describe()})")
+    if not os.path.exists(MERGED_FILE):
+        raise FileNotFoundError(f"No existe '{MERGED_FILE}'. Ejecuta el pipeline completo al menos una vez.")
+
+    # The cube before the refresh; rebuilt from the merged file only if it was never saved
+    if os.path.exists(CUBE_FILE):
+        old_cube = StockCube.load(CUBE_FILE)
+    else:
+        print(f"⚠️ No se encontró '{CUBE_FILE}'; se reconstruye desde '{MERGED_FILE}'.")
+        old_cube = build_stock_cube(read_records(MERGED_FILE))
+
+    resumen = {}
+    page_sizes = scraper.load_page_sizes()
+    products = scrape_scope(scope, page_sizes, resumen)
+    scraper.save_page_sizes(page_sizes)
+    print(f"🕸️ {len(products)} productos descargados de {len(scope.store_ids())} sucursales.")
+
+    # A failed scrape must not read as "every product was sold": those pairs keep their rows
+    failed = unreconciled_pairs(scope, resumen)
+    if len(failed) == len(scope.store_ids()) * len(scope.categories):
+        raise ScrapeFailed("Ninguna sucursal/familia se descargó completa; no se modifica nada.")
+    for store_id, category in failed:
+        print(f"⚠️ {category} en {scraper.STORES[store_id]}: descarga fallida o incompleta; se conservan los productos anteriores.")
+        scope.exclude(store_id, category)
+    products = [product for product in products if scope.matches_product(product)]
+
+    removed, reused, detected = replace_scoped_products(scope, products, use_gpt)
+    print(f"🔁 {removed} productos reemplazados por {len(products)} en '{MERGED_FILE}' "
+          f"({reused} colores conservados, {detected} detectados con GPT).")
+
+    # Only the variants with cells in the scope, before or after, can change
+    replacement = build_stock_cube(products)
+    new_cube = old_cube.patched(replacement, scope.matches_cell)
+    scoped_variants = set(replacement.labels["variant"])
+    for cell in range(len(old_cube)):
+        labels = [old_cube.cell_label(cell, dim) for dim in CUBE_DIMENSIONS]
+        if scope.matches_cell(*labels):
+            scoped_variants.add(labels[0])
+    variants = changed_variants(old_cube, new_cube, scoped_variants)
+
+    summary = load_records(SUMMARY_FILE) if os.path.exists(SUMMARY_FILE) else old_cube.to_variant_summary()
+    touched = patch_variant_summary(summary, new_cube, variants)
+    write_records(SUMMARY_FILE, summary, detect_format(SUMMARY_FILE) if os.path.exists(SUMMARY_FILE) else None)
+    new_cube.save(CUBE_FILE)
+    # Local import: stock_history builds on generate_stock_summary
+    from stock_history import HISTORY_FILE, record_cube
+    history_written, _ = record_cube(new_cube, HISTORY_FILE, label="refresh")
+    print(f"📊 {touched} variantes actualizadas en '{SUMMARY_FILE}'; {history_written} agregadas al historial.")
+
+    results = None
+    if not variants:
+        print("🤷 Ninguna variante cambió de stock; no hay nada que sincronizar.")
+    elif run_sync:
+        import sync_stock_summary_to_sheets as sync
+        results = sync.main(config_path=config_path, only_keys=sync_keys(variants))
+    print(f"\n✅ Actualización dirigida completada en {time.monotonic() - started_at:.1f} s.")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Actualiza de punta a punta solo algunas sucursales y/o modelos")
+    parser.add_argument("--stores", nargs="+", default=[], help="ID Sucursal a actualizar (por defecto, todas)")
+    parser.add_argument("--models", nargs="+", default=[], help="Modelos a actualizar (por defecto, todos)")
+    parser.add_argument("--categories", nargs="+", help="Familias a extraer (por defecto, CATEGORIES)")
+    parser.add_argument("--gpt", action="store_true", help="Detectar con GPT los colores que sigan faltando")
+    parser.add_argument("--no-sync", action="store_true", help="Solo actualizar los archivos locales")
+    parser.add_argument("--config", help="JSON con los destinos a sincronizar")
+    args = parser.parse_args(argv)
+
+    try:
+        scope = RefreshScope(args.stores, args.models, args.categories)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        with pipeline_lock():
+            results = refresh(scope, args.gpt, not args.no_sync, args.config)
+    except PipelineBusy as e:
+        print(f"⏳ {e}")
+        return 1
+    except (FileNotFoundError, ScrapeFailed) as e:
+        print(f"❌ {e}")
+        return 1
+    return 1 if results and any(result["status"] != "ok" for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
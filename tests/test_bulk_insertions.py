@@ -0,0 +1,52 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+import sync_stock_summary_to_sheets as sync
+from benchmarks.fake_sheets import FakeBackend, FakeClient
+from sheet_snapshot import SheetSnapshot
+
+def make_sheet(rows):
+    spreadsheet = FakeClient(FakeBackend()).create("sheet-id")
+    return spreadsheet, spreadsheet.add_worksheet_local("Hoja", rows)
+
+def insert_one_by_one(sheet, insertions):
+    """What the sync did before bulk insertion: one insert_row per variant, bottom-up."""
+    for insertion in sorted(insertions, key=lambda x: x['insert_at'], reverse=True):
+        sheet.insert_row(insertion['data'], insertion['insert_at'], value_input_option='USER_ENTERED')
+
+def random_insertions(rng, row_count, count):
+    return [{'insert_at': rng.randint(3, row_count + 1), 'data': [f"nuevo-{i}", str(rng.randint(0, 9)), "x"]}
+            for i in range(count)]
+
+def test_plan_groups_rows_and_shifts_later_groups():
+    insertions = [{'insert_at': 5, 'data': ['a']}, {'insert_at': 3, 'data': ['b']}, {'insert_at': 5, 'data': ['c']}]
+    assert sync.plan_bulk_insertions(insertions) == [
+        {'insert_at': 3, 'final_row': 3, 'rows': [['b']]},
+        {'insert_at': 5, 'final_row': 6, 'rows': [['c'], ['a']]},
+    ]
+
+def test_plan_of_nothing_is_empty():
+    assert sync.plan_bulk_insertions([]) == []
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bulk_insert_matches_row_by_row(seed):
+    rng = random.Random(seed)
+    rows = [["Título"], ["Modelo", "Inventario", "Otro"]] + [[f"fila-{i}", str(i), ""] for i in range(20)]
+    insertions = random_insertions(rng, len(rows), rng.randint(1, 12))
+
+    _, expected = make_sheet(rows)
+    insert_one_by_one(expected, insertions)
+
+    spreadsheet, sheet = make_sheet(rows)
+    snapshot = SheetSnapshot(sheet)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync.insert_rows_bulk(spreadsheet, snapshot, insertions)
+
+    assert sheet.get_all_values() == expected.get_all_values()
+    # One structural request, one value write, and the snapshot follows the sheet
+    assert spreadsheet.backend.calls["spreadsheet.batch_update"] == 1
+    assert spreadsheet.backend.calls["batch_update"] == 1
+    assert [row[:3] for row in snapshot.values] == [row[:3] for row in sheet.get_all_values()]
@@ -0,0 +1,85 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+import sync_stock_summary_to_sheets as sync
+from benchmarks.fake_sheets import FakeBackend, FakeClient
+from sheet_diff import cells_from_updates, chunk_updates, chunk_waves
+from sheet_snapshot import SheetSnapshot
+from sheets_client import ChunkedUpdateError, SheetsClient, batch_update_in_chunks
+
+def random_updates(seed, count=300):
+    """Single cells and short column runs over a small area, so many of them overlap."""
+    rng = random.Random(seed)
+    updates = []
+    for i in range(count):
+        col, row, length = rng.choice("ABCDE"), rng.randint(3, 60), rng.randint(1, 4)
+        updates.append({'range': f"{col}{row}:{col}{row + length - 1}", 'values': [[f"{i}.{k}"] for k in range(length)]})
+    return updates
+
+@pytest.mark.parametrize("seed", range(3))
+def test_chunks_respect_their_bounds_and_keep_every_cell(seed):
+    updates = random_updates(seed)
+    chunks = chunk_updates(updates, max_ranges=25, max_cells=40)
+    assert all(len(chunk) <= 25 and sum(len(u['values']) for u in chunk) <= 40 for chunk in chunks)
+    assert cells_from_updates([u for chunk in chunks for u in chunk]) == cells_from_updates(updates)
+
+def test_big_update_is_split_into_row_slices():
+    update = {'range': 'B3:C102', 'values': [[str(i), str(-i)] for i in range(100)]}
+    chunks = chunk_updates([update], max_cells=50)
+    assert [chunk[0]['range'] for chunk in chunks] == ['B3:C27', 'B28:C52', 'B53:C77', 'B78:C102']
+
+@pytest.mark.parametrize("seed", range(3))
+def test_waves_in_any_order_give_the_sequential_result(seed):
+    updates = random_updates(seed)
+    chunks = chunk_updates(updates, max_ranges=10)
+    waves = chunk_waves(chunks)
+    assert sorted(i for wave in waves for i in wave) == list(range(len(chunks)))
+
+    rng = random.Random(seed)
+    applied = []
+    for wave in waves:
+        wave = list(wave)
+        rng.shuffle(wave)  # chunks of one wave may land in any order
+        applied.extend(update for i in wave for update in chunks[i])
+    assert cells_from_updates(applied) == cells_from_updates(updates)
+
+def test_disjoint_chunks_share_the_first_wave():
+    chunks = [[{'range': 'A3', 'values': [['1']]}], [{'range': 'B3', 'values': [['2']]}],
+              [{'range': 'A3:A4', 'values': [['3'], ['4']]}]]
+    assert chunk_waves(chunks) == [[0, 1], [2]]
+
+def paced_sheet(error_every, max_retries):
+    spreadsheet = FakeClient(FakeBackend(error_every=error_every)).create("sheet-id")
+    sheet = spreadsheet.add_worksheet_local("Hoja", [["Título"], ["A", "B", "C", "D", "E"]])
+    client = SheetsClient(read_per_minute=10 ** 6, write_per_minute=10 ** 6, burst=10 ** 6,
+                          max_retries=max_retries, base_backoff=0.001)
+    return client, sheet, client.wrap(sheet)
+
+def test_injected_429s_are_retried_until_every_chunk_lands():
+    client, sheet, paced = paced_sheet(error_every=3, max_retries=6)
+    updates = random_updates(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sent = batch_update_in_chunks(paced, updates, max_ranges=20)
+
+    assert sent > 1
+    assert client.retry_counts["batch_update"] > 0
+    expected = cells_from_updates(updates)
+    assert {(row, col): sheet.values[row - 1][col] for row, col in expected} == expected
+
+def test_chunks_that_keep_failing_are_reported_and_the_rest_recorded():
+    _, sheet, paced = paced_sheet(error_every=2, max_retries=0)
+    snapshot = SheetSnapshot(paced)
+    updates = [{'range': f"A{row}", 'values': [[str(row)]]} for row in range(3, 43)]
+
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(ChunkedUpdateError) as error:
+        sync.write_value_updates(snapshot, updates, max_ranges=5)
+
+    assert error.value.failures
+    assert error.value.applied and len(error.value.applied) < len(updates)
+    # The snapshot holds exactly what reached the sheet
+    reached = {(row, 0): values[0] for row, values in enumerate(sheet.values, start=1) if row > 2 and values and values[0]}
+    assert cells_from_updates(error.value.applied) == reached
+    assert {(row, 0): snapshot.cell(row, 0) for row in range(3, 43) if snapshot.cell(row, 0)} == reached
@@ -0,0 +1,113 @@
+import pytest
+
+import pipeline
+import scraper_all_products as scraper
+import sync_stock_summary_to_sheets as sync
+
+class Clock:
+    """Stands in for time.monotonic/time.sleep: every cycle takes cycle_seconds."""
+
+    def __init__(self, cycle_seconds):
+        self.now = 0.0
+        self.cycle_seconds = cycle_seconds
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def run_cycle(self):
+        self.now += self.cycle_seconds
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """Runs the daemon over the summary stage with a scripted run_pipeline; returns (run, clock, calls)."""
+    monkeypatch.chdir(tmp_path)
+    clock = Clock(cycle_seconds=20)
+    monkeypatch.setattr(pipeline.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(pipeline.time, "sleep", clock.sleep)
+    monkeypatch.setattr(pipeline, "refresh_stock_index", lambda index=None: index)
+    calls = []
+
+    def run(outcomes, interval_minutes=1, **kwargs):
+        outcomes = iter(outcomes)
+
+        def scripted_run_pipeline(from_stage, to_stage, **run_kwargs):
+            calls.append(run_kwargs)
+            clock.run_cycle()
+            outcome = next(outcomes)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        monkeypatch.setattr(pipeline, "run_pipeline", scripted_run_pipeline)
+        pipeline.run_daemon(interval_minutes, "summary", "summary", **kwargs)
+    return run, clock, calls
+
+OK = [{"stage": "summary", "status": "ok", "wall_seconds": 20}]
+
+def test_runs_the_requested_cycles_and_waits_out_the_interval(daemon):
+    run, clock, calls = daemon
+    run([OK, OK, OK], max_cycles=3)
+    assert len(calls) == 3
+    # 60 s interval minus the 20 s each cycle took; no wait after the last one
+    assert clock.sleeps == [40, 40]
+
+def test_a_cycle_longer_than_the_interval_starts_the_next_one_at_once(daemon):
+    run, clock, calls = daemon
+    clock.cycle_seconds = 90
+    run([OK, OK], max_cycles=2)
+    assert len(calls) == 2 and clock.sleeps == []
+
+def test_failed_and_busy_cycles_do_not_stop_the_daemon(daemon):
+    run, clock, calls = daemon
+    run([RuntimeError("sin conexión"), pipeline.PipelineBusy("Otra ejecución tiene el candado."), OK], max_cycles=3)
+    assert len(calls) == 3
+    assert clock.sleeps == [40, 40]
+
+def test_ctrl_c_stops_the_daemon_quietly(daemon):
+    run, _, calls = daemon
+    run([OK, KeyboardInterrupt()])
+    assert len(calls) == 2
+
+def test_stage_kwargs_are_shared_by_every_cycle(daemon):
+    run, _, calls = daemon
+    run([OK, OK], max_cycles=2, stage_kwargs={"merge": {"db_path": "stock.db"}})
+    assert calls[0]["stage_kwargs"] is calls[1]["stage_kwargs"]
+    assert calls[0]["stage_kwargs"]["merge"] == {"db_path": "stock.db"}
+
+def test_failed_sheets_authentication_does_not_kill_the_warm_up(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no credentials.json here
+    with pytest.raises(sync.AuthenticationError):
+        sync.authenticate_gspread()
+
+    stage_kwargs = pipeline.warm_stage_kwargs({}, "sync", "sync")
+    # The stage authenticates by itself on every cycle; the paced client is still shared
+    assert "client" not in stage_kwargs["sync"]
+    assert stage_kwargs["sync"]["sheets_client"] is not None
+
+def test_scraper_settings_are_resolved_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    discovered = []
+    monkeypatch.setattr(scraper, "discover_categories", lambda: discovered.append(1) or ["CELULARES", "TABLETS"])
+    monkeypatch.setattr(scraper, "load_page_sizes", lambda path=None: {"CELULARES": {"field": "limite", "page_size": 1000}})
+
+    stage_kwargs = pipeline.warm_stage_kwargs({"scrape": {"discover": True}}, "scrape", "scrape")
+
+    assert stage_kwargs["scrape"]["categories"] == ["CELULARES", "TABLETS"]
+    assert stage_kwargs["scrape"]["page_sizes"] == {"CELULARES": {"field": "limite", "page_size": 1000}}
+    assert discovered == [1]
+
+def test_stock_index_is_refreshed_after_the_summary(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert pipeline.refresh_stock_index() is None  # no summary yet
+    (tmp_path / "stock_summary.json").write_text(
+        '[{"model_original": "CPH2599", "storage": "256GB", "color": "Negro", "compania": "Telcel", '
+        '"familia": "CELULARES", "caja": "", "stock": 2}]', encoding="utf-8")
+
+    index = pipeline.refresh_stock_index()
+
+    assert [v["model_original"] for v in index.query(model="cph2599")] == ["CPH2599"]
+    assert (tmp_path / "stock_summary.json.idx").exists()
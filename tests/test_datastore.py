@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+import merge_color_updates as merge
+from datastore import StockStore
+from record_files import load_records, write_records
+
+def product(sku, model="CPH2599", color="", store="154"):
+    return {"SKU": sku, "Modelo": model, "Color": color, "ID Sucursal": store, "Categoría": "CELULARES"}
+
+ENRICHED = [product("A1", color="Negro"), product("A2"), product(""), product("A3", "SM-A155M"), product("A2", store="155")]
+UPDATES = [product("A2", color="Azul"), product("A3", "SM-A155M"), product("A4", color="Rojo")]
+
+@pytest.fixture
+def store(tmp_path):
+    with StockStore(str(tmp_path / "stock.db")) as store:
+        yield store
+
+@pytest.mark.parametrize("format", ["json", "ndjson", "bin"])
+def test_import_and_export_round_trip(store, tmp_path, format):
+    source, exported = str(tmp_path / "in"), str(tmp_path / "out")
+    write_records(source, ENRICHED, format)
+
+    assert store.import_json("enrichment", source) == (len(ENRICHED), 0)
+    store.export_json("enrichment", exported, format)
+
+    assert load_records(exported) == ENRICHED
+    with open(source, "rb") as a, open(exported, "rb") as b:
+        assert a.read() == b.read()
+
+def test_replace_writes_only_changes_and_deletes_what_is_gone(store):
+    store.replace_products("enrichment", iter(ENRICHED))
+    assert store.replace_products("enrichment", iter(ENRICHED)) == (0, 0)
+
+    changed = [product("A1", color="Blanco"), ENRICHED[3], ENRICHED[1], product("A9")]
+    # A1 changed, A3 and A2 moved, A9 new; the keyless row and the second A2 are gone
+    assert store.replace_products("enrichment", changed) == (4, 2)
+    assert store.products("enrichment") == changed
+    assert store.products("enrichment", sku="A2") == [ENRICHED[1]]
+
+def test_failed_read_leaves_the_table_unchanged(store):
+    store.replace_products("enrichment", ENRICHED)
+
+    def broken():
+        yield product("A1", color="Verde")
+        raise ValueError("JSON cortado")
+    with pytest.raises(ValueError):
+        store.replace_products("enrichment", broken())
+
+    assert store.products("enrichment") == ENRICHED
+
+def test_datastore_merge_matches_the_file_merge(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_records(merge.BASE_FILE, ENRICHED)
+    write_records(merge.UPDATED_FILE, UPDATES)
+
+    replaced = merge.merge_with_datastore("stock.db", "desde_base.json")
+    expected, expected_replaced = merge.merge_updates(ENRICHED, UPDATES)
+
+    assert replaced == expected_replaced == 2
+    assert load_records("desde_base.json") == expected
+    assert merge.merge_streaming("desde_archivos.json") == expected_replaced
+    assert load_records("desde_archivos.json") == expected
+
+def test_missing_input_never_empties_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_records(merge.BASE_FILE, ENRICHED)
+    write_records(merge.UPDATED_FILE, UPDATES)
+    merge.main(db_path="stock.db")
+    before = json.loads((tmp_path / merge.OUTPUT_FILE).read_text(encoding="utf-8"))
+
+    os.remove(merge.UPDATED_FILE)
+    with pytest.raises(FileNotFoundError):
+        merge.main(db_path="stock.db")
+
+    with StockStore("stock.db") as store:
+        assert store.count("color_updates") == len(UPDATES)
+        assert [p for p, _ in store.merged_products()] == before
@@ -0,0 +1,94 @@
+from collections import Counter
+
+import pytest
+
+from add_color_from_description import enriquecer_producto
+from benchmarks.synthetic_catalog import fallback_profile, generate_products
+from generate_stock_summary import (VARIANT_FIELDS, StockCube, build_stock_cube, create_variant_summary,
+                                    parse_price_cents, patch_variant_summary, variant_key_for_product)
+
+@pytest.fixture(scope="module")
+def products():
+    return [enriquecer_producto(p) for p in generate_products(3000, seed=7, profile=fallback_profile())]
+
+@pytest.mark.parametrize("text, cents", [
+    ("$ 3,840.00", 384000), ("$ 1,299.99", 129999), ("  250 ", 25000), ("$0.50", 50),
+    ("", None), (None, None), ("N/D", None), ("NaN", None), ("sNaN", None), ("Infinity", None), ("-inf", None),
+])
+def test_parse_price_cents(text, cents):
+    assert parse_price_cents(text) == cents
+
+def test_cube_with_bad_prices_still_counts_stock():
+    product = {"Modelo": "CPH2599-MEM:256GB", "Color": "Negro", "Compañía": "Telcel", "Descripción": "",
+               "ID Sucursal": "154", "Categoría": "CELULARES"}
+    cube = build_stock_cube([dict(product, **{"Precio Promoción": price}) for price in ("NaN", "Infinity", "$ 10.00")])
+    (_, _, _, stats), = cube.cells()
+    assert stats == {"stock": 3, "min_price": 1000, "median_price": 1000, "max_price": 1000}
+
+def test_summary_matches_plain_variant_count(products):
+    # The per-variant count the summary was originally built with, in first-seen order
+    counts = Counter(key for key in map(variant_key_for_product, products) if key)
+    expected = [dict(zip(VARIANT_FIELDS, key), stock=stock) for key, stock in counts.items()]
+    assert create_variant_summary(products) == expected
+
+def test_save_and_load_round_trip(products, tmp_path):
+    cube = build_stock_cube(products)
+    path = str(tmp_path / "stock_cube.bin")
+    cube.save(path)
+    loaded = StockCube.load(path)
+    assert list(loaded.cells()) == list(cube.cells())
+    assert loaded.to_variant_summary() == cube.to_variant_summary()
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "stock_cube.bin"
+    path.write_bytes(b"not a cube")
+    with pytest.raises(ValueError):
+        StockCube.load(str(path))
+
+def test_rollup_by_store_adds_up_to_the_cube(products):
+    cube = build_stock_cube(products)
+    by_store = cube.rollup("store")
+    assert sum(stats["stock"] for stats in by_store.values()) == sum(cube.stock)
+    store = next(iter(by_store))[0]
+    sliced = cube.slice(store=store)
+    assert sum(sliced.stock) == by_store[(store,)]["stock"]
+
+SCOPE_STORES = {"139", "83"}
+
+def in_scope(variant, store, category):
+    return store in SCOPE_STORES and category == "CELULARES"
+
+def rescan(products):
+    """The scoped products as a new scrape would find them: every third one sold, and one restocked model."""
+    scoped = [p for p in products if in_scope(None, p["ID Sucursal"], p["Categoría"])]
+    kept = [p for i, p in enumerate(scoped) if i % 3]
+    restock = [dict(p, SKU=p["SKU"] + "-bis") for p in scoped[:4]]
+    return [p for p in products if not in_scope(None, p["ID Sucursal"], p["Categoría"])], kept + restock
+
+def cells_by_key(cube):
+    return {tuple(cell[:3]): cell[3] for cell in cube.cells()}
+
+def test_patched_cube_equals_a_rebuild(products):
+    outside, replacement = rescan(products)
+    patched = build_stock_cube(products).patched(build_stock_cube(replacement), in_scope)
+    assert cells_by_key(patched) == cells_by_key(build_stock_cube(outside + replacement))
+
+def variant_of(entry):
+    return tuple(entry[field] for field in VARIANT_FIELDS)
+
+def test_patch_variant_summary_matches_the_rebuilt_summary(products):
+    outside, replacement = rescan(products)
+    old_cube = build_stock_cube(products)
+    new_cube = old_cube.patched(build_stock_cube(replacement), in_scope)
+    # Only variants with a cell in the scope, before or after, can change
+    variants = {cell[0] for cube in (old_cube, new_cube) for cell in cube.cells() if in_scope(*cell[:3])}
+    summary = old_cube.to_variant_summary()
+    untouched = [entry for entry in summary if variant_of(entry) not in variants]
+
+    touched = patch_variant_summary(summary, new_cube, variants)
+
+    rebuilt = build_stock_cube(outside + replacement).to_variant_summary()
+    assert {variant_of(e): e["stock"] for e in summary} == {variant_of(e): e["stock"] for e in rebuilt}
+    assert 0 < touched <= len(variants)
+    # Entries outside the scope are left as they were, in their order
+    assert [entry for entry in summary if variant_of(entry) not in variants] == untouched
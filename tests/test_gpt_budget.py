@@ -0,0 +1,80 @@
+import pytest
+
+import enrich_color_with_gpt as gpt
+from record_files import load_records, write_records
+
+def catalog():
+    """Six products without color (cheapest first) around two that already have one."""
+    products = [{"SKU": f"SKU{i}", "Modelo": f"M{i}", "Color": "", "Precio Promoción": f"$ {100 * (i + 1)}.00"}
+                for i in range(6)]
+    products.insert(2, {"SKU": "SKU-A", "Modelo": "MA", "Color": "Azul", "Precio Promoción": "$ 50.00"})
+    products.append({"SKU": "SKU-B", "Modelo": "MB", "Color": "Gris", "Precio Promoción": "$ 70.00"})
+    return products
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Every product has an image and GPT always answers 'Negro'; records the SKUs sent."""
+    sent = []
+    monkeypatch.setattr(gpt, "client", object())
+    monkeypatch.setattr(gpt, "fetch_efectimundo_images", lambda sku: [f"https://img/{sku}.jpg"])
+    monkeypatch.setattr(gpt.time, "sleep", lambda seconds: None)
+
+    def detect(image_url):
+        sent.append(image_url.rsplit("/", 1)[1][:-4])
+        return "Negro"
+    monkeypatch.setattr(gpt, "detect_color_in_image", detect)
+    return sent
+
+def test_call_limit_stops_after_the_most_valuable(fake_api):
+    products = catalog()
+    budget = gpt.Presupuesto(max_calls=2)
+    resultados, motivo = gpt.analizar_productos(products, budget, stock={})
+    assert fake_api == ["SKU5", "SKU4"]
+    assert motivo == "límite de 2 llamadas"
+    assert resultados["actualizados"] == 2 and resultados["pendientes"] == 4
+
+def test_cost_limit_leaves_room_for_no_partial_call(fake_api):
+    budget = gpt.Presupuesto(max_cost=0.01, cost_per_call=0.003)
+    _, motivo = gpt.analizar_productos(catalog(), budget, stock={})
+    assert budget.calls == 3
+    assert budget.cost <= 0.01
+    assert motivo.startswith("límite de costo")
+
+def test_time_limit(fake_api, monkeypatch):
+    clock = iter(range(0, 1000, 40))
+    monkeypatch.setattr(gpt.time, "monotonic", lambda: next(clock))
+    budget = gpt.Presupuesto(max_minutes=2)
+    _, motivo = gpt.analizar_productos(catalog(), budget, stock={})
+    assert motivo == "límite de 2 minutos"
+    assert 0 < budget.calls < 6
+
+def test_principal_models_go_first(fake_api):
+    gpt.analizar_productos(catalog(), gpt.Presupuesto(max_calls=1), principales={"M0"}, stock={})
+    assert fake_api == ["SKU0"]
+
+def test_without_client_nothing_is_counted(monkeypatch):
+    monkeypatch.setattr(gpt, "client", None)
+    monkeypatch.setattr(gpt, "fetch_efectimundo_images", lambda sku: pytest.fail("no request should be made"))
+    budget = gpt.Presupuesto()
+    resultados, motivo = gpt.analizar_productos(catalog(), budget, stock={})
+    assert budget.calls == 0
+    assert motivo == "cliente de OpenAI no disponible"
+    assert resultados["pendientes"] == 6
+
+def test_file_is_rewritten_in_order_with_the_detected_colors(fake_api, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    products = catalog()
+    write_records(gpt.INPUT_FILE, products, "ndjson")
+    result = gpt.enriquecer_colores_con_gpt(gpt.Presupuesto(max_calls=3))
+    assert result["motivo"] == "límite de 3 llamadas" and result["pendientes"] == 3
+
+    saved = load_records(gpt.OUTPUT_FILE)
+    assert [p["SKU"] for p in saved] == [p["SKU"] for p in products]
+    assert {p["SKU"]: p["Color"] for p in saved if p["Color"] == "Negro"} == dict.fromkeys(["SKU5", "SKU4", "SKU3"], "Negro")
+    assert [p["Color"] for p in saved if p["SKU"] in ("SKU-A", "SKU-B")] == ["Azul", "Gris"]
+
+def test_a_run_that_covers_every_product_reports_no_reason(fake_api, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_records(gpt.INPUT_FILE, catalog())
+    result = gpt.enriquecer_colores_con_gpt(gpt.Presupuesto(max_calls=10))
+    assert result["motivo"] is None and result["pendientes"] == 0
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import sync_stock_summary_to_sheets as sync
+from thefuzz import process
+
+COLORS = ["Azul", "Azul Marino", "Blanco", "Dorado", "Gris", "Morado", "Negro", "Plata", "Rojo", "Rosa", "Verde"]
+STORAGES = ["32GB", "64GB", "128GB", "256GB", "512GB", "1TB"]
+
+def sheet_typos(options, seed):
+    """Values as they get typed in the sheet: case, accents, spacing, swapped or missing letters."""
+    rng = random.Random(seed)
+    values = set()
+    for option in options:
+        values.update({option.upper(), f" {option.lower()} ", option.replace("a", "á"), option[:-1], option[1:],
+                       option + "s", f"[{option}]", option.replace(" ", "")})
+        chars = list(option)
+        i = rng.randrange(len(chars) - 1)
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        values.add("".join(chars))
+    values.update({"", "---", "ñandú", "Sin color"})
+    return sorted(values)
+
+@pytest.mark.parametrize("options", [COLORS, STORAGES])
+def test_batch_matches_equal_extract_one(options):
+    pytest.importorskip("numpy")
+    if sync.rapidfuzz_process is None:
+        pytest.skip("rapidfuzz no está instalado")
+    values = sheet_typos(options, seed=len(options))
+    batch = sync.match_values_to_options(values, options)
+    assert batch == {value: process.extractOne(value, options) for value in values}
+    assert all(isinstance(score, int) for _, score in batch.values())
+
+def test_without_rapidfuzz_falls_back_to_extract_one(monkeypatch):
+    monkeypatch.setattr(sync, "rapidfuzz_process", None)
+    assert sync.match_values_to_options(["negro ", "AZUL"], COLORS) == {"negro ": ("Negro", 100), "AZUL": ("Azul", 100)}
+
+def test_nothing_to_match():
+    assert sync.match_values_to_options([], COLORS) == {}
+    assert sync.match_values_to_options(["Negro"], []) == {}
+
+def test_normalization_cache_stays_warm_until_the_file_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / "normalization_cache.json")
+    cache = sync.load_normalization_cache(path)
+    cache["vs"] = {"options": "abc", "matches": {"negro ": "Negro"}}
+    sync.save_normalization_cache(cache, path)
+
+    reads = []
+    real_load = sync.json.load
+    monkeypatch.setattr(sync.json, "load", lambda f: reads.append(f.name) or real_load(f))
+    assert sync.load_normalization_cache(path) is cache
+    assert reads == []
+
+    # Edited outside this process: read again
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"vs": {"options": "abc", "matches": {}}}')
+    assert sync.load_normalization_cache(path) == {"vs": {"options": "abc", "matches": {}}}
+    assert reads == [path]
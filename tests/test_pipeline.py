@@ -0,0 +1,132 @@
+import contextlib
+import logging
+
+import pytest
+
+import pipeline
+import profiling
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def run_only(stage_name, **profile_options):
+    return pipeline.run_pipeline(stage_name, stage_name, force=True, profile_options=dict(profile_options, report_path=False))
+
+def test_stage_output_goes_through_logging(workdir, monkeypatch, caplog):
+    def fake_stage(stage, kwargs=None):
+        print("📦 Procesando CELULARES")
+        print("⚠️ No hay datos para CONSOLAS")
+        print("❌ Error al obtener página 3", end="")
+    monkeypatch.setattr(pipeline, "run_stage", fake_stage)
+
+    with caplog.at_level(logging.INFO):
+        results = run_only("summary")
+
+    assert results[0]["status"] == "ok"
+    output = [(r.levelno, r.getMessage()) for r in caplog.records if getattr(r, "event", None) == "output"]
+    assert output == [(logging.INFO, "📦 Procesando CELULARES"), (logging.WARNING, "⚠️ No hay datos para CONSOLAS"),
+                      (logging.ERROR, "❌ Error al obtener página 3")]
+    assert all(r.stage == "summary" for r in caplog.records if getattr(r, "event", None) == "output")
+
+def test_memory_is_only_traced_on_request(workdir, monkeypatch):
+    monkeypatch.setattr(pipeline, "run_stage", lambda stage, kwargs=None: None)
+    assert "peak_memory_mb" not in run_only("summary")[0]
+    assert "peak_memory_mb" in run_only("summary", track_memory=True)[0]
+
+def test_failure_before_profiling_reports_the_real_error(workdir, monkeypatch):
+    @contextlib.contextmanager
+    def broken_profile(*args, **kwargs):
+        raise OSError("reports/ no se puede escribir")
+        yield
+    monkeypatch.setattr(profiling, "profile_stage", broken_profile)
+
+    results = run_only("summary")
+
+    assert results == [{"stage": "summary", "status": "error", "error": "reports/ no se puede escribir"}]
+
+def test_failed_stage_stops_the_run_and_forgets_its_cache(workdir, monkeypatch):
+    def failing_stage(stage, kwargs=None):
+        raise pipeline.StageError("no se generaron: stock_summary.json")
+    monkeypatch.setattr(pipeline, "run_stage", failing_stage)
+
+    results = pipeline.run_pipeline("summary", "sync", force=True, profile_options={"report_path": False})
+
+    assert [(r["stage"], r["status"]) for r in results] == [("summary", "error")]
+    assert "summary" not in pipeline.load_cache()
+
+def test_unchanged_stage_is_skipped_and_any_change_reruns_it(workdir, monkeypatch):
+    # A copy of the summary stage's code, so the test can edit a module it imports
+    (workdir / "generate_stock_summary.py").write_text("from helpers import total\n", encoding="utf-8")
+    (workdir / "helpers.py").write_text("def total(rows):\n    return len(rows)\n", encoding="utf-8")
+    monkeypatch.setattr(pipeline, "BASE_DIR", str(workdir))
+    runs = []
+
+    def summary_stage(stage, kwargs=None):
+        runs.append(stage["name"])
+        merged = (workdir / "products_with_color_merged.json").read_text(encoding="utf-8")
+        (workdir / "stock_summary.json").write_text(merged, encoding="utf-8")
+        (workdir / "stock_cube.bin").write_bytes(b"cubo")
+    monkeypatch.setattr(pipeline, "run_stage", summary_stage)
+
+    def run():
+        results = pipeline.run_pipeline("summary", "summary", profile_options={"report_path": False})
+        return results[0]["status"]
+
+    (workdir / "products_with_color_merged.json").write_text('[{"modelo": "CPH2599"}]', encoding="utf-8")
+    assert run() == "ok"
+    assert run() == "skipped"
+
+    (workdir / "products_with_color_merged.json").write_text('[{"modelo": "SM-A155M"}]', encoding="utf-8")
+    assert run() == "ok"
+    assert run() == "skipped"
+
+    (workdir / "helpers.py").write_text("def total(rows):\n    return sum(1 for _ in rows)\n", encoding="utf-8")
+    assert run() == "ok"
+
+    (workdir / "stock_summary.json").write_text("[]", encoding="utf-8")  # output edited by hand
+    assert run() == "ok"
+    assert runs == ["summary"] * 4
+
+def test_stage_code_includes_every_local_module_it_imports():
+    files = {stage["name"]: pipeline.stage_code_files(stage) for stage in pipeline.STAGES}
+    assert {"sheet_snapshot.py", "sheet_diff.py", "sheets_client.py", "record_files.py"} <= set(files["sync"])
+    assert {"datastore.py", "record_files.py"} <= set(files["merge"])
+    assert not any(path in ("json.py", "requests.py", "pipeline.py") for paths in files.values() for path in paths)
+
+@pytest.mark.parametrize("finished", [False, True])
+def test_gpt_run_stopped_by_its_budget_is_not_cached(workdir, monkeypatch, finished):
+    (workdir / "products_without_color.json").write_text('[{"SKU": "A1", "Color": ""}]', encoding="utf-8")
+    (workdir / "raw_scraped_products_debug.json").write_text('[{"SKU": "A1"}]', encoding="utf-8")
+    runs = []
+
+    def gpt_stage(stage, kwargs=None):
+        runs.append(stage["name"])
+        (workdir / "products_without_color.json").write_text(f'[{{"SKU": "A1", "Color": "Negro{len(runs)}"}}]', encoding="utf-8")
+        return {"analizados": 1, "motivo": None if finished else "límite de 1 llamadas"}
+    monkeypatch.setattr(pipeline, "run_stage", gpt_stage)
+
+    def run():
+        return pipeline.run_pipeline("gpt", "gpt", profile_options={"report_path": False})[0]
+
+    first = run()
+    assert first["status"] == ("ok" if finished else "partial")
+    assert run()["status"] == ("skipped" if finished else "partial")
+    assert len(runs) == (1 if finished else 2)
+
+def test_gpt_stage_reruns_when_its_priorities_change(workdir, monkeypatch):
+    (workdir / "products_without_color.json").write_text('[{"SKU": "A1", "Color": ""}]', encoding="utf-8")
+    monkeypatch.setattr(pipeline, "run_stage", lambda stage, kwargs=None: {"motivo": None})
+
+    def run():
+        return pipeline.run_pipeline("gpt", "gpt", profile_options={"report_path": False})[0]["status"]
+
+    assert run() == "ok"
+    # Neither the scrape nor the 'Principal' models exist yet, and that has not changed
+    assert run() == "skipped"
+    (workdir / "principal_models.json").write_text('["CPH2599"]', encoding="utf-8")
+    assert run() == "ok"
+    (workdir / "raw_scraped_products_debug.json").write_text('[{"SKU": "A1", "Modelo": "CPH2599"}]', encoding="utf-8")
+    assert run() == "ok"
+    assert run() == "skipped"
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import record_files
+from record_files import RecordWriter, append_records, detect_format, load_records, read_records, write_records
+
+PRODUCTS = [
+    {"SKU": "300000001.1", "Modelo": "CPH2599-MEM:256GB", "Precio Promoción": "$ 2,300.00", "Color": "Negro"},
+    {"SKU": "300000002.1", "Modelo": "SM-A556E-MEM:128GB", "Precio Promoción": "$ 2,100.00", "Color": ""},
+    {"SKU": "300000003.1", "Modelo": "HAC001-DD:32GB-ED:SIN_EDICION", "Caja": "Sí", "stock": 12, "extra": None,
+     "flags": [True, False], "nested": {"a": 1.5}},
+]
+
+@pytest.mark.parametrize("fmt", record_files.FORMATS)
+def test_round_trip(tmp_path, fmt):
+    path = str(tmp_path / "products")
+    assert write_records(path, PRODUCTS, fmt) == len(PRODUCTS)
+    assert detect_format(path) == fmt
+    assert load_records(path) == PRODUCTS
+
+@pytest.mark.parametrize("fmt", record_files.FORMATS)
+def test_append_keeps_format(tmp_path, fmt):
+    path = str(tmp_path / "products")
+    write_records(path, PRODUCTS[:1], fmt)
+    append_records(path, PRODUCTS[1:])
+    assert detect_format(path) == fmt
+    assert load_records(path) == PRODUCTS
+
+def test_json_output_matches_json_dump(tmp_path):
+    path = tmp_path / "products.json"
+    write_records(str(path), PRODUCTS, "json")
+    assert path.read_text(encoding="utf-8") == json.dumps(PRODUCTS, indent=2, ensure_ascii=False)
+
+def test_writer_discards_output_on_error(tmp_path):
+    path = tmp_path / "products.json"
+    write_records(str(path), PRODUCTS, "json")
+    with pytest.raises(RuntimeError):
+        with RecordWriter(str(path), "json") as writer:
+            writer.write({"SKU": "partial"})
+            raise RuntimeError("boom")
+    assert load_records(str(path)) == PRODUCTS
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 4, 7])
+def test_json_values_across_block_boundaries(tmp_path, monkeypatch, block_size):
+    monkeypatch.setattr(record_files, "READ_BLOCK_SIZE", block_size)
+    values = [1, 234567, 89, 1000000, -12.5e3, "cadena larga con ñ y acentós", True, None, {"k": [10, 200]}]
+    path = tmp_path / "values.json"
+    path.write_text(json.dumps(values), encoding="utf-8")
+    assert list(read_records(str(path))) == values
+
+@pytest.mark.parametrize("text", ["[1 2]", "[1,]", "[,1]", "[1, 2", '[{"a": 1} {"b": 2}]'])
+def test_malformed_json_arrays_are_rejected(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(record_files, "READ_BLOCK_SIZE", 4)
+    path = tmp_path / "bad.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(read_records(str(path)))
+
+def test_empty_json_array(tmp_path):
+    path = tmp_path / "empty.json"
+    path.write_text("[ ]", encoding="utf-8")
+    assert load_records(str(path)) == []
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+import scrape_queue
+import scraper_all_products as scraper
+
+STORES = {"154": "Centro", "155": "Norte"}
+CATEGORIES = ["CELULARES", "TABLETS"]
+
+@pytest.fixture
+def queue_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, "load_page_sizes", lambda: {})
+    monkeypatch.setattr(scraper, "save_page_sizes", lambda page_sizes: None)
+    url = str(tmp_path / "queue.db")
+    queue = scrape_queue.open_queue(url)
+    queue.enqueue(scrape_queue.build_units(STORES, CATEGORIES), reset=True)
+    queue.close()
+    return url
+
+def fake_scrape(store_id, store_name, categories, resumen, page_sizes):
+    category = categories[0]
+    resumen[(store_name, category)] = {"productos": 1}
+    return [{"ID Sucursal": store_id, "Categoría": category}]
+
+def test_work_queue_is_abstract():
+    with pytest.raises(TypeError):
+        scrape_queue.WorkQueue()
+
+def test_results_merge_in_single_node_order(queue_url):
+    queue = scrape_queue.open_queue(queue_url)
+    # Finish the units in reverse order, as independent workers might
+    claimed = []
+    while (unit := queue.claim("w1")) is not None:
+        claimed.append(unit)
+    for unit in reversed(claimed):
+        resumen = {}
+        products = fake_scrape(unit["store_id"], unit["store_name"], [unit["category"]], resumen, {})
+        assert queue.complete(unit["unit_id"], "w1", products, resumen[(unit["store_name"], unit["category"])])
+
+    resumen = {}
+    merged = list(scrape_queue.merge_results(queue, resumen))
+    queue.close()
+    assert [(p["ID Sucursal"], p["Categoría"]) for p in merged] == [
+        ("154", "CELULARES"), ("154", "TABLETS"), ("155", "CELULARES"), ("155", "TABLETS")]
+    assert set(resumen) == {(name, category) for name in STORES.values() for category in CATEGORIES}
+
+def test_worker_completes_every_unit(queue_url):
+    assert scrape_queue.run_worker(queue_url, worker_id="w1", scrape=fake_scrape) == 4
+    queue = scrape_queue.open_queue(queue_url)
+    assert queue.counts()[scrape_queue.DONE] == 4
+    queue.close()
+
+def test_worker_drops_result_after_losing_its_lease(queue_url, monkeypatch):
+    monkeypatch.setattr(scrape_queue.SQLiteWorkQueue, "heartbeat", lambda self, *args, **kwargs: False)
+
+    def slow_scrape(*args):
+        # Long enough for the heartbeat thread to report the lease as lost
+        time.sleep(0.05)
+        return fake_scrape(*args)
+
+    completed = scrape_queue.run_worker(queue_url, worker_id="w1", heartbeat_seconds=0.01,
+                                        scrape=slow_scrape)
+    queue = scrape_queue.open_queue(queue_url)
+    counts = queue.counts()
+    queue.close()
+    # The store still accepts the result, but the worker must not hand it in
+    assert completed == 0
+    assert counts[scrape_queue.DONE] == 0
+    assert counts[scrape_queue.LEASED] == 4
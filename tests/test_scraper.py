@@ -0,0 +1,99 @@
+import contextlib
+import io
+
+import pytest
+
+import scraper_all_products as scraper
+
+HEADERS = [scraper.SKU_HEADER, "Marca", "Modelo", "Descripción", "Precio Promoción", "Familia"]
+
+def table(rows):
+    head = "".join(f"<th>{title}</th>" for title in HEADERS)
+    body = "".join("<tr>" + "".join(f"<td>{value}</td>" for value in row) + "</tr>" for row in rows)
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+class CatalogServer:
+    """
+    Paginated catalog endpoint: DEFAULT_PAGE_SIZE rows per page unless the 'registros'
+    field asks for more. fail_requests lists the 1-based request numbers that return None;
+    changes maps a request number to a function applied to the catalog rows right before
+    that request is served (items added or sold mid-pagination).
+    """
+
+    def __init__(self, total, fail_requests=(), changes=None):
+        self.rows = [[f"{900000 + i}.1", "OPPO", "CPH2599-MEM:256GB", "OPPO CPH2599 NEGRO", "$ 2,300.00", "CELULARES"]
+                     for i in range(total)]
+        self.fail_requests = set(fail_requests)
+        self.changes = changes or {}
+        self.requests = []
+
+    def __call__(self, page_number, category, store_id, page_size=None, page_size_field=None):
+        self.requests.append((page_number, page_size_field, page_size))
+        if len(self.requests) in self.changes:
+            self.changes[len(self.requests)](self.rows)
+        if len(self.requests) in self.fail_requests:
+            return None
+        size = page_size if page_size_field == "registros" and page_size else scraper.DEFAULT_PAGE_SIZE
+        start = (page_number - 1) * size
+        return {"rowCount": len(self.rows), "tabla": table(self.rows[start:start + size])}
+
+def fetch(server, monkeypatch, page_sizes):
+    monkeypatch.setattr(scraper, "fetch_page_data", server)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scraper.fetch_category_rows("CELULARES", "154", "Atizapán Plaza Cristal", page_sizes)
+
+def test_negotiates_a_larger_page_size(monkeypatch):
+    server = CatalogServer(total=420)
+    page_sizes = {}
+    headers, rows, total, stats = fetch(server, monkeypatch, page_sizes)
+    assert page_sizes["CELULARES"] == {"field": "registros", "page_size": 1000}
+    assert (len(rows), total, stats["Conciliado"]) == (420, 420, "Sí")
+
+def test_failed_resized_first_page_falls_back_to_default_size(monkeypatch):
+    # Requests: 1 default page 1, 2 negotiation probe (accepted), 3 page 1 at the new size (fails)
+    server = CatalogServer(total=120, fail_requests={3})
+    page_sizes = {}
+    headers, rows, total, stats = fetch(server, monkeypatch, page_sizes)
+    assert page_sizes["CELULARES"]["field"] == "registros"
+    assert [row[0] for row in rows] == [row[0] for row in server.rows]
+    assert stats["Conciliado"] == "Sí"
+    # The rest of the category was paged at the default size
+    assert all(field is None for _, field, _ in server.requests[3:])
+
+# Already negotiated: the endpoint keeps its default page size
+DEFAULT_SETTING = {"CELULARES": {"field": None, "page_size": None}}
+
+def skus(rows):
+    return [row[0] for row in rows]
+
+def test_dedupe_keeps_the_first_occurrence_in_page_order():
+    pages = {2: [["B", "x"], ["C", "y"]], 1: [["A", "x"], ["B", "x"]], 3: None, 4: [["", "z"], ["", "z"], ["D", "w"]]}
+    rows, duplicates = scraper.dedupe_rows(pages, sku_index=0)
+    assert rows == [["A", "x"], ["B", "x"], ["C", "y"], ["", "z"], ["D", "w"]]
+    assert duplicates == 2
+
+def test_failed_page_is_fetched_again(monkeypatch):
+    # Requests: pages 1, 2, 3 (fails), 4, then page 3 again
+    server = CatalogServer(total=160, fail_requests={3})
+    headers, rows, total, stats = fetch(server, monkeypatch, dict(DEFAULT_SETTING))
+    assert skus(rows) == skus(server.rows)
+    assert [page for page, _, _ in server.requests] == [1, 2, 3, 4, 3]
+    assert (stats["Páginas re-descargadas"], stats["Re-descargas completas"], stats["Conciliado"]) == (1, 0, "Sí")
+
+def test_item_added_mid_pagination_is_deduplicated_and_reconciled(monkeypatch):
+    new_item = ["100000.1", "OPPO", "CPH2599-MEM:256GB", "OPPO CPH2599 AZUL", "$ 2,300.00", "CELULARES"]
+    # After page 1 a new item lands first, pushing the last row of page 1 onto page 2
+    server = CatalogServer(total=120, changes={2: lambda rows: rows.insert(0, list(new_item))})
+    headers, rows, total, stats = fetch(server, monkeypatch, dict(DEFAULT_SETTING))
+    assert total == 121
+    assert sorted(skus(rows)) == sorted(skus(server.rows))
+    assert stats["Duplicados descartados"] >= 1
+    assert (stats["Re-descargas completas"], stats["Conciliado"]) == (1, "Sí")
+
+def test_item_sold_mid_pagination_is_not_lost(monkeypatch):
+    # After page 1 the first item is sold, so the first row of page 2 slides onto page 1
+    server = CatalogServer(total=120, changes={2: lambda rows: rows.pop(0)})
+    headers, rows, total, stats = fetch(server, monkeypatch, dict(DEFAULT_SETTING))
+    assert total == 119
+    assert sorted(skus(rows)) == sorted(skus(server.rows))
+    assert stats["Conciliado"] == "Sí"
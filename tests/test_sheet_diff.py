@@ -0,0 +1,37 @@
+import pytest
+
+from sheet_diff import cells_from_updates, coalesce_cells, diff_cells, values_equal
+
+@pytest.mark.parametrize("current, intended, equal", [
+    ("5", 5, True),
+    ("1,000", 1000, True),
+    (" 7 ", "7", True),
+    ("", None, True),
+    ("5", 6, False),
+    ("Negro", "negro", False),
+    ("", 0, False),
+])
+def test_values_equal(current, intended, equal):
+    assert values_equal(current, intended) is equal
+
+def test_coalesce_merges_adjacent_rows_of_a_column():
+    cells = {(3, 2): 1, (4, 2): 2, (5, 2): 3, (7, 2): 4, (3, 0): "a"}
+    assert coalesce_cells(cells) == [
+        {'range': 'A3', 'values': [["a"]]},
+        {'range': 'C3:C5', 'values': [[1], [2], [3]]},
+        {'range': 'C7', 'values': [[4]]},
+    ]
+
+def test_coalesce_of_nothing_is_empty():
+    assert coalesce_cells({}) == []
+
+def test_diff_writes_only_changed_cells():
+    sheet = {(3, 5): "4", (4, 5): "0", (5, 5): "12", (6, 5): "", (3, 6): "Principal"}
+    intended = {(3, 5): 4, (4, 5): 1, (5, 5): 13, (6, 5): 0, (3, 6): "Principal"}
+
+    updates, changed, avoided = diff_cells(intended, lambda row, col: sheet.get((row, col), ""))
+
+    assert (changed, avoided) == (3, 2)
+    assert updates == [{'range': 'F4:F6', 'values': [[1], [13], [0]]}]
+    assert cells_from_updates(updates) == {cell: value for cell, value in intended.items()
+                                          if cell in {(4, 5), (5, 5), (6, 5)}}
@@ -0,0 +1,68 @@
+import contextlib
+import io
+
+import sync_stock_summary_to_sheets as sync
+from benchmarks.bench_stages import SYNC_COLUMNS
+from benchmarks.bench_sync import SHEET_HEADERS
+
+INDICES = {key: SHEET_HEADERS.index(title) for key, title in SYNC_COLUMNS.items()}
+
+def row(model, familia="CELULARES", vp="256GB", vs="Negro", vt="Telcel", color="", principal="Principal"):
+    values = [''] * len(SHEET_HEADERS)
+    for key, value in (("model", model), ("familia", familia), ("vp", vp), ("vs", vs), ("vt", vt),
+                       ("color_col", color), ("principal_extra", principal)):
+        values[INDICES[key]] = value
+    return values
+
+def index(rows, familias=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return sync.SheetIndex(rows, INDICES, familias)
+
+def key(model, familia="CELULARES", vp="256GB", vs="Negro", vt="Telcel", color=""):
+    return sync.sheet_variant_key(model, familia, vp, vs, vt, color)
+
+def test_rows_are_found_by_key_regardless_of_case_and_spaces():
+    sheet = index([
+        row("CPH2599"),                                                   # row 3
+        row("CPH2599", vs="Azul"),                                        # row 4
+        row("CFI-1215A", familia="CONSOLAS", vp="825GB", vs="c-caja", vt="", color="Blanco"),
+    ])
+    assert sheet.variant_rows[key(" cph2599 ", vs="NEGRO ")] == 3
+    assert sheet.variant_rows[key("CPH2599", vs="Azul")] == 4
+    assert sheet.variant_rows[key("CFI-1215A", "CONSOLAS", "825GB", "c-caja", "", "Blanco")] == 5
+    assert sheet.principal_models == {"CPH2599", "CFI-1215A"}
+    assert sheet.has_model("cph2599") and not sheet.has_model("SM-A155M")
+
+def test_duplicate_keys_map_to_the_last_row():
+    sheet = index([row("CPH2599"), row("CPH2599", vs="Azul"), row("CPH2599")])
+    assert sheet.variant_rows[key("CPH2599")] == 5
+    assert len(sheet.variant_rows) == 2
+    assert sheet.model_spans["cph2599"] == [3, 5]
+
+def test_blank_short_and_unkeyed_rows():
+    short = row("SM-A155M")[:INDICES["principal_extra"]]  # cut before ¿Principal o Extra?
+    sheet = index([
+        row("CPH2599", principal="Extra"),                     # row 3
+        [],                                                    # row 4: blank
+        row("CPH2599", familia="TABLETS", principal="Extra"),  # row 5: no key for this familia
+        short,                                                 # row 6: too short to read
+        row("", vs="Gris"),                                    # row 7: no model
+    ])
+    assert list(sheet.variant_rows.values()) == [3]
+    assert sheet.principal_models == set()
+    # Short rows still count for the model's span and the last used row, as before indexing
+    assert sheet.model_spans == {"cph2599": [3, 5], "sm-a155m": [6, 6]}
+    assert sheet.last_row == 6
+
+def test_insertion_rows():
+    sheet = index([row("CPH2599"), row("SM-A155M"), row("CPH2599", vs="Azul"), row("SM-A155M", vs="Gris")])
+    # After the last row of the model, even when its rows are not contiguous
+    assert sheet.insertion_row("cph2599") == 6
+    # Unknown models go after the last used row; an empty sheet starts at the first data row
+    assert sheet.insertion_row("XT2363") == 7
+    assert index([]).insertion_row("XT2363") == 3
+
+def test_familia_filter_leaves_other_rows_out_of_the_keys_only():
+    sheet = index([row("CPH2599"), row("CFI-1215A", familia="CONSOLAS", vt="", color="Blanco")], familias=["consolas"])
+    assert list(sheet.variant_rows.values()) == [4]
+    assert sheet.has_model("CPH2599") and "CPH2599" in sheet.principal_models
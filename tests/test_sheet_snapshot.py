@@ -0,0 +1,37 @@
+from benchmarks.fake_sheets import FakeBackend, FakeClient
+from sheet_snapshot import SheetSnapshot
+from sync_stock_summary_to_sheets import projected_columns
+
+ROWS = [
+    ["Inventario"],
+    ["Notas", "Modelo", "Familia", "Variante Primaria", "Inventario Partner", "Comentario"],
+    ["n1", "CPH2599", "CELULARES", "256GB", "4", "revisar"],
+    ["n2", "", "", "", "", "solo comentario"],
+    ["n3", "SM-A155M", "CELULARES", "128GB", "0"],
+    ["", "", "", "", "", "fuera de rango"],
+]
+
+def snapshots():
+    spreadsheet = FakeClient(FakeBackend()).create("sheet-id")
+    sheet = spreadsheet.add_worksheet_local("Hoja", ROWS)
+    return spreadsheet, SheetSnapshot(sheet), SheetSnapshot(sheet, spreadsheet, select_columns=projected_columns)
+
+def test_projected_snapshot_reads_the_needed_columns_in_one_call():
+    spreadsheet, full, projected = snapshots()
+    calls = spreadsheet.backend.calls
+    assert calls["get_all_values"] == 1
+    assert (calls["row_values"], calls["values_batch_get"]) == (1, 1)
+
+    needed = projected_columns(projected.headers)
+    assert needed == [1, 2, 3, 4]
+    assert projected.headers == full.headers
+    for row_number in range(3, full.row_count + 1):
+        for col in range(len(full.headers)):
+            expected = full.cell(row_number, col) if col in needed else ''
+            assert projected.cell(row_number, col) == expected
+
+def test_rows_with_data_only_in_skipped_columns_past_the_end_are_not_counted():
+    _, full, projected = snapshots()
+    assert full.row_count == len(ROWS)
+    assert projected.row_count == len(ROWS) - 1
+    assert projected.col_values(1) == full.col_values(1)
@@ -0,0 +1,61 @@
+import contextlib
+import io
+
+import gspread
+import pytest
+
+import sync_stock_summary_to_sheets as sync
+from benchmarks.fake_sheets import FakeBackend, FakeClient
+from sheet_snapshot import SheetSnapshot
+from sheets_client import SheetsClient, is_idempotent_call
+
+@pytest.mark.parametrize("operation, args, idempotent", [
+    ("batch_update", ([{'range': 'A3', 'values': [['1']]}],), True),
+    ("batch_update", ({"requests": [{"repeatCell": {}}, {"setDataValidation": {}}]},), True),
+    ("batch_update", ({"requests": [{"repeatCell": {}}, {"insertDimension": {}}]},), False),
+    ("insert_row", (["a"], 3), False),
+    ("append_rows", ([["a"]],), False),
+    ("add_worksheet", (), False),
+    ("get_all_values", (), True),
+])
+def test_is_idempotent_call(operation, args, idempotent):
+    assert is_idempotent_call(operation, args, {}) is idempotent
+
+def paced(lost_responses):
+    """A paced fake spreadsheet whose next responses for the given operations are lost after being applied."""
+    spreadsheet = FakeClient(FakeBackend(lost_responses=lost_responses)).create("sheet-id")
+    sheet = spreadsheet.add_worksheet_local("Hoja", [["Título"], ["Modelo", "Inventario"]] + [[f"m{i}", str(i)] for i in range(5)])
+    client = SheetsClient(read_per_minute=10 ** 6, write_per_minute=10 ** 6, burst=10 ** 6, base_backoff=0.001)
+    return client, sheet, client.wrap(spreadsheet)
+
+def test_insert_whose_response_was_lost_is_not_sent_again():
+    client, sheet, spreadsheet = paced({"spreadsheet.batch_update": 1})
+    snapshot = SheetSnapshot(spreadsheet.worksheet("Hoja"))
+    insertions = [{'insert_at': 4, 'data': ["nuevo-1", "1"]}, {'insert_at': 6, 'data': ["nuevo-2", "2"]}]
+
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(gspread.exceptions.APIError):
+        sync.insert_rows_bulk(spreadsheet, snapshot, insertions)
+
+    # The server applied the insert once; a retry would have added two more empty rows
+    assert len(sheet.values) == 7 + len(insertions)
+    assert client.call_counts["batch_update"] == 1
+    assert not client.retry_counts
+
+def test_value_write_whose_response_was_lost_is_retried():
+    client, sheet, spreadsheet = paced({"batch_update": 1})
+    worksheet = spreadsheet.worksheet("Hoja")
+    with contextlib.redirect_stdout(io.StringIO()):
+        worksheet.batch_update([{'range': 'B3:B4', 'values': [['10'], ['11']]}])
+    assert client.retry_counts["batch_update"] == 1
+    assert [row[1] for row in sheet.values[2:4]] == ['10', '11']
+
+def test_formatting_whose_response_was_lost_is_retried():
+    client, sheet, spreadsheet = paced({"spreadsheet.batch_update": 1})
+    request = {"repeatCell": {"range": {"sheetId": sheet.id, "startRowIndex": 2, "endRowIndex": 7,
+                                        "startColumnIndex": 1, "endColumnIndex": 2},
+                              "cell": {"userEnteredFormat": {"horizontalAlignment": "CENTER"}},
+                              "fields": "userEnteredFormat(horizontalAlignment)"}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        spreadsheet.batch_update({"requests": [request]})
+    assert client.retry_counts["batch_update"] == 1
+    assert sheet.formats.get(4, 1) == {"horizontalAlignment": "CENTER"}
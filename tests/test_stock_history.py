@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+import stock_history
+from generate_stock_summary import build_stock_cube
+from stock_history import FRAME_DELTA, FRAME_SNAPSHOT, StockHistory, record_cube
+
+CPH = ("CPH2599", "256GB", "Negro", "Telcel", "CELULARES", "")
+CPH_AZUL = ("CPH2599", "256GB", "Azul", "Telcel", "CELULARES", "")
+SAMSUNG = ("SM-A155M", "128GB", "Negro", "AT&T", "CELULARES", "")
+
+def stats(stock, low=None, median=None, high=None):
+    return {"stock": stock, "min_price": low, "median_price": median, "max_price": high}
+
+# One roll-up per run: stock changes, a price disappears, a variant leaves and comes back
+RUNS = [
+    {CPH: stats(3, 300000, 310000, 320000), SAMSUNG: stats(1, 250000, 250000, 250000)},
+    {CPH: stats(2, 300000, 305000, 310000), SAMSUNG: stats(1, 250000, 250000, 250000)},
+    {CPH: stats(2, 300000, 305000, 310000), CPH_AZUL: stats(1)},
+    {CPH: stats(0), CPH_AZUL: stats(1), SAMSUNG: stats(4, 240000, 245000, 250000)},
+    {SAMSUNG: stats(4, 240000, 245000, 250000)},
+]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "stock_history.bin")
+
+@pytest.fixture
+def small_snapshots(monkeypatch):
+    monkeypatch.setattr(stock_history, "SNAPSHOT_EVERY", 2)
+
+def record(path, runs):
+    history = StockHistory(path)
+    for timestamp, rollup in enumerate(runs, start=1):
+        history.append(rollup, timestamp=float(timestamp))
+    return history
+
+def test_snapshots_and_deltas_round_trip(path, small_snapshots):
+    history = record(path, RUNS)
+    assert [frame[1] for frame in history.frame_index] == [FRAME_SNAPSHOT, FRAME_DELTA, FRAME_SNAPSHOT, FRAME_DELTA, FRAME_SNAPSHOT]
+
+    for reopened in (history, StockHistory(path)):
+        for timestamp, rollup in enumerate(RUNS, start=1):
+            assert reopened.state_at(timestamp) == rollup
+        assert reopened.state_at(0.5) == {}
+        assert reopened.state_at() == RUNS[-1]
+
+def test_series_lists_only_the_changes(path):
+    history = record(path, RUNS)
+    assert history.series(CPH) == [(1.0, stats(3, 300000, 310000, 320000)), (2.0, stats(2, 300000, 305000, 310000)),
+                                   (4.0, stats(0)), (5.0, None)]
+    # Absent from the first snapshot, so its series starts with None
+    assert history.series(CPH_AZUL) == [(1.0, None), (3.0, stats(1)), (5.0, None)]
+    assert history.series(("XT2363",) * 6) == []
+
+def phones(*rows):
+    return [{"Modelo": f"{model}-MEM:256GB", "Color": color, "Compañía": "Telcel", "Descripción": "", "ID Sucursal": store,
+             "Categoría": "CELULARES", "Precio Promoción": price} for model, color, store, price in rows]
+
+def test_summary_at_matches_each_recorded_cube(path, small_snapshots):
+    cubes = [
+        build_stock_cube(phones(("CPH2599", "Negro", "154", "$ 3,000.00"), ("CPH2599", "Negro", "155", "$ 3,100.00"))),
+        build_stock_cube(phones(("CPH2599", "Negro", "154", "$ 3,000.00"), ("A3", "Azul", "154", "$ 2,000.00"))),
+        build_stock_cube(phones(("A3", "Azul", "154", "$ 1,900.00"), ("A3", "Azul", "156", "$ 1,900.00"))),
+    ]
+    for timestamp, cube in enumerate(cubes, start=1):
+        record_cube(cube, path, timestamp=float(timestamp))
+
+    history = StockHistory(path)
+    by_variant = lambda summary: sorted(summary, key=lambda v: sorted(v.items()))
+    for timestamp, cube in enumerate(cubes, start=1):
+        assert by_variant(history.summary_at(timestamp)) == by_variant(cube.to_variant_summary())
+
+def test_reopening_reads_the_index_instead_of_the_frames(path, monkeypatch, small_snapshots):
+    record(path, RUNS)
+    frames_read = []
+    real_payload = StockHistory._payload
+    monkeypatch.setattr(StockHistory, "_payload", lambda self, offset, length, f: frames_read.append(offset) or real_payload(self, offset, length, f))
+
+    history = StockHistory(path)
+    assert len(history.frame_index) == len(RUNS) and frames_read == []
+
+    # Frame 4 is a delta: it is rebuilt from the snapshot of frame 3, not from the first frame
+    assert history.state_at(4) == RUNS[3]
+    assert frames_read == [frame[2] for frame in history.frame_index[2:4]]
+
+def test_reopen_after_an_append(path):
+    record(path, RUNS[:2])
+    history = StockHistory(path)
+    history.append(RUNS[2], timestamp=3.0)
+
+    reopened = StockHistory(path)
+    assert reopened.frame_index == history.frame_index
+    assert reopened.variants == history.variants
+    assert reopened.state_at() == RUNS[2]
+
+def test_missing_or_stale_index_is_rebuilt(path):
+    history = record(path, RUNS[:3])
+    os.remove(history.index_path)
+    assert StockHistory(path).frame_index == history.frame_index
+    assert os.path.exists(history.index_path)
+
+    # Frames appended while the index was set aside are picked up from the indexed end
+    stale = history.index_path + ".old"
+    os.replace(history.index_path, stale)
+    StockHistory(path).append(RUNS[3], timestamp=4.0)
+    os.replace(stale, history.index_path)
+    reopened = StockHistory(path)
+    assert len(reopened.frame_index) == 4
+    assert reopened.state_at() == RUNS[3]
+
+def test_partial_frame_is_cut_off_by_the_next_append(path):
+    record(path, RUNS[:2])
+    with open(path, "ab") as f:
+        f.write(b"F\x02")  # a run that died mid-append
+
+    history = StockHistory(path)
+    assert len(history.frame_index) == 2
+    history.append(RUNS[2], timestamp=3.0)
+    assert StockHistory(path).state_at() == RUNS[2]
+    assert [frame[0] for frame in StockHistory(path).frame_index] == [1.0, 2.0, 3.0]
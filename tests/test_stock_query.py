@@ -0,0 +1,68 @@
+import os
+import pickle
+
+import pytest
+
+from generate_stock_summary import build_stock_cube
+from record_files import write_records
+import stock_query
+
+def phone(model, color, store, company="Telcel"):
+    return {"Modelo": model, "Color": color, "Compañía": company, "Descripción": "", "ID Sucursal": store,
+            "Categoría": "CELULARES", "Precio Promoción": "$ 3,000.00"}
+
+PRODUCTS = [
+    phone("CPH2599-MEM:256GB", "Negro", "154"),
+    phone("CPH2599-MEM:256GB", "Negro", "155"),
+    phone("CPH2599-MEM:256GB", "Azul", "154"),
+    phone("SM-A155M-MEM:128GB", "Negro", "155", company="AT&T"),
+]
+
+@pytest.fixture
+def files(tmp_path):
+    cube = build_stock_cube(PRODUCTS)
+    summary_path, cube_path = str(tmp_path / "stock_summary.json"), str(tmp_path / "stock_cube.bin")
+    write_records(summary_path, cube.to_variant_summary())
+    cube.save(cube_path)
+    return summary_path, cube_path
+
+def test_index_survives_save_and_load(files):
+    summary_path, cube_path = files
+    built = stock_query.load_stock_index(summary_path, cube_path)
+    index_path = stock_query.default_index_path(summary_path)
+    with open(index_path, "rb") as f:
+        assert f.read(len(stock_query.INDEX_MAGIC)) == stock_query.INDEX_MAGIC
+
+    loaded = stock_query.StockIndex.load(index_path)
+    assert loaded.fingerprint == built.fingerprint
+    assert loaded.query(color="negro") == built.query(color="negro")
+    assert loaded.total_stock(store="154") == 2
+    assert loaded.total_stock(model="cph2599-mem:256gb", store="155") == 1
+    assert loaded.search_models_by_prefix("sm-") == ["SM-A155M-MEM:128GB"]
+
+def test_same_size_rewrite_with_same_mtime_rebuilds_the_index(files):
+    summary_path, cube_path = files
+    assert stock_query.load_stock_index(summary_path, cube_path).total_stock(color="negro") == 3
+
+    # Same length, same mtime: only the content hash tells the files apart
+    stat = os.stat(summary_path)
+    with open(summary_path, encoding="utf-8") as f:
+        text = f.read()
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write(text.replace('"Azul"', '"Rojo"'))
+    os.utime(summary_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    index = stock_query.load_stock_index(summary_path, cube_path)
+    assert index.query(color="rojo") and not index.query(color="azul")
+
+def test_old_pickled_index_is_rebuilt_without_unpickling(files, capsys):
+    summary_path, cube_path = files
+    index_path = stock_query.default_index_path(summary_path)
+    with open(index_path, "wb") as f:
+        pickle.dump({"version": 1}, f)
+
+    index = stock_query.load_stock_index(summary_path, cube_path)
+    assert "se reconstruirá" in capsys.readouterr().out
+    assert index.total_stock() == len(PRODUCTS)
+    with open(index_path, "rb") as f:
+        assert f.read(len(stock_query.INDEX_MAGIC)) == stock_query.INDEX_MAGIC
@@ -0,0 +1,112 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+import sync_stock_summary_to_sheets as sync
+from benchmarks.bench_sync import SHEET_HEADERS, build_fake_spreadsheet, synthetic_sheet_and_summary
+from benchmarks.fake_sheets import FakeBackend
+from sheets_client import SheetsClient
+
+MODEL, VP, VS, VT, INVENTORY = (SHEET_HEADERS.index(title) for title in
+                                ("Modelo", "Variante Primaria", "Variante Secundaria", "Variante Terciaria",
+                                 "Inventario Partner"))
+
+@pytest.fixture
+def fake_sheet(tmp_path, monkeypatch):
+    """A fake spreadsheet with ~60 synced rows and the matching stock_summary.json in a scratch directory."""
+    monkeypatch.chdir(tmp_path)
+    values, summary = synthetic_sheet_and_summary(60, seed=3, new_variant_ratio=0, changed_stock_ratio=0, missing_ratio=0)
+    client = build_fake_spreadsheet(FakeBackend(), values)
+    sheet = client.backend.spreadsheets[sync.SPREADSHEET_ID].sheets[sync.SHEET_NAME]
+    return client, sheet, summary
+
+def run_sync(client, summary, **kwargs):
+    with open(sync.VARIANT_SUMMARY_JSON_PATH, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False)
+    sheets_client = SheetsClient(read_per_minute=10 ** 6, write_per_minute=10 ** 6, burst=10 ** 6, base_backoff=0.01)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return sync.main(client=client, sheets_client=sheets_client, **kwargs)
+
+def celular_rows(sheet):
+    return [i for i, row in enumerate(sheet.values) if i >= 2 and row[VT]]
+
+def summary_entry(summary, row):
+    return next(v for v in summary if v["model_original"] == row[MODEL] and v["storage"] == row[VP]
+                and v["color"] == row[VS] and v["compania"] == row[VT])
+
+def test_targeted_sync_writes_only_the_given_variants(fake_sheet):
+    client, sheet, summary = fake_sheet
+    target_row, other_row, messy_row = celular_rows(sheet)[:3]
+    summary_entry(summary, sheet.values[target_row])["stock"] = 99
+    summary_entry(summary, sheet.values[other_row])["stock"] = 77
+    # Cleanup that only a full sync may do: brackets in Variante Primaria
+    sheet.values[messy_row][VP] = f"[{sheet.values[messy_row][VP]}]"
+    before = [list(row) for row in sheet.values]
+    target = sheet.values[target_row]
+    key = sync.sheet_variant_key(target[MODEL], "CELULARES", target[VP], target[VS], target[VT])
+
+    results = run_sync(client, summary, only_keys={key})
+
+    assert results[0]["status"] == "ok"
+    assert sheet.values[target_row][INVENTORY] == "99"
+    changed = [(i, j) for i, row in enumerate(sheet.values) for j, value in enumerate(row)
+               if j >= len(before[i]) or before[i][j] != value]
+    assert changed == [(target_row, INVENTORY)]
+    aux = client.backend.spreadsheets[sync.SPREADSHEET_ID].sheets[sync.AUX_SHEET_NAME]
+    assert aux.values == []
+
+def test_full_sync_updates_every_changed_variant(fake_sheet):
+    client, sheet, summary = fake_sheet
+    target_row, other_row, messy_row = celular_rows(sheet)[:3]
+    summary_entry(summary, sheet.values[target_row])["stock"] = 99
+    summary_entry(summary, sheet.values[other_row])["stock"] = 77
+    sheet.values[messy_row][VP] = f"[{sheet.values[messy_row][VP]}]"
+
+    run_sync(client, summary)
+
+    assert sheet.values[target_row][INVENTORY] == "99"
+    assert sheet.values[other_row][INVENTORY] == "77"
+    assert "[" not in sheet.values[messy_row][VP]
+
+def test_second_sync_of_the_same_summary_writes_nothing(fake_sheet):
+    client, sheet, summary = fake_sheet
+    summary_entry(summary, sheet.values[celular_rows(sheet)[0]])["stock"] = 99
+    run_sync(client, summary)
+    calls = dict(client.backend.calls)
+
+    run_sync(client, summary)
+
+    writes = {op: count - calls.get(op, 0) for op, count in client.backend.calls.items()
+              if op in ("batch_update", "spreadsheet.batch_update", "values_batch_update", "batch_clear")}
+    assert not any(writes.values())
+
+def test_projected_reads_leave_the_same_sheet_as_full_reads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    values, summary = synthetic_sheet_and_summary(80, seed=11)
+    results = []
+    for projected_reads in (True, False):
+        client = build_fake_spreadsheet(FakeBackend(), values)
+        run_sync(client, summary, projected_reads=projected_reads)
+        spreadsheet = client.backend.spreadsheets[sync.SPREADSHEET_ID]
+        results.append(({name: sheet.get_all_values() for name, sheet in spreadsheet.sheets.items()},
+                         client.backend.bytes_received))
+    (projected_sheets, projected_bytes), (full_sheets, full_bytes) = results
+    assert projected_sheets == full_sheets
+    assert projected_bytes < full_bytes
+
+def test_formatting_is_resent_when_a_middle_cell_lost_it(fake_sheet):
+    client, sheet, summary = fake_sheet
+    run_sync(client, summary)
+    middle_row = len(sheet.values) // 2
+    col = next(col for col, segments in sheet.validations.by_column.items() if segments)
+    rule = sheet.validations.get(middle_row, col)
+    assert rule and sheet.validations.get(2, col) == rule
+    sheet.validations.set(col, middle_row, middle_row + 1, None)  # e.g. a pasted cell without the chip
+    calls = client.backend.calls["spreadsheet.batch_update"]
+
+    run_sync(client, summary)
+
+    assert client.backend.calls["spreadsheet.batch_update"] == calls + 1
+    assert sheet.validations.get(middle_row, col) == rule
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+import sync_stock_summary_to_sheets as sync
+from benchmarks.bench_sync import SHEET_HEADERS, build_fake_spreadsheet, synthetic_sheet_and_summary
+from benchmarks.fake_sheets import FakeBackend
+from sheets_client import SheetsClient
+
+FAMILIA, INVENTORY = SHEET_HEADERS.index("Familia"), SHEET_HEADERS.index("Inventario Partner")
+FAST = {"read_per_minute": 10 ** 6, "write_per_minute": 10 ** 6, "burst": 10 ** 6, "base_backoff": 0.01}
+
+def write_config(tmp_path, targets):
+    path = tmp_path / "targets.json"
+    path.write_text(json.dumps(targets), encoding="utf-8")
+    return str(path)
+
+def test_load_sync_targets_fills_in_defaults(tmp_path):
+    targets = sync.load_sync_targets(write_config(tmp_path, [
+        {"spreadsheet_id": "abc", "sheet_name": "Hoja"},
+        {"name": "consolas", "spreadsheet_id": "def", "sheet_name": "Hoja", "aux_sheet_name": "Listas"},
+    ]))
+    assert [(t["name"], t["aux_sheet_name"]) for t in targets] == [("abc/Hoja", sync.AUX_SHEET_NAME), ("consolas", "Listas")]
+
+@pytest.mark.parametrize("missing", ["spreadsheet_id", "sheet_name"])
+def test_load_sync_targets_rejects_incomplete_targets(tmp_path, missing):
+    target = {"spreadsheet_id": "abc", "sheet_name": "Hoja"}
+    del target[missing]
+    with pytest.raises(ValueError, match=f"#2 .*'{missing}'"):
+        sync.load_sync_targets(write_config(tmp_path, [{"spreadsheet_id": "x", "sheet_name": "y"}, target]))
+
+@pytest.fixture
+def two_spreadsheets(tmp_path, monkeypatch):
+    """The same synthetic sheet in two fake spreadsheets sharing one backend, plus the summary on disk."""
+    monkeypatch.chdir(tmp_path)
+    values, summary = synthetic_sheet_and_summary(80, seed=5, new_variant_ratio=0)
+    backend = FakeBackend()
+    build_fake_spreadsheet(backend, values)
+    backend.spreadsheets["otra-hoja"] = other = backend.spreadsheets.pop(sync.SPREADSHEET_ID)
+    other.id = "otra-hoja"
+    client = build_fake_spreadsheet(backend, values)
+    with open(sync.VARIANT_SUMMARY_JSON_PATH, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False)
+    return client, values
+
+def test_every_target_gets_its_own_paced_client(tmp_path, monkeypatch, two_spreadsheets):
+    client, values = two_spreadsheets
+    created = []
+
+    class RecordingClient(SheetsClient):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            created.append((kwargs, self))
+    monkeypatch.setattr(sync, "SheetsClient", RecordingClient)
+    config = write_config(tmp_path, [
+        {"name": "principal", "spreadsheet_id": sync.SPREADSHEET_ID, "sheet_name": sync.SHEET_NAME},
+        {"name": "consolas", "spreadsheet_id": "otra-hoja", "sheet_name": sync.SHEET_NAME,
+         "familias": ["CONSOLAS"], "write_per_minute": 10 ** 5},
+    ])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = sync.main(client=client, config_path=config, client_options=FAST)
+
+    assert [result["status"] for result in results] == ["ok", "ok"]
+    assert len(created) == 2 and created[0][1] is not created[1][1]
+    assert [kwargs["write_per_minute"] for kwargs, _ in created] == [10 ** 6, 10 ** 5]
+    # Each result counts only the calls of its own target
+    assert [result["api_calls"] for result in results] == [sum(c.call_counts.values()) for _, c in created]
+    assert sum(result["api_calls"] for result in results) == sum(client.backend.calls.values())
+
+    # The consolas target only touched CONSOLAS rows
+    consolas_sheet = client.backend.spreadsheets["otra-hoja"].sheets[sync.SHEET_NAME]
+    for before, after in zip(values[2:], consolas_sheet.values[2:]):
+        if before[FAMILIA] != "CONSOLAS":
+            assert after[INVENTORY] == before[INVENTORY]
@@ -0,0 +1,104 @@
+import contextlib
+import io
+
+import pytest
+
+import scraper_all_products as scraper
+import targeted_refresh
+from generate_stock_summary import CUBE_FILE, OUTPUT_FILE as SUMMARY_FILE, StockCube, build_stock_cube
+from merge_color_updates import OUTPUT_FILE as MERGED_FILE
+from record_files import load_records, write_records
+
+def product(sku, store, model, category="CELULARES", color="Negro"):
+    return {"SKU": sku, "Marca": "OPPO", "Modelo": model, "Descripción": f"OPPO {model}-COM:TELCEL color {color}",
+            "Precio Promoción": "$ 2,300.00", "Sucursal": scraper.STORES[store], "ID Sucursal": store,
+            "Categoría": category, "Familia": f"{category} (usado)", "Color": color, "Compañía": "Telcel"}
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """
+    Merged products, cube and summary of a previous full run, plus a scraper that serves
+    `served`; the (store, category) pairs in `failing` come back unreconciled.
+    """
+    monkeypatch.chdir(tmp_path)
+    products = [
+        product("1", "154", "CPH2599-MEM:256GB"), product("2", "154", "CPH2599-MEM:256GB"),
+        product("3", "154", "CPH2579-MEM:128GB"), product("4", "155", "CPH2599-MEM:256GB"),
+        # A familia outside CATEGORIES (e.g. found with --discover) in a refreshed store
+        product("5", "154", "CPH2599-MEM:256GB", category="TABLETS"),
+    ]
+    write_records(MERGED_FILE, products, "json")
+    cube = build_stock_cube(products)
+    cube.save(CUBE_FILE)
+    write_records(SUMMARY_FILE, cube.to_variant_summary(), "json")
+
+    served, failing = [], {}
+    def scrape_store(store_id, store_name, categories, resumen, page_sizes=None):
+        for category in categories:
+            resumen[(store_name, category)] = {"Conciliado": failing.get((store_id, category), "Sí")}
+        return [dict(p) for p in served if p["ID Sucursal"] == store_id and p["Categoría"] in categories
+                and (store_id, p["Categoría"]) not in failing]
+    monkeypatch.setattr(scraper, "scrape_store_by_categories", scrape_store)
+    monkeypatch.setattr(scraper, "load_page_sizes", lambda: {})
+    monkeypatch.setattr(scraper, "save_page_sizes", lambda page_sizes: None)
+    return products, served, failing
+
+def refresh(scope):
+    with contextlib.redirect_stdout(io.StringIO()):
+        targeted_refresh.refresh(scope, run_sync=False)
+
+def stock_by_cell(cube):
+    return {(variant[0], store, category): stats["stock"] for variant, store, category, stats in cube.cells()}
+
+def test_store_refresh_keeps_other_stores_and_categories(catalog):
+    products, served, _ = catalog
+    served.append(product("1", "154", "CPH2599-MEM:256GB"))  # SKU 2 and 3 sold
+
+    refresh(targeted_refresh.RefreshScope(["154"]))
+
+    assert sorted(p["SKU"] for p in load_records(MERGED_FILE)) == ["1", "4", "5"]
+    cells = stock_by_cell(StockCube.load(CUBE_FILE))
+    assert cells == {("CPH2599-MEM:256GB", "154", "CELULARES"): 1, ("CPH2599-MEM:256GB", "155", "CELULARES"): 1,
+                     ("CPH2599-MEM:256GB", "154", "TABLETS"): 1}
+    assert {v["model_original"]: v["stock"] for v in load_records(SUMMARY_FILE)} == {"CPH2599-MEM:256GB": 3}
+
+def test_model_refresh_leaves_other_models_untouched(catalog):
+    products, served, _ = catalog
+    served.extend([product("6", "155", "CPH2579-MEM:128GB"), product("4", "155", "CPH2599-MEM:256GB")])
+
+    refresh(targeted_refresh.RefreshScope(models=["cph2579-mem:128gb"]))
+
+    # SKU 3 (store 154) is gone and SKU 6 is new; CPH2599 products are not re-read even if served
+    assert sorted(p["SKU"] for p in load_records(MERGED_FILE)) == ["1", "2", "4", "5", "6"]
+    assert stock_by_cell(StockCube.load(CUBE_FILE)) == stock_by_cell(build_stock_cube(load_records(MERGED_FILE)))
+
+def test_scope_requires_a_store_or_model():
+    with pytest.raises(ValueError):
+        targeted_refresh.RefreshScope()
+    with pytest.raises(ValueError):
+        targeted_refresh.RefreshScope(["no-existe"])
+
+def test_failed_download_keeps_the_old_products(catalog):
+    products, served, failing = catalog
+    served.append(product("1", "154", "CPH2599-MEM:256GB"))
+    failing[("155", "CELULARES")] = "No"  # rowCount not matched: its rows would read as sold out
+
+    refresh(targeted_refresh.RefreshScope(["154", "155"]))
+
+    # Store 154 was refreshed (SKU 2 and 3 sold); store 155 kept SKU 4
+    assert sorted(p["SKU"] for p in load_records(MERGED_FILE)) == ["1", "4", "5"]
+    assert stock_by_cell(StockCube.load(CUBE_FILE))[("CPH2599-MEM:256GB", "155", "CELULARES")] == 1
+    assert {v["model_original"]: v["stock"] for v in load_records(SUMMARY_FILE)} == {"CPH2599-MEM:256GB": 3}
+
+def test_nothing_is_touched_when_every_download_fails(catalog, tmp_path):
+    products, served, failing = catalog
+    failing[("154", "CELULARES")] = "No"
+    failing[("154", "CONSOLAS DE JUEGOS")] = None  # no data at all
+    cube_before = (tmp_path / CUBE_FILE).read_bytes()
+
+    with pytest.raises(targeted_refresh.ScrapeFailed):
+        refresh(targeted_refresh.RefreshScope(["154"]))
+
+    assert load_records(MERGED_FILE) == products
+    assert (tmp_path / CUBE_FILE).read_bytes() == cube_before
+    assert not (tmp_path / "stock_history.bin").exists()